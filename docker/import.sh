@@ -4,33 +4,39 @@ set -ev
 date "+%Y-%m-%d %H:%M:%S"
 
 manage="/var/local/dataviz/manage.py"
-tmp_db="/tmp/temp.eeag.sqlite3"
 
-app_db="$DJANGO_DB_PATH"
-if [ -z "$app_db" ]
+# Opt-in: apply only the changes from grACE, and update only the search
+# documents they affect (see "index_changes" in docs/import.md)
+if [ -n "$DV_INCREMENTAL_IMPORT" ]
 then
-  app_db="/var/local/db/eeag.sqlite3"
+  changeset="$(mktemp --suffix=.json)"
+  trap 'rm -f "$changeset"' EXIT
+  import_options=(--incremental --changeset="$changeset")
+else
+  import_options=()
 fi
 
-# Clean up tmp path, in case there were some failed runs
-rm -f "$tmp_db" || true
-
-# Copy the current db as starting point
-cp "$app_db" "$tmp_db"
-
-# Import new data in the temporary db
-env DJANGO_DB_PATH="$tmp_db" python "$manage" import --period="2014-2021" --noinput
+# Import new data in a shadow copy of the live db, which replaces it once
+# optimized and verified
+python "$manage" import --period="2014-2021" --noinput --shadow "${import_options[@]}"
 # XXX News import is disabled because the API used for import no longer exists
-#env DJANGO_DB_PATH="$tmp_db" python "$manage" import_news
+#python "$manage" import_news
 
-# Replace the live db
-mv "$tmp_db" "$app_db"
+# Compute the API responses for the new data before the visitors do
+python "$manage" warm_cache
 
-# Rebuild indexes from the live db
-python "$manage" rebuild_index --noinput
+if [ -n "$DV_INCREMENTAL_IMPORT" ]
+then
+  # Update the documents of the changed objects in the index (or rebuild it,
+  # if its schema changed or the changeset is missing)
+  python "$manage" index_changes "$changeset"
+else
+  # Rebuild indexes from the live db
+  python "$manage" rebuild_index --noinput
+fi
 
-# clear cached views
-rm -rf /var/tmp/django_cache/*
+# No need to clear the cache, the import bumped the data version used in
+# the cache keys (stale entries expire on their own)
 
 # echo date finished
 date "+%Y-%m-%d %H:%M:%S"
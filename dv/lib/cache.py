@@ -0,0 +1,182 @@
+"""
+Caching of the API responses.
+
+Works like Django's `cache_page`, but the bodies are stored compressed
+(gzip, and brotli when available) so they're not compressed again on every
+hit, and they carry a strong ETag so clients can revalidate them cheaply
+with `If-None-Match` (answered with a 304 only when the response is cached).
+
+The cache keys and ETags contain a hash of the request path, and the
+`DataVersion` of the requested period, which the imports bump once the new
+data is in place. This invalidates the cached responses of that period at
+once, without touching the others. The responses of several periods (e.g.
+`?period=2009-2014,2014-2021`) are keyed by the versions of all of them.
+"""
+
+import gzip
+import hashlib
+from functools import wraps
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils import timezone
+from django.utils.http import parse_etags
+
+from dv.lib.snapshots import SNAPSHOT_VERSION
+from dv.lib.utils import DEFAULT_PERIOD, FUNDING_PERIODS_DICT
+from dv.models import DataVersion
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+GZIP_LEVEL = 9
+# 10 and 11 compress a bit better, but are an order of magnitude slower
+BROTLI_QUALITY = 9
+
+
+def data_versions(request=None):
+    """
+    Returns the current data versions, as a dict of period -> version.
+    They're looked up once per `request`, when given.
+    """
+    try:
+        return request._data_versions
+    except AttributeError:
+        pass
+    versions = dict(DataVersion.objects.values_list("period", "version"))
+    if request is not None:
+        request._data_versions = versions
+    return versions
+
+
+def data_token(request=None):
+    """Identifies the current data of all the periods, e.g. "3.0.12"."""
+    versions = data_versions(request)
+    return ".".join(str(versions[period]) for period in sorted(versions)) or "0"
+
+
+def bump_data_version(periods):
+    """
+    Increments the data version of `periods` (in a single transaction),
+    invalidating their cached responses.
+    """
+    with transaction.atomic():
+        for period in periods:
+            DataVersion.objects.get_or_create(period=period)
+        DataVersion.objects.filter(period__in=periods).update(
+            version=F("version") + 1, updated=timezone.now()
+        )
+
+
+def compress(content):
+    """Returns the encodings of `content`, as a dict of coding -> bytes."""
+    # mtime=0 keeps the output deterministic
+    encodings = {"gzip": gzip.compress(content, compresslevel=GZIP_LEVEL, mtime=0)}
+    if brotli is not None:
+        encodings["br"] = brotli.compress(content, quality=BROTLI_QUALITY)
+    return encodings
+
+
+def accepted_encodings(request):
+    """The content codings accepted by the client (without "identity")."""
+    accepted = set()
+    for part in request.META.get("HTTP_ACCEPT_ENCODING", "").split(","):
+        coding, _, params = part.partition(";")
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                if float(params[2:]) == 0:
+                    continue
+            except ValueError:
+                continue
+        accepted.add(coding.strip().lower())
+    return accepted
+
+
+def _content_coding(request):
+    """The best content coding of the cached bodies accepted by the client."""
+    accepted = accepted_encodings(request)
+    for coding in ("br", "gzip"):
+        if coding == "br" and brotli is None:
+            continue
+        if coding in accepted or "*" in accepted:
+            return coding
+    return "identity"
+
+
+def _is_not_modified(request, etag):
+    # "*" isn't honoured: it would match URLs which don't return a 200
+    etags = parse_etags(request.META.get("HTTP_IF_NONE_MATCH", ""))
+    return etag in [tag.removeprefix("W/") for tag in etags]
+
+
+def _set_headers(response, etag):
+    response["ETag"] = etag
+    response["Vary"] = "Accept-Encoding"
+    # may be stored, but must be revalidated (cheaply, with the ETag)
+    response["Cache-Control"] = "no-cache"
+
+
+def cache_api(timeout):
+    """
+    Caches the successful responses of an API view for `timeout` seconds,
+    keyed by the full request path and the data version of its period.
+    """
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ("GET", "HEAD"):
+                return view(request, *args, **kwargs)
+
+            # Cached here, don't let the site-wide cache middleware
+            # store another (uncompressed) copy and bypass the ETag check.
+            request._cache_update_cache = False
+
+            period = request.GET.get("period", DEFAULT_PERIOD)
+            if period in FUNDING_PERIODS_DICT:
+                data_version = data_versions(request).get(period, 0)
+            else:
+                # several periods, or an invalid one
+                period, data_version = "all", data_token(request)
+            version = f"{period}.{data_version}.{SNAPSHOT_VERSION}"
+            path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+            key = f"dv.api.{version}.{path}"
+            coding = _content_coding(request)
+            etag = f'"{version}.{path}.{coding}"'
+            entry = cache.get(key)
+            # only the cached (successful) responses are validated
+            if entry is not None and _is_not_modified(request, etag):
+                response = HttpResponseNotModified()
+                _set_headers(response, etag)
+                return response
+
+            if entry is None:
+                response = view(request, *args, **kwargs)
+                if response.status_code != 200 or response.streaming:
+                    return response
+                entry = {
+                    "content_type": response["Content-Type"],
+                    "encodings": compress(response.content),
+                }
+                cache.set(key, entry, timeout)
+
+            if coding == "identity":
+                content = gzip.decompress(entry["encodings"]["gzip"])
+            else:
+                content = entry["encodings"][coding]
+            response = HttpResponse(content, content_type=entry["content_type"])
+            if coding != "identity":
+                response["Content-Encoding"] = coding
+            response["Content-Length"] = len(content)
+            _set_headers(response, etag)
+            return response
+
+        wrapper.cache_timeout = timeout
+        return wrapper
+
+    return decorator
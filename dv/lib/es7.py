@@ -1,5 +1,7 @@
 from copy import deepcopy
 
+from elasticsearch import NotFoundError
+from elasticsearch.helpers import bulk
 from haystack.backends.elasticsearch7_backend import Elasticsearch7SearchBackend
 from haystack.backends.elasticsearch7_backend import Elasticsearch7SearchEngine
 
@@ -21,6 +23,34 @@ class CustomES7SearchBackend(Elasticsearch7SearchBackend):
         query_args["track_total_hits"] = True
         return query_args
 
+    def remove_many(self, identifiers, commit=True):
+        """Removes the documents of `identifiers` with a single bulk request."""
+        bulk(
+            self.conn,
+            ({"_op_type": "delete", "_id": identifier} for identifier in identifiers),
+            index=self.index_name,
+            ignore_status=(404,),
+        )
+        if commit:
+            self.conn.indices.refresh(index=self.index_name)
+
+    def get_schema_fingerprint(self):
+        """
+        Returns the fingerprint of the schema the index was built with, stored
+        in its mapping by set_schema_fingerprint, or None.
+        """
+        try:
+            mapping = self.conn.indices.get_mapping(index=self.index_name)
+        except NotFoundError:
+            return None
+        meta = mapping[self.index_name]["mappings"].get("_meta", {})
+        return meta.get("schema_fingerprint")
+
+    def set_schema_fingerprint(self, fingerprint):
+        self.conn.indices.put_mapping(
+            index=self.index_name, body={"_meta": {"schema_fingerprint": fingerprint}}
+        )
+
 
 class CustomES7SearchEngine(Elasticsearch7SearchEngine):
     backend = CustomES7SearchBackend
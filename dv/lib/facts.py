@@ -0,0 +1,158 @@
+"""
+The allocation fact table (see AllocationFact), and the cube queries on it.
+
+The facts of a period are rebuilt from scratch at the end of its import,
+from the three allocation tables. The cube queries slice them (filter by
+dimension values) and roll them up (sum the measures by the requested
+dimensions, dropping the others).
+"""
+
+from django.db import transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import Substr
+
+from dv.lib.utils import FM_DICT, FM_REVERSED_DICT, FUNDING_PERIODS_DICT
+from dv.models import (
+    ALLOCATION_FACT_MEASURES,
+    Allocation,
+    AllocationFact,
+    ProgrammeAllocation,
+    ProjectAllocation,
+)
+
+BATCH_SIZE = 1000
+
+# Cube dimensions, by their name in the API: the fields (if named the same)
+# or expressions they're read from
+DIMENSIONS = {
+    "period": F("funding_period"),
+    "fm": F("financial_mechanism"),
+    "beneficiary": F("state_id"),
+    "area": F("programme_area__code"),
+    "sector": F("priority_sector_id"),
+    "programme": F("programme_id"),
+    "nuts": F("nuts_id"),
+    # the NUTS rolled up to a level
+    "nuts0": Substr("nuts_id", 1, 2),
+    "nuts1": Substr("nuts_id", 1, 3),
+    "nuts2": Substr("nuts_id", 1, 4),
+    "thematic": "thematic",
+    "sdg_no": "sdg_no",
+}
+
+PERIODS_REVERSED = {
+    period_id: period for period, period_id in FUNDING_PERIODS_DICT.items()
+}
+
+
+def _facts(period_id):
+    allocations = (
+        Allocation.objects.filter(funding_period=period_id)
+        .values(
+            "financial_mechanism",
+            "state_id",
+            "programme_area_id",
+            "thematic",
+            priority_sector_id=F("programme_area__priority_sector_id"),
+        )
+        .annotate(
+            gross_allocation=Sum("gross_allocation"),
+            net_allocation=Sum("net_allocation"),
+        )
+        .order_by()
+    )
+    for row in allocations:
+        yield AllocationFact(funding_period=period_id, **row)
+
+    programme_allocations = (
+        ProgrammeAllocation.objects.filter(funding_period=period_id)
+        .values(
+            "financial_mechanism",
+            "state_id",
+            "programme_area_id",
+            "priority_sector_id",
+            "programme_id",
+            "thematic",
+            "sdg_no",
+        )
+        .annotate(programme_allocation=Sum("allocation"))
+        .order_by()
+    )
+    for row in programme_allocations:
+        yield AllocationFact(funding_period=period_id, **row)
+
+    project_allocations = (
+        ProjectAllocation.objects.filter(funding_period=period_id)
+        .values(
+            "financial_mechanism",
+            "state_id",
+            "programme_area_id",
+            "priority_sector_id",
+            programme_id=F("project__programme_id"),
+            nuts_id=F("project__nuts_id"),
+            thematic=F("project__thematic"),
+            sdg_no=F("project__sdg_no"),
+        )
+        .annotate(
+            project_allocation=Sum("allocation"),
+            project_count=Count("project_id", distinct=True),
+        )
+        .order_by()
+    )
+    for row in project_allocations:
+        yield AllocationFact(funding_period=period_id, **row)
+
+
+def build_facts(period):
+    """Rebuilds the allocation facts of `period`, returns their count."""
+    period_id = FUNDING_PERIODS_DICT[period]
+    with transaction.atomic():
+        AllocationFact.objects.filter(funding_period=period_id).delete()
+        facts = AllocationFact.objects.bulk_create(
+            _facts(period_id), batch_size=BATCH_SIZE
+        )
+    return len(facts)
+
+
+def cube(dimensions, filters=None):
+    """
+    Returns the measures of the allocation facts summed by `dimensions`
+    (names of DIMENSIONS), as a list of dicts, for the facts matching the
+    `filters` (dict of dimension name -> list of values).
+    """
+    unknown = (set(dimensions) | set(filters or ())) - set(DIMENSIONS)
+    if unknown:
+        raise ValueError(f"Unknown dimensions: {', '.join(sorted(unknown))}.")
+
+    facts = AllocationFact.objects.all()
+    for name, values in (filters or {}).items():
+        if name == "period":
+            values = [FUNDING_PERIODS_DICT.get(value) for value in values]
+        elif name == "fm":
+            values = [FM_REVERSED_DICT.get(value, value) for value in values]
+        elif name == "sdg_no":
+            values = [int(value) if value.isdigit() else None for value in values]
+        if isinstance(DIMENSIONS[name], str):
+            facts = facts.filter(**{f"{name}__in": values})
+        else:
+            facts = facts.alias(**{f"_{name}": DIMENSIONS[name]}).filter(
+                **{f"_{name}__in": values}
+            )
+
+    measures = {
+        measure: Sum(measure, default=0) for measure in ALLOCATION_FACT_MEASURES
+    }
+    if not dimensions:
+        return [facts.aggregate(**measures)]
+
+    fields = [name for name in dimensions if isinstance(DIMENSIONS[name], str)]
+    expressions = {name: DIMENSIONS[name] for name in dimensions if name not in fields}
+    rows = list(
+        facts.values(*fields, **expressions).annotate(**measures).order_by(*dimensions)
+    )
+    for row in rows:
+        if "period" in row:
+            row["period"] = PERIODS_REVERSED[row["period"]]
+        if "fm" in row:
+            row["fm"] = FM_DICT[row["fm"]]
+    return rows
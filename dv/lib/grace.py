@@ -0,0 +1,213 @@
+"""
+Extraction of the 2014-2021 data from the grACE (MSSQL) db.
+
+The source tables are independent of each other, so they're read
+concurrently, each on its own connection, into a local staging directory
+holding one JSON lines file per table. The import then loads them from
+there, in dependency order, without waiting on the source db.
+
+Staging file format: the first line is the list of column names, every
+other line the list of values of a row. Decimals, datetimes and dates are
+tagged, e.g. {"$decimal": "1.50"}, so they're read back as such.
+
+The staging files can be saved to a snapshot (a zip file), and an import
+replayed from it on any host, without access to (or a driver for) grACE.
+"""
+
+import datetime
+import json
+import os
+import threading
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+try:
+    import pymssql
+except ImportError:
+    pymssql = None
+
+# Rows read at a time, from the grACE db and from the staging files
+FETCH_SIZE = 1000
+
+# Bump when the staging files change incompatibly
+SNAPSHOT_FORMAT = 1
+SNAPSHOT_MANIFEST = "manifest.json"
+
+# Source queries, by staging table name
+QUERIES = {
+    "ProgrammeArea": "SELECT * FROM fmo.TR_RDPProgrammeArea where FundingPeriod='2014-2021'",
+    "Allocation": "SELECT * FROM fmo.TR_RDPCountryProgrammeArea where FundingPeriod='2014-2021'",
+    # Exclude programmes from Hungary
+    "Programme": "SELECT * FROM fmo.TR_RDPProgramme WHERE FundingPeriod='2014-2021' AND Country != 'Hungary'",
+    "ProgrammeAllocation": "SELECT * FROM fmo.TR_RDPProgrammeBudgetHeading",
+    "Project": "SELECT * FROM fmo.TR_RDPProject",
+    "Indicator": "SELECT * FROM fmo.TR_RDPIndicators",
+    "Organisation": """
+        SELECT DISTINCT
+            IdOrganisation,
+            Organisation,
+            CountryOrganisation,
+            City,
+            OrganisationClassificationSector,
+            OrganisationClassification,
+            NUTSCode
+        FROM fmo.TR_RDPOrganisationRole
+    """,
+    "OrganisationRole": "SELECT * FROM fmo.TR_RDPOrganisationRole",
+    "BilateralInitiative": "SELECT * FROM fmo.TR_RDPBilateralinitiative",
+}
+
+
+def connect():
+    if pymssql is None:
+        raise ImproperlyConfigured("pymssql is required to connect to grACE.")
+    return pymssql.connect(
+        settings.MSSQL_SERVER,
+        settings.MSSQL_USERNAME,
+        settings.MSSQL_PASSWORD,
+        settings.MSSQL_DATABASE,
+    )
+
+
+def _encode(obj):
+    if isinstance(obj, Decimal):
+        return {"$decimal": str(obj)}
+    if isinstance(obj, datetime.datetime):
+        return {"$datetime": obj.isoformat()}
+    if isinstance(obj, datetime.date):
+        return {"$date": obj.isoformat()}
+    # e.g. UUIDs, which the import doesn't use
+    return str(obj)
+
+
+_DECODERS = {
+    "$decimal": Decimal,
+    "$datetime": datetime.datetime.fromisoformat,
+    "$date": datetime.date.fromisoformat,
+}
+
+
+def _decode(obj):
+    if len(obj) == 1:
+        ((tag, value),) = obj.items()
+        if tag in _DECODERS:
+            return _DECODERS[tag](value)
+    return obj
+
+
+def staging_path(directory, name):
+    return os.path.join(directory, f"{name}.jsonl")
+
+
+def write_table(path, columns, batches):
+    """Writes the `batches` (lists of rows) of a table to the staging file `path`."""
+    count = 0
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(json.dumps(columns) + "\n")
+        for rows in batches:
+            for row in rows:
+                f.write(json.dumps(row, default=_encode, ensure_ascii=False))
+                f.write("\n")
+            count += len(rows)
+    return count
+
+
+def extract_table(conn, query, path):
+    """Writes the result of `query` to the staging file `path`, returns its size."""
+    cursor = conn.cursor()
+    try:
+        cursor.execute(query)
+        columns = [column[0] for column in cursor.description]
+        batches = iter(lambda: cursor.fetchmany(FETCH_SIZE), [])
+        return write_table(path, columns, batches)
+    finally:
+        cursor.close()
+
+
+def extract(directory, queries=None, workers=4):
+    """
+    Extracts the `queries` (defaulting to all of QUERIES) to staging files in
+    `directory`, using up to `workers` concurrent connections.
+
+    Returns a dict of table name -> (row count, seconds).
+    """
+    if queries is None:
+        queries = QUERIES
+    local = threading.local()
+    connections = []
+    lock = threading.Lock()
+
+    def _extract(name):
+        start = time.perf_counter()
+        # one connection per worker thread, reused for its next tables
+        conn = getattr(local, "conn", None)
+        if conn is None:
+            conn = local.conn = connect()
+            with lock:
+                connections.append(conn)
+        count = extract_table(conn, queries[name], staging_path(directory, name))
+        return count, time.perf_counter() - start
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {name: executor.submit(_extract, name) for name in queries}
+        return {name: future.result() for name, future in futures.items()}
+    finally:
+        for conn in connections:
+            conn.close()
+
+
+def staged_batches(directory, name):
+    """Yields the rows of a staged table, as lists of (at most) FETCH_SIZE dicts."""
+    with open(staging_path(directory, name), encoding="utf-8") as f:
+        columns = json.loads(f.readline())
+        rows = []
+        for line in f:
+            rows.append(dict(zip(columns, json.loads(line, object_hook=_decode))))
+            if len(rows) >= FETCH_SIZE:
+                yield rows
+                rows = []
+        if rows:
+            yield rows
+
+
+def dump(directory, path, extracted):
+    """
+    Saves the staging files of the `extracted` tables (as returned by
+    `extract`) in `directory` to the snapshot `path`.
+    """
+    manifest = {
+        "format": SNAPSHOT_FORMAT,
+        "created": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "tables": {name: count for name, (count, _) in extracted.items()},
+    }
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED, compresslevel=9) as zf:
+        zf.writestr(SNAPSHOT_MANIFEST, json.dumps(manifest, indent=2))
+        for name in extracted:
+            zf.write(staging_path(directory, name), f"{name}.jsonl")
+
+
+def restore(path, directory):
+    """
+    Restores the staging files of the snapshot `path` to `directory`.
+    Returns its manifest.
+    """
+    with zipfile.ZipFile(path) as zf:
+        manifest = json.loads(zf.read(SNAPSHOT_MANIFEST))
+        if manifest.get("format") != SNAPSHOT_FORMAT:
+            raise ValueError(
+                f"Unsupported snapshot format {manifest.get('format')} in {path}."
+            )
+        missing = set(QUERIES) - set(manifest["tables"])
+        if missing:
+            raise ValueError(
+                f"Tables {', '.join(sorted(missing))} missing from {path}."
+            )
+        for name in manifest["tables"]:
+            zf.extract(f"{name}.jsonl", directory)
+    return manifest
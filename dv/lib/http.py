@@ -1,9 +1,17 @@
 import csv
 import io
+import json
+from decimal import Decimal
 
+from django.conf import settings
 from django.core.serializers.json import DjangoJSONEncoder
 from django.http import HttpResponse, JsonResponse
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 
 class SetEncoder(DjangoJSONEncoder):
     def default(self, obj):
@@ -12,18 +20,134 @@ class SetEncoder(DjangoJSONEncoder):
         return super().default(obj)
 
 
-class JsonResponse(JsonResponse):
+def _json_dumps(data, encoder=SetEncoder, indent=None):
+    separators = None if indent else (",", ":")
+    return json.dumps(
+        data,
+        cls=encoder,
+        indent=indent,
+        separators=separators,
+        ensure_ascii=False,
+    ).encode()
+
+
+_django_encoder = SetEncoder()
+
+
+def _orjson_default(obj):
+    # Decimals are serialized as strings, to keep their precision.
+    if isinstance(obj, Decimal):
+        return str(obj)
+    # Anything else DjangoJSONEncoder knows about: sets, dates (in
+    # Django's format), lazy strings etc.
+    return _django_encoder.default(obj)
+
+
+def _orjson_dumps(data, encoder=SetEncoder, indent=None):
+    if encoder not in (SetEncoder, DjangoJSONEncoder) or indent not in (None, 2):
+        # custom serialization, or unsupported by orjson
+        return _json_dumps(data, encoder=encoder, indent=indent)
+
+    option = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+    if indent:
+        option |= orjson.OPT_INDENT_2
+    try:
+        return orjson.dumps(data, default=_orjson_default, option=option)
+    except orjson.JSONEncodeError:
+        # e.g. integers over 64 bits, let the standard library handle it
+        return _json_dumps(data, encoder=encoder, indent=indent)
+
+
+#: name -> callable(data, encoder=SetEncoder, indent=None) returning bytes
+JSON_BACKENDS = {"json": _json_dumps}
+if orjson is not None:
+    JSON_BACKENDS["orjson"] = _orjson_dumps
+
+
+def dumps(data, encoder=SetEncoder, indent=None, backend=None):
     """
-    Like Django's JsonResponse, but serializes "unsafe" data by default
-    and sets other defaults.
+    Encodes `data` as (compact, UTF-8) JSON bytes.
+
+    Decimals are encoded as strings and sets as sorted lists. `backend` is
+    one of `JSON_BACKENDS`, and defaults to the `API_JSON_BACKEND` setting,
+    or to the fastest one available.
     """
+    if backend is None:
+        backend = getattr(settings, "API_JSON_BACKEND", None)
+    if backend is None:
+        backend = "orjson" if "orjson" in JSON_BACKENDS else "json"
+    return JSON_BACKENDS[backend](data, encoder=encoder, indent=indent)
+
+
+def is_columnar(request):
+    """Whether the client asked for the columnar layout (`?layout=columnar`)."""
+    return request.GET.get("layout") == "columnar"
+
 
-    def __init__(self, *args, **kwargs):
-        kwargs.setdefault("safe", False)
-        kwargs.setdefault("json_dumps_params", {})
-        kwargs["json_dumps_params"].setdefault("indent", 2)
+def to_columns(rows):
+    """
+    Converts a list of dicts to the columnar layout:
+
+        {
+            "length": <number of rows>,
+            "columns": {
+                <field>: [<value of each row>],
+                <field>: {"values": [<distinct values>], "index": [<value index>]},
+                ...
+            },
+        }
+
+    String columns having at most one distinct value for every two rows are
+    dictionary-encoded, as in the second form. Fields missing from a row
+    are null.
+    """
+    fields = {}
+    for row in rows:
+        for field in row:
+            fields.setdefault(field)
+
+    columns = {}
+    for field in fields:
+        column = [row.get(field) for row in rows]
+        index = {}
+        if all(value is None or isinstance(value, str) for value in column):
+            for value in column:
+                index.setdefault(value, len(index))
+        if index and len(index) * 2 <= len(column):
+            columns[field] = {
+                "values": list(index),
+                "index": [index[value] for value in column],
+            }
+        else:
+            columns[field] = column
+
+    return {"length": len(rows), "columns": columns}
+
+
+class JsonResponse(JsonResponse):
+    """
+    Like Django's JsonResponse, but serializes "unsafe" data by default,
+    supports sets, and encodes the data using `dumps`.
+    Only the `indent` key of `json_dumps_params` is supported.
+    """
 
-        super(JsonResponse, self).__init__(*args, **kwargs)
+    def __init__(
+        self,
+        data,
+        encoder=SetEncoder,
+        safe=False,
+        json_dumps_params=None,
+        **kwargs,
+    ):
+        if safe and not isinstance(data, dict):
+            raise TypeError(
+                "In order to allow non-dict objects to be serialized set the "
+                "safe parameter to False."
+            )
+        kwargs.setdefault("content_type", "application/json")
+        content = dumps(data, encoder=encoder, **(json_dumps_params or {}))
+        # skip JsonResponse's own encoding
+        HttpResponse.__init__(self, content=content, **kwargs)
 
 
 class CsvResponse(HttpResponse):
@@ -0,0 +1,184 @@
+"""
+Incremental search indexing, from the changesets of the incremental import.
+
+A document is prepared from its object and from related rows, e.g. a
+project's document has the name of its programme and the outcomes of the
+programme's indicators. DEPENDENCIES lists, for every indexed model, the
+lookups from it to those related rows, so a change to any of them updates
+the document. The rows of the static models (states, priority sectors,
+NUTS) aren't part of the changesets, and aren't listed.
+"""
+
+import hashlib
+import json
+
+from haystack import connections
+from haystack.utils import get_model_ct
+
+from dv import search_indexes
+from dv.models import BilateralInitiative, News, Organisation, Programme, Project
+
+BATCH_SIZE = 1000
+
+DEPENDENCIES = {
+    BilateralInitiative: (
+        "programme",
+        "project",
+        "programme_areas",
+    ),
+    Programme: (
+        "indicators",
+        "programme_areas",
+        "organisation_roles",
+        "organisation_roles__organisation",
+    ),
+    Project: (
+        "programme",
+        "programme__indicators",
+        "programme_areas",
+        "organisation_roles",
+        "organisation_roles__organisation",
+    ),
+    News: (
+        "project",
+        "project__programme",
+        "project__programme__indicators",
+        "project__programme_areas",
+        "programmes",
+        "programmes__indicators",
+        "programmes__programme_areas",
+    ),
+    Organisation: (
+        "roles",
+        "roles__programme",
+        "roles__programme__programme_areas",
+        "roles__project",
+        "roles__project__programme",
+        "roles__project__programme_areas",
+    ),
+}
+
+
+def _batches(values):
+    values = list(values)
+    while values:
+        batch, values = values[:BATCH_SIZE], values[BATCH_SIZE:]
+        yield batch
+
+
+def _pks(model, lookup, values):
+    """Returns the pks of the `model` objects with `lookup` in `values`."""
+    pks = set()
+    for batch in _batches(values):
+        pks.update(
+            model.objects.filter(**{f"{lookup}__in": batch}).values_list(
+                "pk", flat=True
+            )
+        )
+    return pks
+
+
+def _resolve(model, lookup):
+    """Returns the model `lookup` leads to from `model`, and its last field."""
+    field = None
+    for name in lookup.split("__"):
+        field = model._meta.get_field(name)
+        model = field.related_model
+    return model, field
+
+
+def merge_changes(changesets):
+    """
+    Merges the changes of successive `changesets` (see DeltaStage), the
+    later actions on an object replacing the earlier ones.
+    """
+    merged = {}
+    for changes in changesets:
+        for label, actions in changes.items():
+            into = merged.setdefault(
+                label,
+                {"created": set(), "updated": set(), "deleted": set()},
+            )
+            for action in ("created", "updated", "deleted"):
+                pks = set(actions.get(action, ()))
+                for other in ("created", "updated", "deleted"):
+                    into[other] -= pks
+                into[action] |= pks
+            deleted_from = into.setdefault("deleted_from", {})
+            for field, owners in actions.get("deleted_from", {}).items():
+                deleted_from.setdefault(field, set()).update(owners)
+    return merged
+
+
+def changed_documents(changes):
+    """
+    Returns the documents to update and to remove after the `changes` of a
+    changeset, as {model: (pks to update, pks to remove)}.
+    """
+
+    def _changed(model):
+        actions = changes.get(model.__name__, {})
+        return set(actions.get("created", ())) | set(actions.get("updated", ()))
+
+    documents = {}
+    for model, lookups in DEPENDENCIES.items():
+        update = _changed(model)
+        remove = set(changes.get(model.__name__, {}).get("deleted", ()))
+        for lookup in lookups:
+            related, field = _resolve(model, lookup)
+            update |= _pks(model, lookup, _changed(related))
+
+            if field.one_to_many:
+                # the deleted rows are gone, look up the objects they were
+                # deleted from instead, e.g. the programme of an indicator
+                deleted_from = changes.get(related.__name__, {}).get("deleted_from", {})
+                owners = deleted_from.get(field.field.name, ())
+                prefix = lookup.rpartition("__")[0] or "pk"
+                update |= _pks(model, prefix, owners)
+        documents[model] = (update - remove, remove)
+    return documents
+
+
+def schema_fingerprint(using="default"):
+    """
+    Returns the fingerprint of the index schema: the fields of the indexes
+    and the index settings, and the documents' SCHEMA_VERSION.
+    """
+    backend = connections[using].get_backend()
+    fields = connections[using].get_unified_index().all_searchfields()
+    schema = {
+        "version": search_indexes.SCHEMA_VERSION,
+        "fields": backend.build_schema(fields),
+        "settings": backend.DEFAULT_SETTINGS,
+    }
+    return hashlib.sha256(
+        json.dumps(schema, sort_keys=True, default=str).encode()
+    ).hexdigest()
+
+
+def update_documents(documents, using="default"):
+    """
+    Updates and removes the `documents` (see changed_documents) in the index.
+    The objects excluded by their index queryset are removed too. Returns
+    the numbers of documents updated and removed, by model.
+    """
+    backend = connections[using].get_backend()
+    unified_index = connections[using].get_unified_index()
+    counts = {}
+    for model, (update, remove) in documents.items():
+        index = unified_index.get_index(model)
+        remove = set(remove)
+        updated = 0
+        for batch in _batches(sorted(update)):
+            objs = list(index.index_queryset(using=using).filter(pk__in=batch))
+            if objs:
+                backend.update(index, objs, commit=False)
+            updated += len(objs)
+            remove.update(set(batch) - {obj.pk for obj in objs})
+        ct = get_model_ct(model)
+        for batch in _batches(sorted(remove)):
+            backend.remove_many([f"{ct}.{pk}" for pk in batch], commit=False)
+        counts[model.__name__] = (updated, len(remove))
+    if any(updated or removed for updated, removed in counts.values()):
+        backend.conn.indices.refresh(index=backend.index_name)
+    return counts
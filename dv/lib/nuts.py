@@ -0,0 +1,174 @@
+"""
+NUTS hierarchy helpers.
+
+Project allocations are located at any NUTS level, while the maps work
+with NUTS3 regions. Allocations above level 3 are split evenly among the
+NUTS3 regions they contain, and the project counts etc. are added to all
+of them.
+
+NOTE: "In every country at every NUTS level the “Extra-Regio” regions
+have been designated (coded by adding to a two-letter country code
+the letter Z at NUTS level 1, letters ZZ at NUTS level 2 and letters
+ZZZ at NUTS level 3)."
+
+(we'll pretend the Zs are root)
+"""
+
+import logging
+from collections import defaultdict
+
+from django.db.models import CharField
+from django.db.models.functions import Length
+
+from dv.lib.cache import data_token
+from dv.lib.utils import NUTS_VERSION_BY_PERIOD
+from dv.models import NUTS
+
+logger = logging.getLogger(__name__)
+
+CharField.register_lookup(Length, "length")
+
+_indexes = {}
+
+
+class NutsIndex:
+    """
+    Maps every NUTS0-2 code to the (sorted) NUTS3 regions it contains,
+    for one NUTS version.
+    """
+
+    def __init__(self, nuts3_codes):
+        children = defaultdict(list)
+        for code in sorted(nuts3_codes):
+            for length in (2, 3, 4):
+                children[code[:length]].append(code)
+        self._children = {parent: tuple(codes) for parent, codes in children.items()}
+
+    @classmethod
+    def for_period(cls, period, request=None):
+        """
+        Returns the (cached) index for the NUTS version used in `period`.
+        It's rebuilt when the data token changes, the NUTS import bumps it.
+        """
+        version = NUTS_VERSION_BY_PERIOD[period]
+        token = data_token(request)
+        try:
+            cached_token, index = _indexes[version]
+        except KeyError:
+            pass
+        else:
+            if cached_token == token:
+                return index
+
+        index = cls(
+            NUTS.objects.filter(nuts_versions__year=version, code__length=5)
+            .exclude(code__endswith="Z")  # skip extra-regio
+            .values_list("code", flat=True)
+        )
+        _indexes[version] = (token, index)
+        return index
+
+    def nuts3(self, code):
+        """The NUTS3 regions contained by `code`."""
+        return self._children.get(code, ())
+
+    def targets(self, nuts_id, state_id, force_nuts3=True):
+        """
+        Returns the NUTS codes an allocation located in `nuts_id`
+        is attributed to, for a project in `state_id`.
+        """
+        code = nuts_id
+        if len(code) > 2 and code.endswith("Z"):  # extra-regio
+            code = code[:2]
+
+        if not force_nuts3 or len(code) == 5:
+            return (nuts_id,)
+        if len(code) == 2:
+            return self.nuts3(state_id)
+        if not code.startswith(state_id):
+            return ()
+        return self.nuts3(code)
+
+
+def aggregate_by_nuts(
+    allocations,
+    state_id,
+    period,
+    group_by,
+    row_factory,
+    fill,
+    force_nuts3=True,
+    index=None,
+):
+    """
+    Aggregates `ProjectAllocation`s of a beneficiary state by NUTS region.
+
+    :param group_by: callable returning the row key of an allocation,
+        besides its NUTS region.
+    :param row_factory: callable returning an empty row. Must contain
+        an "allocation" field.
+    :param fill: callable populating a row with the attributes of an
+        allocation (except its id and allocation). Sets and dicts are
+        merged when split among regions, other values are assigned.
+    :param index: the `NutsIndex` to use, defaults to the one of `period`.
+
+    Returns a dict of (NUTS code, *key) -> row, in the order the rows were
+    first encountered.
+    """
+    if index is None:
+        index = NutsIndex.for_period(period)
+
+    # First pass: aggregate the allocations sharing the same location and
+    # key, so each of these is split among its regions only once.
+    groups = {}
+    for pa in allocations:
+        key = (pa.project.nuts_id, *group_by(pa))
+        try:
+            group = groups[key]
+        except KeyError:
+            group = groups[key] = row_factory()
+        group["allocation"] += pa.allocation
+        fill(group, pa)
+
+    dataset = {}
+    targets_cache = {}
+    for (nuts_id, *key), group in groups.items():
+        try:
+            targets = targets_cache[nuts_id]
+        except KeyError:
+            targets = targets_cache[nuts_id] = index.targets(
+                nuts_id, state_id, force_nuts3
+            )
+
+        if not targets:
+            logger.warning(
+                "No NUTS3 regions found for %s in %s (%s)", nuts_id, state_id, period
+            )
+            continue
+
+        allocation = group["allocation"]
+        if len(targets) > 1:
+            allocation = allocation / len(targets)
+
+        for nuts in targets:
+            datakey = (nuts, *key)
+            try:
+                row = dataset[datakey]
+            except KeyError:
+                row = dataset[datakey] = row_factory()
+                row["id"] = nuts
+            _merge(row, group, allocation)
+
+    return dataset
+
+
+def _merge(row, group, allocation):
+    for field, value in group.items():
+        if field == "allocation":
+            row[field] += allocation
+        elif isinstance(value, set):
+            row[field] |= value
+        elif isinstance(value, dict):
+            row[field].update(value)
+        else:
+            row[field] = value
@@ -0,0 +1,165 @@
+"""
+HTML sanitization of the imported texts.
+
+Cleaning the descriptions with bleach is the most expensive part of the
+imports, so the texts are cleaned in a process pool, a batch ahead of the
+rows being loaded in the db. The cleaned texts are cached on disk,
+keyed by the hash of the original, so the texts which didn't change (or
+which are repeated) aren't cleaned again, by this import or the next ones.
+"""
+
+import hashlib
+import os
+import re
+import sqlite3
+from concurrent.futures import Future, ProcessPoolExecutor
+
+import bleach
+
+COMMENTS_PATTERN = re.compile(r"&lt;!--.*--&gt;")
+
+# Bump when sanitize_html changes, to ignore the existing cache entries
+CACHE_VERSION = 1
+# Texts per process pool task
+CHUNK_SIZE = 100
+# Hashes per cache query, below SQLite's limit of variables
+QUERY_SIZE = 500
+
+
+def sanitize_html(text):
+    cleaned_text = bleach.clean(text or "", strip=True, strip_comments=True)
+    return COMMENTS_PATTERN.sub("", cleaned_text)
+
+
+def _sanitize_all(texts):
+    return [sanitize_html(text) for text in texts]
+
+
+def _hash(text):
+    return hashlib.sha256(text.encode()).digest()
+
+
+def _done(result):
+    future = Future()
+    future.set_result(result)
+    return future
+
+
+class Sanitizer:
+    """
+    Sanitizes the texts of the imported rows, in a pool of `workers` processes
+    (or in this one, if fewer than 2), caching the results in `cache_dir`.
+
+    Use as a context manager, which shuts the pool down and closes the cache.
+    """
+
+    def __init__(self, cache_dir=None, workers=0):
+        self.cache = None
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+            self.cache = sqlite3.connect(
+                os.path.join(
+                    cache_dir,
+                    f"sanitized.bleach-{bleach.__version__}.v{CACHE_VERSION}.sqlite3",
+                )
+            )
+            self.cache.execute(
+                "CREATE TABLE IF NOT EXISTS sanitized "
+                "(hash BLOB PRIMARY KEY, text TEXT NOT NULL)"
+            )
+        self.pool = ProcessPoolExecutor(workers) if workers > 1 else None
+        self.cached = 0
+        self.cleaned = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self.pool is not None:
+            self.pool.shutdown(cancel_futures=True)
+        if self.cache is not None:
+            self.cache.close()
+
+    def _lookup(self, hashes):
+        found = {}
+        if self.cache is None:
+            return found
+        hashes = list(hashes)
+        while hashes:
+            batch, hashes = hashes[:QUERY_SIZE], hashes[QUERY_SIZE:]
+            params = ", ".join("?" for _ in batch)
+            found.update(
+                self.cache.execute(
+                    f"SELECT hash, text FROM sanitized WHERE hash IN ({params})", batch
+                )
+            )
+        return found
+
+    def _submit(self, rows, columns, previous=None):
+        """
+        Starts cleaning the texts of `rows`, returns their hash -> clean text,
+        or (pending future, index) for those being cleaned, and the hashes of
+        the texts cleaned for this batch. The texts already cleaned (or
+        pending) for the `previous` batch are reused.
+        """
+        texts = {}
+        for row in rows:
+            for column in columns:
+                text = row[column] or ""
+                texts.setdefault(_hash(text), text)
+
+        results = {}
+        if previous:
+            results.update((key, previous[key]) for key in texts if key in previous)
+        found = self._lookup(key for key in texts if key not in results)
+        self.cached += len(found)
+        results.update(found)
+
+        missing = [(key, text) for key, text in texts.items() if key not in results]
+        self.cleaned += len(missing)
+        # only these are cached once cleaned, not those of the previous batch
+        submitted = {key for key, _ in missing}
+        while missing:
+            chunk, missing = missing[:CHUNK_SIZE], missing[CHUNK_SIZE:]
+            chunk_texts = [text for _, text in chunk]
+            future = (
+                self.pool.submit(_sanitize_all, chunk_texts)
+                if self.pool is not None
+                else _done(_sanitize_all(chunk_texts))
+            )
+            for idx, (key, _) in enumerate(chunk):
+                results[key] = future, idx
+        return results, submitted
+
+    def _resolve(self, rows, results, submitted, columns):
+        """Waits for the texts of `rows`, and replaces them with the clean ones."""
+        for key, value in results.items():
+            if isinstance(value, tuple):
+                future, idx = value
+                results[key] = future.result()[idx]
+        cleaned = [(key, results[key]) for key in submitted]
+        if self.cache is not None and cleaned:
+            with self.cache:
+                self.cache.executemany(
+                    "INSERT OR REPLACE INTO sanitized (hash, text) VALUES (?, ?)",
+                    cleaned,
+                )
+
+        for row in rows:
+            for column in columns:
+                row[column] = results[_hash(row[column] or "")]
+        return rows
+
+    def sanitized_batches(self, batches, columns):
+        """
+        Yields the `batches` of rows (dicts), with the HTML of their `columns`
+        sanitized. The next batch is cleaned while the current one is used.
+        """
+        pending = None
+        for rows in batches:
+            current = (rows, *self._submit(rows, columns, pending and pending[1]))
+            if pending is not None:
+                yield self._resolve(*pending, columns=columns)
+            pending = current
+        if pending is not None:
+            yield self._resolve(*pending, columns=columns)
@@ -0,0 +1,99 @@
+"""
+Shadow db imports.
+
+Instead of importing into the live SQLite db, the import runs on a shadow
+copy of it, made with SQLite's online backup API (a consistent copy, even
+while the live db is being read). The shadow db is then analyzed, and
+compacted with VACUUM INTO, which also defragments it. Once the compacted
+copy is verified, it's moved over the live db with an atomic rename: the
+web workers open the new file on their next connection, while the ones
+still connected to the old file keep reading it until they're done.
+"""
+
+import os
+import sqlite3
+from contextlib import closing, contextmanager
+
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+def _connect(path):
+    return closing(sqlite3.connect(path, isolation_level=None))
+
+
+def journal_mode(path):
+    with _connect(path) as conn:
+        return conn.execute("PRAGMA journal_mode").fetchone()[0]
+
+
+def backup(source, target):
+    """Copies the db `source` to `target`, with the online backup API."""
+    if os.path.exists(target):
+        os.remove(target)
+    with _connect(source) as src, _connect(target) as dst:
+        src.backup(dst)
+
+
+def optimize(path):
+    """Updates the query planner statistics of the db `path`."""
+    with _connect(path) as conn:
+        conn.execute("ANALYZE")
+        conn.execute("PRAGMA optimize")
+
+
+def compact(source, target):
+    """Writes a compacted, defragmented copy of the db `source` to `target`."""
+    if os.path.exists(target):
+        os.remove(target)
+    with _connect(source) as conn:
+        conn.execute("VACUUM INTO ?", [target])
+
+
+def table_counts(path):
+    """Returns the row counts of the tables of the db `path`."""
+    with _connect(path) as conn:
+        tables = [
+            name
+            for (name,) in conn.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table' ORDER BY name"
+            )
+        ]
+        return {
+            table: conn.execute(f'SELECT COUNT(*) FROM "{table}"').fetchone()[0]
+            for table in tables
+        }
+
+
+def verify(path, expected_counts):
+    """
+    Checks the integrity and the row counts of the db `path`, returns a list
+    of the problems found.
+    """
+    with _connect(path) as conn:
+        problems = [
+            message
+            for (message,) in conn.execute("PRAGMA quick_check")
+            if message != "ok"
+        ]
+    counts = table_counts(path)
+    for table in sorted(set(counts) | set(expected_counts)):
+        if counts.get(table) != expected_counts.get(table):
+            problems.append(
+                f"{table} has {counts.get(table)} rows instead of "
+                f"{expected_counts.get(table)}"
+            )
+    return problems
+
+
+@contextmanager
+def using(path, alias=DEFAULT_DB_ALIAS):
+    """Points the Django connection `alias` to the db `path` while active."""
+    connection = connections[alias]
+    live = connection.settings_dict["NAME"]
+    connection.close()
+    connection.settings_dict["NAME"] = path
+    try:
+        yield
+    finally:
+        connection.close()
+        connection.settings_dict["NAME"] = live
@@ -0,0 +1,160 @@
+"""
+Reading of the 2009-2014 spreadsheets.
+
+The worksheets are streamed row by row, with openpyxl's read-only mode,
+instead of loading the whole workbooks in memory. The parsed records are
+also cached on disk, keyed by the content hash of the workbook, so that
+unchanged files are parsed only once.
+"""
+
+import hashlib
+import os
+import pickle
+from xml.etree.ElementTree import iterparse
+
+import openpyxl
+from openpyxl.worksheet._reader import COL_TAG, ROW_TAG
+
+# Bump when the parsed records change, to ignore the existing cache entries
+CACHE_VERSION = 2
+# Records per pickle in the cache files
+BATCH_SIZE = 1000
+
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _is_set(value):
+    return value in ("1", "true")
+
+
+def hidden_rows_and_columns(worksheet):
+    """
+    Returns the (1-based) numbers of the hidden rows and columns of a
+    read-only `worksheet`, which doesn't load them, by streaming its XML.
+    """
+    rows, columns = set(), set()
+    row = 0
+    with worksheet._get_source() as source:
+        for _, element in iterparse(source):
+            if element.tag == COL_TAG:
+                if _is_set(element.get("hidden")):
+                    columns.update(
+                        range(int(element.get("min")), int(element.get("max")) + 1)
+                    )
+            elif element.tag == ROW_TAG:
+                row = int(element.get("r", row + 1))
+                if _is_set(element.get("hidden")):
+                    rows.add(row)
+                element.clear()
+    return rows, columns
+
+
+class Sheet:
+    """
+    A worksheet of a workbook, read as records (dicts of column -> value,
+    the columns being named by the first row).
+
+    As with pyexcel, empty cells are read as "", and hidden rows and columns
+    are left out. Empty rows are skipped. If
+    the workbook has no worksheet called `name`, its first visible one is
+    used, and `log` is called with a message saying so.
+    """
+
+    def __init__(self, path, name, cache_dir=None, log=None):
+        self.path = path
+        self.name = name
+        self.cache_path = None
+        if cache_dir:
+            self.cache_path = os.path.join(
+                cache_dir, f"{file_hash(path)}.{name}.v{CACHE_VERSION}.pickle"
+            )
+        if not self.cached:
+            # check for the worksheet early, it's read only when iterated
+            book = self._open()
+            try:
+                self._worksheet(book, log)
+            finally:
+                book.close()
+
+    @property
+    def cached(self):
+        return self.cache_path is not None and os.path.exists(self.cache_path)
+
+    def _open(self):
+        return openpyxl.load_workbook(self.path, read_only=True, data_only=True)
+
+    def _worksheet(self, book, log=None):
+        if self.name in book.sheetnames:
+            return book[self.name]
+        worksheets = [ws for ws in book.worksheets if ws.sheet_state != "hidden"]
+        if not worksheets:
+            raise ValueError(f"No worksheets found in {self.name}.")
+        if log is not None:
+            sheet_names = ", ".join(ws.title for ws in worksheets)
+            log(f"Assuming first worksheet of {sheet_names}.")
+        return worksheets[0]
+
+    @property
+    def records(self):
+        if self.cached:
+            return self._cached_records()
+        if self.cache_path:
+            return self._caching_records()
+        return self._parse()
+
+    def _parse(self):
+        book = self._open()
+        try:
+            worksheet = self._worksheet(book)
+            hidden_rows, hidden_columns = hidden_rows_and_columns(worksheet)
+            rows = (
+                [value for idx, value in enumerate(row, 1) if idx not in hidden_columns]
+                for idx, row in enumerate(worksheet.iter_rows(values_only=True), 1)
+                if idx not in hidden_rows
+            )
+            header = next(rows, None) or ()
+            columns = ["" if value is None else str(value) for value in header]
+            for row in rows:
+                values = ["" if value is None else value for value in row]
+                if all(value == "" for value in values):
+                    continue
+                values.extend([""] * (len(columns) - len(values)))
+                yield dict(zip(columns, values))
+        finally:
+            book.close()
+
+    def _cached_records(self):
+        with open(self.cache_path, "rb") as f:
+            while True:
+                try:
+                    batch = pickle.load(f)
+                except EOFError:
+                    break
+                yield from batch
+
+    def _caching_records(self):
+        # written aside, and moved in place only once complete
+        os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+        tmp_path = f"{self.cache_path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                batch = []
+                for record in self._parse():
+                    batch.append(record)
+                    # the consumer may change the records
+                    yield dict(record)
+                    if len(batch) >= BATCH_SIZE:
+                        pickle.dump(batch, f, pickle.HIGHEST_PROTOCOL)
+                        batch = []
+                if batch:
+                    pickle.dump(batch, f, pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self.cache_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
@@ -0,0 +1,157 @@
+"""
+Materialized API responses.
+
+The API payloads only change when the data is imported, so the import
+ends by rendering every snapshot-enabled endpoint for every period and
+storing the encoded bytes in `ApiSnapshot`. The views then serve those
+bytes directly, and only compute the response live when no snapshot
+exists (or the request has parameters other than the period).
+"""
+
+import inspect
+import logging
+from functools import wraps
+
+from django.db import transaction
+from django.http import HttpRequest, HttpResponse, QueryDict
+
+from dv.lib.utils import (
+    DEFAULT_PERIOD,
+    FUNDING_PERIODS_DICT,
+    NUTS_VERSION_BY_PERIOD,
+)
+from dv.models import ApiSnapshot, ProjectAllocation
+
+logger = logging.getLogger(__name__)
+
+# Bump this whenever the payload of a snapshot-enabled endpoint changes,
+# so snapshots built by older code are ignored until the next import.
+SNAPSHOT_VERSION = 2
+
+#: name -> (live view, is per-beneficiary, needs NUTS)
+SNAPSHOT_VIEWS = {}
+
+
+def snapshot(name, nuts=False):
+    """
+    Serves the view from its stored snapshot when available.
+
+    `name` is the endpoint name, formatted with the view kwargs
+    (e.g. "grants/{beneficiary}"). The undecorated view is available
+    as the `live` attribute of the returned function, and whether it
+    needs NUTS as `needs_nuts`.
+
+    Per-beneficiary views, and those flagged with `nuts`, are only
+    snapshotted for the periods having a NUTS version.
+    """
+
+    def decorator(view):
+        signature = inspect.signature(view)
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method == "GET" and set(request.GET.keys()) <= {"period"}:
+                try:
+                    # the arguments may be positional, e.g. the beneficiary
+                    bound = signature.bind(request, *args, **kwargs)
+                    bound.apply_defaults()
+                    endpoint = name.format(**bound.arguments)
+                except (TypeError, KeyError):
+                    # served live, which reports the bad arguments
+                    endpoint = None
+                if endpoint is not None:
+                    response = get_snapshot_response(
+                        endpoint, request.GET.get("period", DEFAULT_PERIOD)
+                    )
+                    if response is not None:
+                        return response
+            return view(request, *args, **kwargs)
+
+        per_beneficiary = "{beneficiary}" in name
+        wrapper.live = view
+        wrapper.needs_nuts = nuts or per_beneficiary
+        SNAPSHOT_VIEWS[name] = (view, per_beneficiary, wrapper.needs_nuts)
+        return wrapper
+
+    return decorator
+
+
+def get_snapshot_response(endpoint, period):
+    snap = (
+        ApiSnapshot.objects.filter(
+            endpoint=endpoint,
+            period=period,
+            version=SNAPSHOT_VERSION,
+        )
+        .values_list("content", "content_type")
+        .first()
+    )
+    if snap is None:
+        return None
+    content, content_type = snap
+    return HttpResponse(bytes(content), content_type=content_type)
+
+
+def render_view(view, period, **kwargs):
+    """Calls an API view with a bare GET request for the given period."""
+    request = HttpRequest()
+    request.method = "GET"
+    request.GET = QueryDict(mutable=True)
+    request.GET["period"] = period
+    return view(request, **kwargs)
+
+
+def beneficiary_states(period):
+    """The codes of the beneficiary states with project allocations in `period`."""
+    return list(
+        ProjectAllocation.objects.filter(funding_period=FUNDING_PERIODS_DICT[period])
+        .values_list("state_id", flat=True)
+        .distinct()
+        .order_by("state_id")
+    )
+
+
+def iter_snapshots(period):
+    """Renders all snapshot-enabled endpoints for the given period."""
+    has_nuts = period in NUTS_VERSION_BY_PERIOD
+    beneficiaries = beneficiary_states(period) if has_nuts else []
+
+    for name, (view, per_beneficiary, nuts) in SNAPSHOT_VIEWS.items():
+        if nuts and not has_nuts:
+            continue
+        kwargs_list = (
+            [{"beneficiary": b} for b in beneficiaries] if per_beneficiary else [{}]
+        )
+        for kwargs in kwargs_list:
+            endpoint = name.format(**kwargs)
+            response = render_view(view, period, **kwargs)
+            if response.status_code != 200:
+                logger.warning(
+                    "Snapshot %s for %s returned %s, skipping",
+                    endpoint,
+                    period,
+                    response.status_code,
+                )
+                continue
+            yield ApiSnapshot(
+                endpoint=endpoint,
+                period=period,
+                version=SNAPSHOT_VERSION,
+                content_type=response["Content-Type"],
+                content=response.content,
+            )
+
+
+def build_snapshots(period):
+    """
+    Replaces the stored snapshots for the given period.
+    Returns the list of created `ApiSnapshot` objects.
+    """
+    # render everything first, so the old snapshots stay in place
+    # until the new ones are ready
+    snapshots = list(iter_snapshots(period))
+    with transaction.atomic():
+        ApiSnapshot.objects.filter(period=period).delete()
+        ApiSnapshot.objects.exclude(version=SNAPSHOT_VERSION).delete()
+        ApiSnapshot.objects.bulk_create(snapshots)
+    return snapshots
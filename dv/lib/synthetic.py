@@ -0,0 +1,630 @@
+"""
+Synthetic grACE source data, for profiling the 2014-2021 import.
+
+`generate` writes staging files (see dv.lib.grace) shaped like the grACE
+tables, at about the volume of the 2014-2021 data times `scale`. The
+programmes, and with them the projects, organisations and their roles,
+indicators and bilateral initiatives, are multiplied; the states and the
+programme areas aren't. The data is random, but the same for a given seed.
+`generate_snapshot` saves them as a snapshot, see grace.dump.
+"""
+
+import random
+import tempfile
+import time
+from decimal import Decimal
+
+from dv.lib import grace
+from dv.lib.utils import EEA_DONOR_STATES
+from dv.models import NUTS
+
+# Hungary is left out, its programmes are excluded by the import anyway
+BENEFICIARY_STATES = {
+    "BG": "Bulgaria",
+    "CY": "Cyprus",
+    "CZ": "Czechia",
+    "EE": "Estonia",
+    "EL": "Greece",
+    "HR": "Croatia",
+    "LT": "Lithuania",
+    "LV": "Latvia",
+    "MT": "Malta",
+    "PL": "Poland",
+    "PT": "Portugal",
+    "RO": "Romania",
+    "SI": "Slovenia",
+    "SK": "Slovakia",
+}
+DONOR_STATES = sorted(EEA_DONOR_STATES)
+
+PRIORITY_SECTORS = 7
+PROGRAMME_AREAS = 23
+
+# Volumes at scale 1, roughly those of the 2014-2021 data
+PROGRAMMES_PER_STATE = 7
+PROJECTS_PER_PROGRAMME = 70
+INDICATORS_PER_PROGRAMME = 25
+BILATERAL_INITIATIVES_PER_PROGRAMME = 12
+PROJECTS_PER_PROMOTER = 2
+DONOR_ORGANISATIONS = 400
+# Share of the programmes and projects with a donor partner
+DONOR_PARTNERSHIPS = 0.4
+# Share of the projects funded by both FMs, and of those with several areas
+DUAL_FM_PROJECTS = 0.1
+MULTI_AREA_PROJECTS = 0.2
+
+# The organisation ids of each beneficiary state are in their own range
+ORGANISATION_ID_STRIDE = 10**7
+
+CITIES = ["Capital", "Harbour", "Riverside", "Hilltown", "Old Town", "Newport"]
+ORGANISATION_CATEGORIES = {
+    "Public entity": ["National public entity", "Local public entity"],
+    "Private entity": ["Private company", "Small or medium sized enterprise"],
+    "Civil society": ["NGO", "Foundation"],
+    "Education": ["University, college or other higher education institution"],
+}
+PROJECT_STATUSES = ["In Progress", "Completed", "Terminated"]
+WORDS = (
+    "cooperation research innovation climate energy efficiency capacity local "
+    "development social inclusion roma youth employment culture heritage "
+    "justice environment water education health civil society partnership "
+    "institutions training renewable digital knowledge rights"
+).split()
+
+# Staging table columns, as queried from grACE
+COLUMNS = {
+    "ProgrammeArea": [
+        "FundingPeriod",
+        "PSCode",
+        "PrioritySector",
+        "PACode",
+        "ProgrammeArea",
+        "ProgrammeAreaShortName",
+        "idPA",
+        "Objective",
+    ],
+    "Allocation": [
+        "FundingPeriod",
+        "Country",
+        "PACode",
+        "GrantShortName",
+        "GrossAllocation",
+        "NetAllocation",
+        "Thematic",
+    ],
+    "Programme": [
+        "FundingPeriod",
+        "Country",
+        "ProgrammeShortName",
+        "Programme",
+        "ProgrammeSummary",
+        "ProgrammeStatus",
+        "ProgrammeGrantEEA",
+        "ProgrammeGrantNorway",
+        "ProgrammeCoFinancing",
+        "IsTAProgramme",
+        "IsBFProgramme",
+        "ProgrammeAreaList",
+    ],
+    "ProgrammeAllocation": [
+        "GrantShortName",
+        "Country",
+        "PACode",
+        "PSCode",
+        "ProgrammeShortName",
+        "BudgetHeadingGrant",
+        "Thematic",
+        "SDGno",
+    ],
+    "Project": [
+        "ProjectCode",
+        "Project",
+        "ProjectContractStatus",
+        "Country",
+        "ProgrammeShortName",
+        "ProjectLocation",
+        "SDGno",
+        "ProjectGrant",
+        "IdFinancialMechanismEEA",
+        "IdFinancialMechanismNorway",
+        "Hasended",
+        "isdpp",
+        "ResultPositiveEffects",
+        "ResultsImprovedKnowledge",
+        "CooperationContinue",
+        "ProjectInitialDescriptionHtml",
+        "ProjectResultsDescriptionHtml",
+        "Thematic",
+        "ProgrammeAreaCodesList",
+        "PrioritySectorCodesList",
+        "HostPA",
+        "HostPS",
+    ],
+    "Indicator": [
+        "ProgrammeShortName",
+        "PACode",
+        "Country",
+        "CoreCommonIndicator",
+        "Outcome",
+        "Header",
+        "UnitOfMeasurement",
+        "Achievement_EEA",
+        "Achievement_Norway",
+        "AchievementDecimal",
+        "CoreIndicatorCode",
+        "IsCore",
+        "IsCommon",
+        "Thematic",
+        "SDGno",
+    ],
+    # Written before the organisations, which are the ones having a role
+    "OrganisationRole": [
+        "IdOrganisation",
+        "Organisation",
+        "CountryOrganisation",
+        "City",
+        "OrganisationClassificationSector",
+        "OrganisationClassification",
+        "NUTSCode",
+        "OrganisationRoleCode",
+        "OrganisationRole",
+        "ProgrammeCode",
+        "ProjectCode",
+        "CountryRole",
+    ],
+    "Organisation": [
+        "IdOrganisation",
+        "Organisation",
+        "CountryOrganisation",
+        "City",
+        "OrganisationClassificationSector",
+        "OrganisationClassification",
+        "NUTSCode",
+    ],
+    "BilateralInitiative": [
+        "BICode",
+        "BITitle",
+        "BIURL",
+        "BIGrant",
+        "ProgrammeShortName",
+        "ProjectCode",
+        "Country",
+        "Level",
+        "BIStatus",
+        "BIInitialDescriptionHtml",
+        "BIResultsDescriptionHtml",
+        "PromoterCountry",
+        "PromoterOrganisation",
+        "ProgrammeAreaCodesList",
+    ],
+}
+
+ROLES = {
+    "PO": "Programme Operator",
+    "DPP": "Donor Programme Partner",
+    "PJPT": "Project Promoter",
+    "PJPP": "Project Partner",
+    "PJDPP": "Donor Project Partner",
+}
+
+
+def _money(rng, low, high):
+    return Decimal(rng.randint(low, high)).quantize(Decimal("0.01"))
+
+
+class Generator:
+    """
+    Yields the rows of each table, as dicts of column -> value. The tables
+    are generated independently, each with its own random sequence, from a
+    common layout of the programmes.
+    """
+
+    def __init__(self, scale=1, seed=0, nuts=()):
+        self.seed = seed
+        self.programmes_per_state = max(1, round(PROGRAMMES_PER_STATE * scale))
+        self.promoters_per_state = max(
+            1,
+            self.programmes_per_state * PROJECTS_PER_PROGRAMME // PROJECTS_PER_PROMOTER,
+        )
+        self.donor_organisations = max(1, round(DONOR_ORGANISATIONS * scale))
+        # projects are located at the most detailed NUTS level
+        self.nuts = {
+            state: [code for code in nuts if code.startswith(state) and len(code) == 5]
+            or [state]
+            for state in BENEFICIARY_STATES
+        }
+
+        rng = self._random("layout")
+        self.programme_areas = [
+            (f"PA{idx:02d}", f"PS{idx % PRIORITY_SECTORS + 1:02d}")
+            for idx in range(1, PROGRAMME_AREAS + 1)
+        ]
+        self.programmes = []
+        for state, name in BENEFICIARY_STATES.items():
+            for idx in range(1, self.programmes_per_state + 1):
+                self.programmes.append(
+                    {
+                        "code": f"{state}-PR{idx:04d}",
+                        "state": state,
+                        "country": name,
+                        "areas": rng.sample(self.programme_areas, rng.randint(1, 3)),
+                        "fms": rng.choice([["EEA"], ["Norway"], ["EEA", "Norway"]]),
+                        "donor_partner": rng.random() < DONOR_PARTNERSHIPS,
+                    }
+                )
+
+    def _random(self, table):
+        return random.Random(f"{self.seed}:{table}")
+
+    def _text(self, rng, words):
+        return " ".join(rng.choices(WORDS, k=words)).capitalize()
+
+    def _html(self, rng, paragraphs):
+        parts = [
+            f"<p>{self._text(rng, rng.randint(20, 60))}.</p>" for _ in range(paragraphs)
+        ]
+        if rng.random() < 0.3:
+            items = "".join(
+                f"<li>{self._text(rng, rng.randint(3, 8))}</li>"
+                for _ in range(rng.randint(2, 5))
+            )
+            parts.append(f"<ul>{items}</ul>")
+        # the markup which sanitize_html removes
+        if rng.random() < 0.1:
+            parts.append("&lt;!-- internal note --&gt;")
+        if rng.random() < 0.05:
+            parts.append('<script>alert("x")</script>')
+        return "\n".join(parts)
+
+    def _projects(self, programme):
+        return [
+            f"{programme['code']}-{idx:04d}"
+            for idx in range(1, PROJECTS_PER_PROGRAMME + 1)
+        ]
+
+    def _organisation(self, org_id):
+        if org_id < ORGANISATION_ID_STRIDE:
+            country, nuts = DONOR_STATES[org_id % len(DONOR_STATES)], None
+        else:
+            state = list(BENEFICIARY_STATES)[org_id // ORGANISATION_ID_STRIDE - 1]
+            country = BENEFICIARY_STATES[state]
+            nuts = self.nuts[state][org_id % len(self.nuts[state])]
+        categories = list(ORGANISATION_CATEGORIES)
+        category = categories[org_id % len(categories)]
+        subcategories = ORGANISATION_CATEGORIES[category]
+        return {
+            "IdOrganisation": org_id,
+            "Organisation": f"Organisation {org_id}",
+            "CountryOrganisation": country,
+            "City": CITIES[org_id % len(CITIES)],
+            "OrganisationClassificationSector": category,
+            "OrganisationClassification": subcategories[org_id % len(subcategories)],
+            "NUTSCode": nuts,
+        }
+
+    def _beneficiary_organisation(self, rng, state):
+        offset = (list(BENEFICIARY_STATES).index(state) + 1) * ORGANISATION_ID_STRIDE
+        return offset + rng.randrange(self.promoters_per_state)
+
+    def _donor_organisation(self, rng):
+        return rng.randrange(1, self.donor_organisations + 1)
+
+    def programme_area_rows(self):
+        rng = self._random("ProgrammeArea")
+        for order, (pa, ps) in enumerate(self.programme_areas, 1):
+            yield {
+                "FundingPeriod": "2014-2021",
+                "PSCode": ps,
+                "PrioritySector": f"Priority sector {ps}",
+                "PACode": pa,
+                "ProgrammeArea": f"Programme area {pa}",
+                "ProgrammeAreaShortName": self._text(rng, 3),
+                "idPA": order,
+                "Objective": self._text(rng, 12),
+            }
+
+    def allocation_rows(self):
+        rng = self._random("Allocation")
+        for name in BENEFICIARY_STATES.values():
+            for pa, _ in rng.sample(self.programme_areas, 8):
+                for fm in rng.choice([["EEA"], ["Norway"], ["EEA", "Norway"]]):
+                    gross = _money(rng, 10**6, 10**8)
+                    yield {
+                        "FundingPeriod": "2014-2021",
+                        "Country": name,
+                        "PACode": pa,
+                        "GrantShortName": fm,
+                        "GrossAllocation": gross,
+                        "NetAllocation": (gross * Decimal("0.92")).quantize(
+                            Decimal("0.01")
+                        ),
+                        "Thematic": "",
+                    }
+
+    def programme_rows(self):
+        rng = self._random("Programme")
+        for programme in self.programmes:
+            yield {
+                "FundingPeriod": "2014-2021",
+                "Country": programme["country"],
+                "ProgrammeShortName": programme["code"],
+                "Programme": self._text(rng, 5),
+                "ProgrammeSummary": self._html(rng, rng.randint(1, 4)),
+                "ProgrammeStatus": "Implementation",
+                "ProgrammeGrantEEA": (
+                    _money(rng, 10**6, 5 * 10**7) if "EEA" in programme["fms"] else 0
+                ),
+                "ProgrammeGrantNorway": (
+                    _money(rng, 10**6, 5 * 10**7) if "Norway" in programme["fms"] else 0
+                ),
+                "ProgrammeCoFinancing": _money(rng, 10**5, 10**7),
+                "IsTAProgramme": 0,
+                "IsBFProgramme": 0,
+                "ProgrammeAreaList": ", ".join(pa for pa, _ in programme["areas"]),
+            }
+
+        # Social Dialogue – Decent Work, with an entry for each of its states
+        yield {
+            "FundingPeriod": "2014-2021",
+            "Country": "",
+            "ProgrammeShortName": "SDDW",
+            "Programme": "Social Dialogue - Decent Work",
+            "ProgrammeSummary": self._html(rng, 2),
+            "ProgrammeStatus": "Implementation",
+            "ProgrammeGrantEEA": 0,
+            "ProgrammeGrantNorway": _money(rng, 10**6, 10**7),
+            "ProgrammeCoFinancing": 0,
+            "IsTAProgramme": 0,
+            "IsBFProgramme": 0,
+            "ProgrammeAreaList": self.programme_areas[0][0],
+        }
+        for state, name in BENEFICIARY_STATES.items():
+            yield {
+                "FundingPeriod": "2014-2021",
+                "Country": name,
+                "ProgrammeShortName": f"{state}-DECENTWORK",
+                "Programme": "Social Dialogue - Decent Work",
+                "ProgrammeSummary": "",
+                "ProgrammeStatus": "Implementation",
+                "ProgrammeGrantEEA": 0,
+                "ProgrammeGrantNorway": 0,
+                "ProgrammeCoFinancing": 0,
+                "IsTAProgramme": 0,
+                "IsBFProgramme": 0,
+                "ProgrammeAreaList": self.programme_areas[0][0],
+            }
+
+    def programme_allocation_rows(self):
+        rng = self._random("ProgrammeAllocation")
+        for programme in self.programmes:
+            for pa, ps in programme["areas"]:
+                for fm in programme["fms"]:
+                    yield {
+                        "GrantShortName": fm,
+                        "Country": programme["country"],
+                        "PACode": pa,
+                        "PSCode": ps,
+                        "ProgrammeShortName": programme["code"],
+                        "BudgetHeadingGrant": _money(rng, 10**5, 10**7),
+                        "Thematic": "",
+                        "SDGno": rng.randint(1, 17),
+                    }
+
+    def project_rows(self):
+        rng = self._random("Project")
+        for programme in self.programmes:
+            for code in self._projects(programme):
+                fms = programme["fms"]
+                if len(fms) > 1 and rng.random() >= DUAL_FM_PROJECTS:
+                    fms = [rng.choice(fms)]
+                areas = [rng.choice(programme["areas"])]
+                if (
+                    len(fms) == 1
+                    and len(programme["areas"]) > 1
+                    and rng.random() < MULTI_AREA_PROJECTS
+                ):
+                    areas = programme["areas"]
+                has_ended = rng.random() < 0.6
+                yield {
+                    "ProjectCode": code,
+                    "Project": self._text(rng, rng.randint(4, 12)),
+                    "ProjectContractStatus": rng.choice(PROJECT_STATUSES),
+                    "Country": programme["country"],
+                    "ProgrammeShortName": programme["code"],
+                    "ProjectLocation": rng.choice(self.nuts[programme["state"]]),
+                    "SDGno": rng.randint(1, 17),
+                    "ProjectGrant": _money(rng, 10**4, 3 * 10**6),
+                    "IdFinancialMechanismEEA": int("EEA" in fms),
+                    "IdFinancialMechanismNorway": int("Norway" in fms),
+                    "Hasended": has_ended,
+                    "isdpp": programme["donor_partner"] and rng.random() < 0.5,
+                    "ResultPositiveEffects": has_ended and rng.random() < 0.5,
+                    "ResultsImprovedKnowledge": has_ended and rng.random() < 0.5,
+                    "CooperationContinue": has_ended and rng.random() < 0.5,
+                    "ProjectInitialDescriptionHtml": self._html(rng, rng.randint(1, 5)),
+                    "ProjectResultsDescriptionHtml": (
+                        self._html(rng, rng.randint(1, 3)) if has_ended else None
+                    ),
+                    "Thematic": "",
+                    "ProgrammeAreaCodesList": ",".join(pa for pa, _ in areas),
+                    "PrioritySectorCodesList": ",".join(ps for _, ps in areas),
+                    "HostPA": areas[0][0],
+                    "HostPS": areas[0][1],
+                }
+
+    def indicator_rows(self):
+        rng = self._random("Indicator")
+        for programme in self.programmes:
+            for order in range(1, INDICATORS_PER_PROGRAMME + 1):
+                fms = programme["fms"]
+                eea = _money(rng, 0, 5000) if "EEA" in fms else 0
+                norway = _money(rng, 0, 5000) if "Norway" in fms else 0
+                yield {
+                    "ProgrammeShortName": programme["code"],
+                    "PACode": rng.choice(programme["areas"])[0],
+                    "Country": programme["country"],
+                    "CoreCommonIndicator": self._text(rng, 8),
+                    "Outcome": self._text(rng, 10),
+                    "Header": self._text(rng, 3),
+                    "UnitOfMeasurement": rng.choice(["Number", "Percentage", "Km"]),
+                    "Achievement_EEA": eea,
+                    "Achievement_Norway": norway,
+                    "AchievementDecimal": eea + norway,
+                    "CoreIndicatorCode": order,
+                    "IsCore": rng.random() < 0.3,
+                    "IsCommon": rng.random() < 0.3,
+                    "Thematic": "",
+                    "SDGno": rng.randint(1, 17),
+                }
+
+    def _role(self, org_id, role, country, programme=None, project=None):
+        return {
+            **self._organisation(org_id),
+            "OrganisationRoleCode": role,
+            "OrganisationRole": ROLES[role],
+            "ProgrammeCode": programme,
+            "ProjectCode": project,
+            "CountryRole": country,
+        }
+
+    def organisation_role_rows(self):
+        rng = self._random("OrganisationRole")
+        self.organisation_ids = set()
+        for programme in self.programmes:
+            state, country = programme["state"], programme["country"]
+            roles = [
+                self._role(
+                    self._beneficiary_organisation(rng, state),
+                    "PO",
+                    country,
+                    programme["code"],
+                )
+            ]
+            if programme["donor_partner"]:
+                roles.append(
+                    self._role(
+                        self._donor_organisation(rng), "DPP", country, programme["code"]
+                    )
+                )
+            for code in self._projects(programme):
+                roles.append(
+                    self._role(
+                        self._beneficiary_organisation(rng, state),
+                        "PJPT",
+                        country,
+                        programme["code"],
+                        code,
+                    )
+                )
+                for _ in range(rng.choice([0, 0, 1, 1, 2])):
+                    roles.append(
+                        self._role(
+                            self._beneficiary_organisation(rng, state),
+                            "PJPP",
+                            country,
+                            programme["code"],
+                            code,
+                        )
+                    )
+                if programme["donor_partner"] and rng.random() < DONOR_PARTNERSHIPS:
+                    roles.append(
+                        self._role(
+                            self._donor_organisation(rng),
+                            "PJDPP",
+                            country,
+                            programme["code"],
+                            code,
+                        )
+                    )
+            for role in roles:
+                self.organisation_ids.add(role["IdOrganisation"])
+            yield from roles
+
+    def organisation_rows(self):
+        # the organisations having a role, as the DISTINCT grACE query
+        for org_id in sorted(self.organisation_ids):
+            yield self._organisation(org_id)
+
+    def bilateral_initiative_rows(self):
+        rng = self._random("BilateralInitiative")
+        for programme in self.programmes:
+            projects = self._projects(programme)
+            for idx in range(1, BILATERAL_INITIATIVES_PER_PROGRAMME + 1):
+                level = rng.choice(["Programme", "Project", "Fund"])
+                yield {
+                    "BICode": f"{programme['code']}-BI{idx:03d}",
+                    "BITitle": self._text(rng, rng.randint(4, 10)),
+                    "BIURL": None,
+                    "BIGrant": _money(rng, 10**3, 10**5),
+                    "ProgrammeShortName": programme["code"],
+                    "ProjectCode": rng.choice(projects) if level == "Project" else None,
+                    "Country": programme["country"],
+                    "Level": level,
+                    "BIStatus": rng.choice(["Approved", "Completed"]),
+                    "BIInitialDescriptionHtml": self._html(rng, rng.randint(1, 3)),
+                    "BIResultsDescriptionHtml": self._html(rng, 1),
+                    "PromoterCountry": programme["country"],
+                    "PromoterOrganisation": f"Organisation "
+                    f"{self._beneficiary_organisation(rng, programme['state'])}",
+                    "ProgrammeAreaCodesList": ", ".join(
+                        pa for pa, _ in programme["areas"]
+                    ),
+                }
+
+
+TABLE_ROWS = {
+    "ProgrammeArea": Generator.programme_area_rows,
+    "Allocation": Generator.allocation_rows,
+    "Programme": Generator.programme_rows,
+    "ProgrammeAllocation": Generator.programme_allocation_rows,
+    "Project": Generator.project_rows,
+    "Indicator": Generator.indicator_rows,
+    "OrganisationRole": Generator.organisation_role_rows,
+    "Organisation": Generator.organisation_rows,
+    "BilateralInitiative": Generator.bilateral_initiative_rows,
+}
+
+
+def _batches(records, columns):
+    rows = []
+    for record in records:
+        rows.append([record[column] for column in columns])
+        if len(rows) >= grace.FETCH_SIZE:
+            yield rows
+            rows = []
+    if rows:
+        yield rows
+
+
+def generate(directory, scale=1, seed=0, nuts=()):
+    """
+    Writes the staging files of a synthetic grACE db to `directory`, with
+    the projects and organisations located in the `nuts` codes.
+
+    Returns a dict of table name -> (row count, seconds), like grace.extract.
+    """
+    generator = Generator(scale, seed, nuts)
+    generated = {}
+    for name, columns in COLUMNS.items():
+        start = time.perf_counter()
+        count = grace.write_table(
+            grace.staging_path(directory, name),
+            columns,
+            _batches(TABLE_ROWS[name](generator), columns),
+        )
+        generated[name] = count, time.perf_counter() - start
+    return generated
+
+
+def generate_snapshot(path, scale=1, seed=0):
+    """
+    Saves a synthetic grACE snapshot to `path`, with the projects and
+    organisations located in the NUTS regions of the db.
+
+    Returns a dict of table name -> (row count, seconds).
+    """
+    nuts = NUTS.objects.values_list("code", flat=True)
+    with tempfile.TemporaryDirectory(prefix="dv-synthetic-") as directory:
+        generated = generate(directory, scale, seed, nuts)
+        grace.dump(directory, path, generated)
+    return generated
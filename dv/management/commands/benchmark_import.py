@@ -0,0 +1,177 @@
+import json
+import os
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+from io import StringIO
+
+from django.conf import settings
+from django.core.management import call_command, load_command_class
+from django.core.management.base import BaseCommand
+from haystack import connections as haystack_connections
+
+from dv.lib.synthetic import generate_snapshot
+
+
+def _mib(size):
+    return f"{size / 2**20:.1f}" if size is not None else "-"
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the 2014-2021 import and the search indexing, on synthetic "
+        "grACE data at several multiples of the current volume"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--scale",
+            type=float,
+            action="append",
+            dest="scales",
+            help="Multiple of the 2014-2021 data volume, can be repeated. "
+            "Defaults to 1, 10 and 100.",
+        )
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument(
+            "--snapshot-dir",
+            help="A directory to keep the generated snapshots in, and reuse them "
+            "from. If not specified they're generated in a temporary directory.",
+        )
+        parser.add_argument(
+            "--skip-index",
+            action="store_true",
+            default=False,
+            help="Don't benchmark rebuild_index (e.g. without Elasticsearch).",
+        )
+        parser.add_argument(
+            "--no-memory",
+            action="store_false",
+            dest="memory",
+            default=True,
+            help="Don't trace the peak memory use, which slows everything down.",
+        )
+        parser.add_argument("--output", help="A JSON file to write the results to.")
+        parser.add_argument(
+            "--noinput",
+            action="store_true",
+            default=False,
+            help="No prompts will be issued to the user and the data will be wiped out.",
+        )
+
+    def handle(self, *args, **options):
+        scales = options["scales"] or [1, 10, 100]
+        if not options["noinput"]:
+            self.stdout.write(
+                self.style.NOTICE(
+                    f"This will replace the 2014-2021 data of {settings.DB_PATH} "
+                    f"with synthetic data, are you sure?\n[Y/n] "
+                )
+            )
+            if input() != "Y":
+                self.stdout.write("Aborting benchmark")
+                sys.exit(1)
+
+        snapshot_dir = options["snapshot_dir"]
+        if snapshot_dir is None:
+            with tempfile.TemporaryDirectory(prefix="dv-benchmark-") as snapshot_dir:
+                results = self._benchmark(scales, snapshot_dir, options)
+        else:
+            os.makedirs(snapshot_dir, exist_ok=True)
+            results = self._benchmark(scales, snapshot_dir, options)
+
+        if options["output"]:
+            with open(options["output"], "w") as f:
+                json.dump(results, f, indent=2)
+            self.stdout.write(f"Results written to {options['output']}")
+
+    def _benchmark(self, scales, snapshot_dir, options):
+        results = []
+        for scale in scales:
+            result = {"scale": scale}
+            path = os.path.join(snapshot_dir, f"grace-x{scale:g}-{options['seed']}.zip")
+            if not os.path.exists(path):
+                start = time.perf_counter()
+                generated = generate_snapshot(path, scale, options["seed"])
+                self.stdout.write(
+                    f"x{scale:g}: generated {sum(c for c, _ in generated.values())} "
+                    f"rows in {time.perf_counter() - start:.2f}s"
+                )
+            result["snapshot_size"] = os.path.getsize(path)
+
+            command = load_command_class("dv", "import")
+            result["import"] = self._measure(
+                options["memory"],
+                call_command,
+                command,
+                period="2014-2021",
+                from_snapshot=path,
+                noinput=True,
+                stdout=StringIO(),
+            )
+            result["import"]["stages"] = command.stage_stats
+            self._report(scale, "import", result["import"])
+            for stats in command.stage_stats:
+                self.stdout.write(
+                    f"  {stats['stage']:<24} {stats['rows']:>10} rows "
+                    f"{stats['seconds']:9.2f}s {stats['rows_per_second']:>9.0f} rows/s "
+                    f"{_mib(stats['peak_memory']):>9} MiB"
+                )
+
+            if not options["skip_index"]:
+                result["index"] = self._measure_index(options["memory"])
+                self._report(scale, "rebuild_index", result["index"])
+
+            # in KiB on Linux; it's the peak of the whole process so far
+            result["max_rss"] = (
+                resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+            )
+            results.append(result)
+        return results
+
+    def _measure(self, memory, func, *args, **kwargs):
+        if memory:
+            tracemalloc.start()
+        start = time.perf_counter()
+        try:
+            func(*args, **kwargs)
+            return {
+                "seconds": time.perf_counter() - start,
+                "peak_memory": tracemalloc.get_traced_memory()[1] if memory else None,
+            }
+        finally:
+            if memory:
+                tracemalloc.stop()
+
+    def _measure_index(self, memory):
+        unified_index = haystack_connections["default"].get_unified_index()
+        documents = sum(
+            index.index_queryset().count()
+            for index in unified_index.get_indexes().values()
+        )
+        try:
+            result = self._measure(
+                memory,
+                call_command,
+                "rebuild_index",
+                interactive=False,
+                stdout=StringIO(),
+            )
+        except Exception as e:
+            self.stderr.write(f"rebuild_index failed: {e}")
+            return {"error": str(e)}
+        result["documents"] = documents
+        result["documents_per_second"] = documents / result["seconds"]
+        return result
+
+    def _report(self, scale, name, result):
+        if "error" in result:
+            return
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"x{scale:g} {name}: {result['seconds']:.2f}s, "
+                f"peak {_mib(result['peak_memory'])} MiB"
+            )
+        )
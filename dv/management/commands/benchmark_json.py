@@ -0,0 +1,84 @@
+import json
+import time
+from unittest import mock
+
+from django.core.management.base import BaseCommand
+
+from dv.lib import http
+from dv.lib.snapshots import SNAPSHOT_VIEWS, render_view
+from dv.lib.utils import DEFAULT_PERIOD, FUNDING_PERIODS_DICT
+
+# registers the snapshot-enabled views
+from dv.views import api  # noqa: F401
+
+
+def legacy_dumps(data, encoder=http.SetEncoder, indent=None):
+    """The encoding used before the JSON backends: indented, ASCII only."""
+    return json.dumps(data, cls=encoder, indent=2).encode()
+
+
+class Command(BaseCommand):
+    help = "Benchmark the JSON encoding of the API payloads with every backend"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--period",
+            choices=list(FUNDING_PERIODS_DICT.keys()),
+            default=DEFAULT_PERIOD,
+        )
+        parser.add_argument(
+            "--endpoint",
+            action="append",
+            dest="endpoints",
+            help="Endpoint to benchmark (e.g. partners), can be repeated. "
+            "Defaults to all the snapshot-enabled endpoints.",
+        )
+        parser.add_argument(
+            "--repeat",
+            type=int,
+            default=5,
+            help="Encode each payload this many times, and report the best time.",
+        )
+
+    def handle(self, *args, **options):
+        period = options["period"]
+        endpoints = options["endpoints"] or [
+            name
+            for name, (view, per_beneficiary, nuts) in SNAPSHOT_VIEWS.items()
+            if not per_beneficiary
+        ]
+        backends = {"legacy": legacy_dumps, **http.JSON_BACKENDS}
+
+        for name in endpoints:
+            view = SNAPSHOT_VIEWS[name][0]
+            # grab the data passed to the encoder
+            with mock.patch.object(http, "dumps", wraps=http.dumps) as dumps:
+                response = render_view(view, period)
+            if response.status_code != 200 or not dumps.called:
+                self.stderr.write(f"{name}: skipped ({response.status_code})")
+                continue
+            data = dumps.call_args.args[0]
+            encoder = dumps.call_args.kwargs.get("encoder", http.SetEncoder)
+
+            results = {}
+            for backend, encode in backends.items():
+                best = None
+                for _ in range(options["repeat"]):
+                    start = time.perf_counter()
+                    content = encode(data, encoder=encoder)
+                    elapsed = time.perf_counter() - start
+                    best = elapsed if best is None else min(best, elapsed)
+                results[backend] = (best, content)
+
+            legacy_time, legacy_content = results["legacy"]
+            expected = json.loads(legacy_content)
+            for backend, (elapsed, content) in results.items():
+                line = (
+                    f"{name:<24} {backend:<8} {elapsed * 1000:9.2f} ms "
+                    f"{len(content) / 1024:10.1f} KiB "
+                    f"{legacy_time / elapsed:6.1f}x"
+                )
+                if json.loads(content) != expected:
+                    self.stdout.write(self.style.ERROR(f"{line}  output differs!"))
+                else:
+                    self.stdout.write(line)
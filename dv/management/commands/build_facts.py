@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from dv.lib.facts import build_facts
+from dv.lib.utils import FUNDING_PERIODS_DICT
+
+
+class Command(BaseCommand):
+    help = "Build the allocation fact table queried by the cube API"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--period",
+            choices=list(FUNDING_PERIODS_DICT.keys()),
+            help="Build the facts of a specific period. If not specified the facts are built for all periods.",
+        )
+
+    def handle(self, *args, **options):
+        period = options.get("period")
+        periods = [period] if period else FUNDING_PERIODS_DICT.keys()
+
+        for period in periods:
+            count = build_facts(period)
+            self.stdout.write(
+                self.style.SUCCESS(f"Built {count} allocation facts for {period}.")
+            )
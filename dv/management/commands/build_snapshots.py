@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from dv.lib.snapshots import build_snapshots
+from dv.lib.utils import FUNDING_PERIODS_DICT
+
+# registers the snapshot-enabled views
+from dv.views import api  # noqa: F401
+
+
+class Command(BaseCommand):
+    help = "Build the pre-encoded API snapshots served by the API views"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--period",
+            choices=list(FUNDING_PERIODS_DICT.keys()),
+            help="Build snapshots for a specific period. If not specified snapshots are built for all periods.",
+        )
+
+    def handle(self, *args, **options):
+        period = options.get("period")
+        periods = [period] if period else FUNDING_PERIODS_DICT.keys()
+
+        for period in periods:
+            snapshots = build_snapshots(period)
+            size = sum(len(snapshot.content) for snapshot in snapshots)
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"Built {len(snapshots)} snapshots for {period} ({size} bytes)."
+                )
+            )
@@ -0,0 +1,42 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand
+
+from dv.lib.synthetic import generate_snapshot
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate a synthetic grACE snapshot, at a multiple of the 2014-2021 "
+        "data volume, which can be imported with import --from-snapshot"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", metavar="FILE", help="The snapshot (zip) to write.")
+        parser.add_argument(
+            "--scale",
+            type=float,
+            default=1,
+            help="Multiple of the 2014-2021 data volume, e.g. 10.",
+        )
+        parser.add_argument(
+            "--seed",
+            type=int,
+            default=0,
+            help="The random seed; the same seed generates the same data.",
+        )
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        start = time.perf_counter()
+        generated = generate_snapshot(path, options["scale"], options["seed"])
+        for name, (count, elapsed) in generated.items():
+            self.stdout.write(f"Generated {count} {name} rows in {elapsed:.2f}s.")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Saved {len(generated)} tables to {path} "
+                f"({os.path.getsize(path) / 1024:.0f} KiB) "
+                f"in {time.perf_counter() - start:.2f}s."
+            )
+        )
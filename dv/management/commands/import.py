@@ -1,15 +1,18 @@
+import hashlib
 import json
 import os.path
-import re
 import sys
-from contextlib import contextmanager
+import tempfile
+import time
+import tracemalloc
+import zipfile
 from decimal import Decimal
 
-import bleach
-import pyexcel
-import pymssql
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models import CASCADE
 from django.db.utils import IntegrityError
 from django.conf import settings
+from django.core.management import call_command
 from django.core.management.base import BaseCommand, CommandError
 
 from dv.models import (
@@ -27,6 +30,10 @@ from dv.models import (
     State,
     NUTS,
 )
+from dv.lib import grace, shadow
+from dv.lib.cache import bump_data_version
+from dv.lib.sanitize import Sanitizer
+from dv.lib.sheets import Sheet
 from dv.lib.utils import FM_EEA, FM_NORWAY, FM_REVERSED_DICT, FUNDING_PERIODS_DICT
 
 GRANT_SHORT_NAME_TO_FM = {
@@ -37,28 +44,322 @@ GRANT_CODE_TO_FM = {
     "EEA FM": "EEA",
     "N FM": "NOR",
 }
-COMMENTS_PATTERN = re.compile(r"&lt;!--.*--&gt;")
+# Rows per INSERT statement; Django lowers it if the backend requires it
+BATCH_SIZE = 1000
+# Concurrent connections to the grACE db
+EXTRACT_WORKERS = 4
+# Processes cleaning the HTML texts
+SANITIZE_WORKERS = min(4, os.cpu_count() or 1)
+
+
+class ImportStage:
+    """
+    Inserts the objects of an import stage in batches, in a single
+    transaction, then reports their counts and the insert rate, and the peak
+    memory use if tracemalloc is tracing. These are also recorded in the
+    command's `stage_stats`.
+    """
+
+    def __init__(self, command, model):
+        self.command = command
+        self.model = model
+        self.name = model.__name__
+        self.counts = {}
+
+    def __enter__(self):
+        self.atomic = transaction.atomic()
+        self.atomic.__enter__()
+        if tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            try:
+                self.finish()
+            except Exception as exc:
+                self.atomic.__exit__(type(exc), exc, exc.__traceback__)
+                raise
+        self.atomic.__exit__(exc_type, exc_value, traceback)
+        if exc_type is not None:
+            return
+
+        elapsed = time.perf_counter() - self.start
+        peak = tracemalloc.get_traced_memory()[1] if tracemalloc.is_tracing() else None
+        self.report()
+        rows = sum(self.counts.values())
+        rate = rows / elapsed if elapsed else 0
+        memory = f", peak {peak / 2**20:.1f} MiB" if peak is not None else ""
+        self.command.stdout.write(
+            f"{self.name} stage: {rows} rows in {elapsed:.2f}s ({rate:.0f} rows/s{memory})"
+        )
+        self.command.stage_stats.append(
+            {
+                "stage": self.name,
+                "rows": rows,
+                "seconds": elapsed,
+                "rows_per_second": rate,
+                "peak_memory": peak,
+            }
+        )
+
+    def finish(self):
+        """Called at the end of the stage, inside its transaction."""
+
+    def report(self):
+        for label, count in self.counts.items():
+            self.command.stdout.write(
+                self.command.style.SUCCESS(f"Imported {count} {label} objects.")
+            )
+
+    def _count(self, label, count):
+        self.counts[label] = self.counts.get(label, 0) + count
+
+    def insert(self, model, objs):
+        objs = list(objs)
+        model.objects.bulk_create(objs, batch_size=BATCH_SIZE)
+        self._count(model.__name__, len(objs))
+
+    def insert_m2m(self, model, attr, pairs):
+        """Inserts (source pk, target pk) `pairs` into the through table of `attr`."""
+        field = model._meta.get_field(attr)
+        through = field.remote_field.through
+        source, target = field.m2m_column_name(), field.m2m_reverse_name()
+        through.objects.bulk_create(
+            [through(**{source: s, target: t}) for s, t in pairs],
+            batch_size=BATCH_SIZE,
+        )
+        self._count(f"{model.__name__}.{attr}", len(pairs))
+
+
+# Natural keys of the models which are updated in place by the incremental
+# import. The rows of the other models are identified by their fingerprint
+# only, so a changed row is deleted and inserted anew.
+NATURAL_KEYS = {
+    ProgrammeArea: ("code",),
+    Allocation: ("state_id", "programme_area_id", "financial_mechanism"),
+    Programme: ("code",),
+    Project: ("code",),
+    BilateralInitiative: ("code",),
+}
+
+
+# bytes of the row fingerprints
+FINGERPRINT_SIZE = 20
+
+
+def _fingerprint_fields(model):
+    return [field for field in model._meta.concrete_fields if not field.auto_created]
 
 
-def sanitize_html(text):
-    cleaned_text = bleach.clean(text or "", strip=True, strip_comments=True)
-    return COMMENTS_PATTERN.sub("", cleaned_text)
+def _normalize(field, value):
+    # The values read from the source and from the DB must compare equal
+    # when the stored data is the same, e.g. 1 and True, or 0.5 and 0.50.
+    value = field.to_python(value)
+    if isinstance(value, Decimal):
+        value = value.quantize(Decimal(1).scaleb(-field.decimal_places))
+    return value
 
 
-@contextmanager
-def db_cursor():
-    conn = pymssql.connect(
-        settings.MSSQL_SERVER,
-        settings.MSSQL_USERNAME,
-        settings.MSSQL_PASSWORD,
-        settings.MSSQL_DATABASE,
+def _identify(model, fields, values):
+    """Returns the (natural key, fingerprint) of the `values` of `fields`."""
+    values = [_normalize(field, value) for field, value in zip(fields, values)]
+    # a digest rather than the values, the existing rows are kept in memory;
+    # repr() tells the types apart, e.g. "1" and 1, or None and "None"
+    fingerprint = hashlib.blake2b(
+        repr(values).encode(), digest_size=FINGERPRINT_SIZE
+    ).digest()
+    key_fields = NATURAL_KEYS.get(model)
+    if not key_fields:
+        return fingerprint, fingerprint
+    key = tuple(
+        value for field, value in zip(fields, values) if field.attname in key_fields
     )
-    cursor = conn.cursor(as_dict=True)
-    try:
-        yield cursor
-    finally:
-        cursor.close()
-        conn.close()
+    return key, fingerprint
+
+
+class DeltaStage(ImportStage):
+    """
+    An import stage of the incremental import: compares the objects with
+    the existing ones of the funding period, and only applies the
+    differences. Those are recorded in `changeset`, as
+    {model: {"created": {pk, ...}, "updated": {...}, "deleted": {...}}}.
+    The rows deleted in cascade are recorded too, and the objects the
+    deleted rows belonged to are recorded in "deleted_from", as
+    {foreign key: {pk, ...}}, e.g. the programmes of the deleted indicators.
+
+    Objects matching existing rows get their pk, like the inserted ones.
+    The existing rows which were not matched are deleted at the end of the
+    stage.
+    """
+
+    def __init__(self, command, model, funding_period, changeset):
+        super().__init__(command, model)
+        self.funding_period = funding_period
+        self.changeset = changeset
+        # model -> {key: [(pk, fingerprint), ...]}, unmatched rows so far
+        self.existing = {}
+        # through model -> (model, attr, {(source pk, target pk): pk})
+        self.existing_pairs = {}
+        self.unchanged = {}
+
+    def _changes(self, label):
+        return self.changeset.setdefault(
+            label, {"created": set(), "updated": set(), "deleted": set()}
+        )
+
+    def _existing(self, model, fields):
+        if model not in self.existing:
+            existing = self.existing[model] = {}
+            rows = model.objects.filter(funding_period=self.funding_period)
+            rows = rows.values_list("pk", *(field.attname for field in fields))
+            for pk, *values in rows.iterator(chunk_size=BATCH_SIZE):
+                key, fingerprint = _identify(model, fields, values)
+                existing.setdefault(key, []).append((pk, fingerprint))
+        return self.existing[model]
+
+    def insert(self, model, objs):
+        objs = list(objs)
+        label = model.__name__
+        if not any(field.name == "funding_period" for field in model._meta.fields):
+            # shared by all periods, only ever added to
+            return super().insert(model, objs)
+
+        fields = _fingerprint_fields(model)
+        existing = self._existing(model, fields)
+        created, updated = [], []
+        for obj in objs:
+            key, fingerprint = _identify(
+                model, fields, [getattr(obj, field.attname) for field in fields]
+            )
+            matches = existing.get(key)
+            if not matches:
+                created.append(obj)
+                continue
+            pk, existing_fingerprint = matches.pop()
+            if not matches:
+                del existing[key]
+            obj.pk = pk
+            if fingerprint != existing_fingerprint:
+                updated.append(obj)
+
+        model.objects.bulk_create(created, batch_size=BATCH_SIZE)
+        model.objects.bulk_update(
+            updated,
+            [field.name for field in fields if not field.primary_key],
+            batch_size=BATCH_SIZE,
+        )
+        changes = self._changes(label)
+        changes["created"].update(obj.pk for obj in created)
+        changes["updated"].update(obj.pk for obj in updated)
+        self._count(label, len(created) + len(updated))
+        self.unchanged[label] = (
+            self.unchanged.get(label, 0) + len(objs) - len(created) - len(updated)
+        )
+
+    def _existing_pairs(self, model, attr):
+        field = model._meta.get_field(attr)
+        through = field.remote_field.through
+        if through not in self.existing_pairs:
+            rows = through.objects.filter(
+                **{f"{field.m2m_field_name()}__funding_period": self.funding_period}
+            ).values_list(field.m2m_column_name(), field.m2m_reverse_name(), "pk")
+            self.existing_pairs[through] = (
+                model,
+                attr,
+                {(s, t): pk for s, t, pk in rows.iterator(chunk_size=BATCH_SIZE)},
+            )
+        return self.existing_pairs[through][2]
+
+    def insert_m2m(self, model, attr, pairs):
+        field = model._meta.get_field(attr)
+        through = field.remote_field.through
+        source, target = field.m2m_column_name(), field.m2m_reverse_name()
+        existing = self._existing_pairs(model, attr)
+
+        created = [pair for pair in pairs if existing.pop(pair, None) is None]
+        through.objects.bulk_create(
+            [through(**{source: s, target: t}) for s, t in created],
+            batch_size=BATCH_SIZE,
+        )
+        # the relations are part of their source object
+        self._changes(model.__name__)["updated"].update(s for s, t in created)
+        self._count(f"{model.__name__}.{attr}", len(created))
+
+    def finish(self):
+        # the stage's model and relations, even when nothing was inserted
+        self._existing(self.model, _fingerprint_fields(self.model))
+        for field in self.model._meta.many_to_many:
+            self._existing_pairs(self.model, field.name)
+
+        for through, (model, attr, existing) in self.existing_pairs.items():
+            self._delete(through, list(existing.values()))
+            self._changes(model.__name__)["updated"].update(s for s, t in existing)
+            self._count(f"{model.__name__}.{attr}", len(existing))
+
+        for model, existing in self.existing.items():
+            pks = [pk for matches in existing.values() for pk, _ in matches]
+            self._record_deletion(model, pks)
+            self._delete(model, pks)
+            self._count(model.__name__, len(pks))
+
+        for changes in self.changeset.values():
+            changes["updated"] -= changes["created"] | changes["deleted"]
+
+    def _record_deletion(self, model, pks):
+        """
+        Records the deletion of the `pks` of `model`, and of the rows it
+        cascades to, before they're deleted.
+        """
+        changes = self._changes(model.__name__)
+        changes["deleted"].update(pks)
+        foreign_keys = [
+            field for field in model._meta.concrete_fields if field.many_to_one
+        ]
+        remaining = pks
+        while remaining:
+            batch, remaining = remaining[:BATCH_SIZE], remaining[BATCH_SIZE:]
+            if foreign_keys:
+                rows = model.objects.filter(pk__in=batch).values_list(
+                    *(field.attname for field in foreign_keys)
+                )
+                for field, values in zip(foreign_keys, zip(*rows)):
+                    changes.setdefault("deleted_from", {}).setdefault(
+                        field.name, set()
+                    ).update(value for value in values if value is not None)
+
+            for relation in model._meta.related_objects:
+                related = relation.related_model
+                lookup = {f"{relation.field.name}__in": batch}
+                if relation.many_to_many:
+                    # the relations are part of their source object
+                    self._changes(related.__name__)["updated"].update(
+                        related.objects.filter(**lookup).values_list("pk", flat=True)
+                    )
+                elif relation.on_delete is CASCADE:
+                    cascaded = list(
+                        related.objects.filter(**lookup).values_list("pk", flat=True)
+                    )
+                    if cascaded:
+                        self._record_deletion(related, cascaded)
+
+    def _delete(self, model, pks):
+        while pks:
+            batch, pks = pks[:BATCH_SIZE], pks[BATCH_SIZE:]
+            model.objects.filter(pk__in=batch).delete()
+
+    def report(self):
+        for label in dict.fromkeys([self.name, *self.unchanged]):
+            changes = self._changes(label)
+            self.command.stdout.write(
+                self.command.style.SUCCESS(
+                    f"{label}: {len(changes['created'])} created, "
+                    f"{len(changes['updated'])} updated, "
+                    f"{len(changes['deleted'])} deleted, "
+                    f"{self.unchanged.get(label, 0)} unchanged."
+                )
+            )
 
 
 class Command(BaseCommand):
@@ -79,6 +380,54 @@ class Command(BaseCommand):
             "--json-path",
             help="A JSON file with allocations (country, fm, allocation). Required for period 2004-2009.",
         )
+        parser.add_argument(
+            "--staging-dir",
+            help="A directory to extract the grACE tables to, for period 2014-2021. "
+            "If not specified a temporary directory is used, and removed afterwards.",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=EXTRACT_WORKERS,
+            help="Number of concurrent grACE db connections used by the extraction.",
+        )
+        source = parser.add_mutually_exclusive_group()
+        source.add_argument(
+            "--dump-source",
+            metavar="FILE",
+            help="Only extract the 2014-2021 tables from the grACE db, and save them "
+            "to a snapshot FILE (zip) which can be imported with --from-snapshot.",
+        )
+        source.add_argument(
+            "--from-snapshot",
+            metavar="FILE",
+            help="Import the 2014-2021 data from a snapshot FILE saved with "
+            "--dump-source, instead of the grACE db.",
+        )
+        parser.add_argument(
+            "--sanitize-workers",
+            type=int,
+            default=SANITIZE_WORKERS,
+            help="Number of processes cleaning the imported HTML texts.",
+        )
+        parser.add_argument(
+            "--incremental",
+            action="store_true",
+            default=False,
+            help="Update the 2014-2021 data in place, applying only the differences "
+            "from the grACE db, instead of deleting and importing it all again.",
+        )
+        parser.add_argument(
+            "--changeset",
+            help="A JSON file to write the changes applied by --incremental to.",
+        )
+        parser.add_argument(
+            "--shadow",
+            action="store_true",
+            default=False,
+            help="Import into a copy of the db, which replaces it once analyzed, "
+            "compacted and verified.",
+        )
         parser.add_argument(
             "--noinput",
             action="store_true",
@@ -87,16 +436,38 @@ class Command(BaseCommand):
         )
 
     def handle(self, *args, **options):
+        self.incremental = options.get("incremental")
+        self.changeset = {}
+        self.stage_stats = []
+        self.sanitize_workers = options.get("sanitize_workers", SANITIZE_WORKERS)
+
+        if options.get("dump_source"):
+            self._dump_source(
+                options["dump_source"],
+                options.get("staging_dir"),
+                options.get("workers"),
+            )
+            return
+
+        if options.get("shadow"):
+            self._shadow_import(options)
+        else:
+            self._import(options)
+
+    def _import(self, options):
+        """Imports the periods as per `options`, returns the imported ones."""
         noinput = options.get("noinput")
         funding_period = options.get("period")
-
         directory = options.get("directory")
         json_path = options.get("json_path")
 
+        imported = []
+
         if not funding_period or funding_period == "2004-2009":
             if json_path:
                 self.clean_for_period("2004-2009", noinput)
                 self._import_2004_2009(json_path)
+                imported.append("2004-2009")
             else:
                 self.stdout.write(
                     self.style.ERROR(
@@ -108,6 +479,7 @@ class Command(BaseCommand):
             if directory:
                 self.clean_for_period("2009-2014", noinput)
                 self._import_2009_2014(directory)
+                imported.append("2009-2014")
             else:
                 self.stdout.write(
                     self.style.ERROR(
@@ -117,19 +489,123 @@ class Command(BaseCommand):
                 )
 
         if not funding_period or funding_period == "2014-2021":
-            self.clean_for_period("2014-2021", noinput)
-            self._import_2014_2021()
+            if not self.incremental:
+                self.clean_for_period("2014-2021", noinput)
+            self._import_2014_2021(
+                options.get("staging_dir"),
+                options.get("workers"),
+                options.get("from_snapshot"),
+            )
+            if not self.incremental or self._write_changeset(
+                "2014-2021", options.get("changeset")
+            ):
+                imported.append("2014-2021")
+            else:
+                self.stdout.write("No changes for 2014-2021.")
+
+        # Fact stage: denormalize the allocations for the cube API
+        for period in imported:
+            call_command("build_facts", period=period, stdout=self.stdout)
+
+        # Snapshot stage: pre-encode the API responses for the new data
+        for period in imported:
+            call_command("build_snapshots", period=period, stdout=self.stdout)
+
+        # Invalidate the cached responses of the imported periods
+        if imported:
+            bump_data_version(imported)
+            self.stdout.write(f"Bumped the data version of {', '.join(imported)}")
+        return imported
+
+    def _shadow_import(self, options):
+        """
+        Imports into a shadow copy of the live db, which replaces it once
+        optimized and verified. See dv.lib.shadow.
+        """
+        live = connections[DEFAULT_DB_ALIAS].settings_dict["NAME"]
+        if shadow.journal_mode(live) == "wal":
+            raise CommandError(f"Cannot replace {live}, it's in WAL journal mode.")
+        shadow_path = f"{live}.shadow"
+        compact_path = f"{live}.compact"
+
+        try:
+            start = time.perf_counter()
+            shadow.backup(live, shadow_path)
+            self.stdout.write(
+                f"Copied {live} to {shadow_path} in {time.perf_counter() - start:.2f}s"
+            )
+
+            with shadow.using(shadow_path):
+                imported = self._import(options)
+            if not imported:
+                self.stdout.write(f"Nothing imported, {live} is left unchanged.")
+                return
+
+            start = time.perf_counter()
+            shadow.optimize(shadow_path)
+            shadow.compact(shadow_path, compact_path)
+            counts = shadow.table_counts(shadow_path)
+            problems = shadow.verify(compact_path, counts)
+            if problems:
+                raise CommandError(
+                    f"Verification of {compact_path} failed: {'; '.join(problems)}"
+                )
+            self.stdout.write(
+                f"Optimized and verified {compact_path} "
+                f"({os.path.getsize(compact_path) / 2**20:.1f} MiB, "
+                f"was {os.path.getsize(shadow_path) / 2**20:.1f} MiB) "
+                f"in {time.perf_counter() - start:.2f}s"
+            )
+
+            # the workers' next connections open the new file
+            connections[DEFAULT_DB_ALIAS].close()
+            os.replace(compact_path, live)
+            self.stdout.write(self.style.SUCCESS(f"Replaced {live}."))
+        finally:
+            for path in (shadow_path, compact_path):
+                if os.path.exists(path):
+                    os.remove(path)
+
+    def stage(self, funding_period, model):
+        """Returns the ImportStage of `model`, as per --incremental."""
+        if self.incremental:
+            return DeltaStage(self, model, funding_period, self.changeset)
+        return ImportStage(self, model)
+
+    def _write_changeset(self, period, path):
+        """
+        Writes the changes of the incremental import of `period` to `path`,
+        as {"period": ..., "changes": {model: {"created": [pk, ...], ...}}}
+        (see DeltaStage).
+        Returns whether anything changed.
+        """
+        changes = {
+            label: {
+                action: (
+                    {field: sorted(pks) for field, pks in pks.items()}
+                    if action == "deleted_from"
+                    else sorted(pks)
+                )
+                for action, pks in actions.items()
+            }
+            for label, actions in self.changeset.items()
+            if any(actions.values())
+        }
+        if path:
+            with open(path, "w") as f:
+                json.dump({"period": period, "changes": changes}, f, indent=2)
+            self.stdout.write(f"Wrote the changes of {period} to {path}")
+        return bool(changes)
 
     def clean_for_period(self, funding_period, noinput):
-        self.stdout.write(
-            f"Removing data for period {funding_period} from {settings.DB_PATH}"
-        )
+        db_path = connections[DEFAULT_DB_ALIAS].settings_dict["NAME"]
+        self.stdout.write(f"Removing data for period {funding_period} from {db_path}")
         period_id = FUNDING_PERIODS_DICT[funding_period]
 
         if not noinput:
             self.stdout.write(
                 self.style.NOTICE(
-                    f"This will remove all data from {settings.DB_PATH} "
+                    f"This will remove all data from {db_path} "
                     f"for period {funding_period}, are you sure?\n[Y/n] "
                 )
             )
@@ -198,6 +674,14 @@ class Command(BaseCommand):
     def _import_2009_2014(self, directory_path):
         """Import data from Excel files for period 2009-2014"""
         self.stdout.write("Running import for 2009-2014.")
+        with Sanitizer(settings.IMPORT_CACHE_DIR, self.sanitize_workers) as sanitizer:
+            self._load_2009_2014(directory_path, sanitizer)
+        self.stdout.write(
+            f"Sanitized {sanitizer.cleaned} texts, {sanitizer.cached} were cached."
+        )
+
+    def _load_2009_2014(self, directory_path, sanitizer):
+        """Loads the spreadsheets, with the HTML cleaned by `sanitizer`."""
 
         EXCEL_FILES = (
             "BeneficiaryState",
@@ -235,21 +719,19 @@ class Command(BaseCommand):
         for file in files:
             self.stdout.write(f"Loading {file}.")
             file_path = os.path.join(directory_path, file)
-            book = pyexcel.get_book(file_name=file_path)
             name = file.split(".")[0]
             name = next(f for f in EXCEL_FILES if f.lower() == name.lower())
             try:
-                sheets[name] = book[name]
-            except KeyError:
-                # if book name different than file name just load the first one
-                if len(book.sheet_names()) == 0:
-                    raise CommandError(f"No worksheets found in {name}.")
-                sheet_names = ", ".join(book.sheet_names())
-                self.stdout.write(f"Assuming first worksheet of {sheet_names}.")
-                sheets[name] = book.sheet_by_index(0)
-
-        for sheet in sheets.values():
-            sheet.name_columns_by_row(0)
+                sheets[name] = Sheet(
+                    file_path,
+                    name,
+                    cache_dir=settings.IMPORT_CACHE_DIR,
+                    log=self.stdout.write,
+                )
+            except ValueError as e:
+                raise CommandError(str(e))
+            if sheets[name].cached:
+                self.stdout.write(f"Using the cached records of {name}.")
 
         def _convert_nulls(record):
             for k, v in record.items():
@@ -258,6 +740,23 @@ class Command(BaseCommand):
                 elif hasattr(record[k], "strip"):
                     record[k] = record[k].strip()
 
+        def _sanitized(records, columns, convert_nulls=False):
+            # the HTML is cleaned (in batches) once the nulls are converted
+            def _batches():
+                batch = []
+                for record in records:
+                    if convert_nulls:
+                        _convert_nulls(record)
+                    batch.append(record)
+                    if len(batch) >= BATCH_SIZE:
+                        yield batch
+                        batch = []
+                if batch:
+                    yield batch
+
+            for batch in sanitizer.sanitized_batches(_batches(), columns):
+                yield from batch
+
         FUNDING_PERIOD = 2  # 2009-2014
 
         # GR country code used in 2009-2014; for 2014-2021 we use EL
@@ -316,14 +815,14 @@ class Command(BaseCommand):
         self.stdout.write(self.style.SUCCESS(f"Imported {a_count} Allocation objects."))
 
         sheet = sheets["Programme"]
-        for record in sheet.records:
-            _convert_nulls(record)
-
+        for record in _sanitized(
+            sheet.records, ["ProgrammeSummary"], convert_nulls=True
+        ):
             programme = Programme.objects.create(
                 funding_period=FUNDING_PERIOD,
                 code=record["ProgrammeCode"],
                 name=record["Programme"],
-                summary=sanitize_html(record["ProgrammeSummary"]),
+                summary=record["ProgrammeSummary"],
                 status=record["ProgrammeStatus"] or "",
                 allocation_eea=record["AllocatedProgrammeGrantEEA"] or 0,
                 allocation_norway=record["AllocatedProgrammeGrantNorway"] or 0,
@@ -389,7 +888,7 @@ class Command(BaseCommand):
         )
 
         sheet = sheets["Project"]
-        for record in sheet.records:
+        for record in _sanitized(sheet.records, ["PlannedSummary", "ActualSummary"]):
             project = Project.objects.create(
                 funding_period=FUNDING_PERIOD,
                 code=record["ProjectCode"],
@@ -406,8 +905,8 @@ class Command(BaseCommand):
                 is_positive_fx=record["ResultPositiveEffects"],
                 is_improved_knowledge=record["ResultImprovedKnowledge"],
                 is_continued_coop=record["ResultContinuedCooperation"],
-                initial_description=sanitize_html(record["PlannedSummary"]),
-                results_description=sanitize_html(record["ActualSummary"]),
+                initial_description=record["PlannedSummary"],
+                results_description=record["ActualSummary"],
             )
             project.programme_areas.add(programme_areas[record["PACode"]])
             project.priority_sectors.add(record["PSCode"])
@@ -506,306 +1005,365 @@ class Command(BaseCommand):
             self.style.SUCCESS(f"Imported {or_count} OrganisationRole objects.")
         )
 
-    def _import_2014_2021(self):
-        """Import data from grACE db for period 2014-2021"""
-        self.stdout.write("Running import for 2014-2021.")
-
-        FUNDING_PERIOD = 3  # 2014-2021
-
-        # GR country code used in 2009-2014; for 2014-2021 we use EL
-        states = {state.name: state for state in State.objects.exclude(code="GR")}
+    def _stage_2014_2021(self, staging_dir, workers, snapshot=None):
+        """Extracts the grACE tables, or restores them from `snapshot`."""
+        start = time.perf_counter()
+        os.makedirs(staging_dir, exist_ok=True)
+        if snapshot:
+            try:
+                manifest = grace.restore(snapshot, staging_dir)
+            except (OSError, ValueError, zipfile.BadZipFile) as e:
+                raise CommandError(f"Cannot restore snapshot {snapshot}: {e}")
+            self.stdout.write(
+                f"Restored {len(manifest['tables'])} tables from {snapshot} "
+                f"(created {manifest['created']}) "
+                f"in {time.perf_counter() - start:.2f}s"
+            )
+            return manifest["tables"]
 
-        programme_area_query = (
-            "SELECT * FROM fmo.TR_RDPProgrammeArea where FundingPeriod='2014-2021'"
+        extracted = grace.extract(staging_dir, workers=workers)
+        for name, (count, elapsed) in extracted.items():
+            self.stdout.write(f"Extracted {count} {name} rows in {elapsed:.2f}s.")
+        self.stdout.write(
+            f"Extraction: {len(extracted)} tables in "
+            f"{time.perf_counter() - start:.2f}s to {staging_dir}"
         )
-        ps_count = 0
-        with db_cursor() as cursor:
-            cursor.execute(programme_area_query)
-            programme_areas = {}
-            priority_sectors = {}
-            for row in cursor.fetchall():
-                priority_sector, created = PrioritySector.objects.get_or_create(
-                    code=row["PSCode"],
-                    defaults={"name": row["PrioritySector"]},
-                )
-                if created:
-                    ps_count += 1
-                priority_sectors[priority_sector.code] = priority_sector
-                programme_area = ProgrammeArea.objects.create(
-                    funding_period=FUNDING_PERIOD,
-                    code=row["PACode"],
-                    name=row["ProgrammeArea"],
-                    short_name=row["ProgrammeAreaShortName"],
-                    order=row["idPA"],
-                    priority_sector=priority_sector,
-                    objective=row["Objective"] or "",
-                )
-                programme_areas[programme_area.code] = programme_area
+        return extracted
+
+    def _dump_source(self, path, staging_dir=None, workers=EXTRACT_WORKERS):
+        if staging_dir is None:
+            with tempfile.TemporaryDirectory(prefix="dv-grace-") as staging_dir:
+                return self._dump_source(path, staging_dir, workers)
 
+        extracted = self._stage_2014_2021(staging_dir, workers)
+        grace.dump(staging_dir, path, extracted)
         self.stdout.write(
-            self.style.SUCCESS(f"Imported {ps_count} PrioritySector objects.")
+            self.style.SUCCESS(
+                f"Saved {len(extracted)} tables to {path} "
+                f"({os.path.getsize(path) / 1024:.0f} KiB)."
+            )
         )
 
-        pa_count = ProgrammeArea.objects.filter(funding_period=FUNDING_PERIOD).count()
+    def _import_2014_2021(
+        self, staging_dir=None, workers=EXTRACT_WORKERS, snapshot=None
+    ):
+        """Import data from grACE db for period 2014-2021"""
+        if staging_dir is None:
+            with tempfile.TemporaryDirectory(prefix="dv-grace-") as staging_dir:
+                return self._import_2014_2021(staging_dir, workers, snapshot)
+
+        self.stdout.write("Running import for 2014-2021.")
+        self._stage_2014_2021(staging_dir, workers, snapshot)
+        with Sanitizer(settings.IMPORT_CACHE_DIR, self.sanitize_workers) as sanitizer:
+            self._load_2014_2021(staging_dir, sanitizer)
         self.stdout.write(
-            self.style.SUCCESS(f"Imported {pa_count} ProgrammeArea objects.")
+            f"Sanitized {sanitizer.cleaned} texts, {sanitizer.cached} were cached."
         )
 
-        allocation_query = "SELECT * FROM fmo.TR_RDPCountryProgrammeArea where FundingPeriod='2014-2021'"
-        with db_cursor() as cursor:
-            cursor.execute(allocation_query)
-            for row in cursor.fetchall():
-                # Exclude allocations for Hungary in PAs different from HHHH
-                # Will eventually be fixed in the data, this is temporary
-                if row["Country"] == "Hungary" and row["PACode"] != "HHHH":
-                    continue
-                Allocation.objects.create(
-                    funding_period=FUNDING_PERIOD,
-                    financial_mechanism=GRANT_SHORT_NAME_TO_FM[row["GrantShortName"]],
-                    state=states.get(row["Country"]),
-                    programme_area=programme_areas.get(row["PACode"]),
-                    gross_allocation=row["GrossAllocation"],
-                    net_allocation=row["NetAllocation"],
-                    thematic=row["Thematic"] or "",
-                )
-
-        a_count = Allocation.objects.filter(funding_period=FUNDING_PERIOD).count()
-        self.stdout.write(self.style.SUCCESS(f"Imported {a_count} Allocation objects."))
+    def _load_2014_2021(self, staging_dir, sanitizer):
+        """Loads the staged grACE tables, with the HTML cleaned by `sanitizer`."""
+        FUNDING_PERIOD = 3  # 2014-2021
 
-        sddw_fake_programmes = []
+        # GR country code used in 2009-2014; for 2014-2021 we use EL
+        states = {state.name: state for state in State.objects.exclude(code="GR")}
+        ALL_MY_NUTS = set(NUTS.objects.values_list("code", flat=True))
 
-        # Exclude programmes from Hungary
-        programme_query = "SELECT * FROM fmo.TR_RDPProgramme WHERE FundingPeriod='2014-2021' AND Country != 'Hungary'"
-        with db_cursor() as cursor:
-            cursor.execute(programme_query)
-            programmes = {}
-            for row in cursor.fetchall():
-                programme_code = row["ProgrammeShortName"]
-                if programme_code.endswith("-DECENTWORK"):
-                    # SDDW: Social Dialogue – Decent Work (Norway Grants)
-                    # Ignore country specific entries as these are added manually
-                    # to the main programme (see below)
-                    sddw_fake_programmes.append(row)
-                    continue
-
-                programme = Programme.objects.create(
-                    funding_period=FUNDING_PERIOD,
-                    code=programme_code,
-                    name=row["Programme"],
-                    summary=sanitize_html(row["ProgrammeSummary"]),
-                    status=row["ProgrammeStatus"] or "",
-                    allocation_eea=row["ProgrammeGrantEEA"] or 0,
-                    allocation_norway=row["ProgrammeGrantNorway"] or 0,
-                    co_financing=row["ProgrammeCoFinancing"],
-                    is_tap=row["IsTAProgramme"],
-                    is_bfp=row["IsBFProgramme"],
-                )
-                programmes[programme.code] = programme
+        # The staged rows are read, transformed and inserted in batches, and
+        # only the keys needed by the later stages are kept, as dicts of
+        # source key -> pk (or object, for the small tables).
 
-                self._add_m2m_entries(
-                    programme,
-                    row,
-                    "ProgrammeAreaList",
-                    "programme_areas",
-                    "ProgrammeArea",
-                    programme_areas,
-                )
+        with self.stage(FUNDING_PERIOD, ProgrammeArea) as stage:
+            priority_sectors = PrioritySector.objects.in_bulk()
+            programme_areas = {}
+            for rows in grace.staged_batches(staging_dir, "ProgrammeArea"):
+                new_priority_sectors = {}
+                for row in rows:
+                    if row["PSCode"] not in priority_sectors:
+                        priority_sectors[row["PSCode"]] = new_priority_sectors[
+                            row["PSCode"]
+                        ] = PrioritySector(
+                            code=row["PSCode"], name=row["PrioritySector"]
+                        )
+                stage.insert(PrioritySector, new_priority_sectors.values())
 
-                # For the moment, all programmes have one or zero (NULL/Non-country specific) states
-                self._add_m2m_entries(
-                    programme, row, "Country", "states", "State", states
+                new_programme_areas = [
+                    ProgrammeArea(
+                        funding_period=FUNDING_PERIOD,
+                        code=row["PACode"],
+                        name=row["ProgrammeArea"],
+                        short_name=row["ProgrammeAreaShortName"],
+                        order=row["idPA"],
+                        priority_sector=priority_sectors[row["PSCode"]],
+                        objective=row["Objective"] or "",
+                    )
+                    for row in rows
+                ]
+                stage.insert(ProgrammeArea, new_programme_areas)
+                for programme_area in new_programme_areas:
+                    programme_areas[programme_area.code] = programme_area
+
+        with self.stage(FUNDING_PERIOD, Allocation) as stage:
+            for rows in grace.staged_batches(staging_dir, "Allocation"):
+                stage.insert(
+                    Allocation,
+                    [
+                        Allocation(
+                            funding_period=FUNDING_PERIOD,
+                            financial_mechanism=GRANT_SHORT_NAME_TO_FM[
+                                row["GrantShortName"]
+                            ],
+                            state=states.get(row["Country"]),
+                            programme_area=programme_areas.get(row["PACode"]),
+                            gross_allocation=row["GrossAllocation"],
+                            net_allocation=row["NetAllocation"],
+                            thematic=row["Thematic"] or "",
+                        )
+                        for row in rows
+                        # Exclude allocations for Hungary in PAs different from HHHH
+                        # Will eventually be fixed in the data, this is temporary
+                        if not (row["Country"] == "Hungary" and row["PACode"] != "HHHH")
+                    ],
                 )
 
-        sddw_programme = Programme.objects.get(code="SDDW")
-        for row in sddw_fake_programmes:
-            self._add_m2m_entries(
-                sddw_programme, row, "Country", "states", "State", states
-            )
+        with self.stage(FUNDING_PERIOD, Programme) as stage:
+            programmes = {}
+            # The programme M2M rows are few, they're inserted at the end of
+            # the stage, when the SDDW programme is known to exist.
+            programme_programme_areas = {}
+            programme_states = {}
+            sddw_states = []
+            for rows in sanitizer.sanitized_batches(
+                grace.staged_batches(staging_dir, "Programme"),
+                ["ProgrammeSummary"],
+            ):
+                new_programmes = []
+                for row in rows:
+                    programme_code = row["ProgrammeShortName"]
+                    if programme_code.endswith("-DECENTWORK"):
+                        # SDDW: Social Dialogue – Decent Work (Norway Grants)
+                        # Ignore country specific entries as these are added manually
+                        # to the main programme (see below)
+                        sddw_states.extend(
+                            self._m2m_entries(row, "Country", "State", states)
+                        )
+                        continue
+
+                    new_programmes.append(
+                        Programme(
+                            funding_period=FUNDING_PERIOD,
+                            code=programme_code,
+                            name=row["Programme"],
+                            summary=row["ProgrammeSummary"],
+                            status=row["ProgrammeStatus"] or "",
+                            allocation_eea=row["ProgrammeGrantEEA"] or 0,
+                            allocation_norway=row["ProgrammeGrantNorway"] or 0,
+                            co_financing=row["ProgrammeCoFinancing"],
+                            is_tap=row["IsTAProgramme"],
+                            is_bfp=row["IsBFProgramme"],
+                        )
+                    )
+                    programmes[programme_code] = programme_code
 
-        p_count = Programme.objects.filter(funding_period=FUNDING_PERIOD).count()
-        self.stdout.write(self.style.SUCCESS(f"Imported {p_count} Programme objects."))
+                    for programme_area in self._m2m_entries(
+                        row, "ProgrammeAreaList", "ProgrammeArea", programme_areas
+                    ):
+                        programme_programme_areas[programme_code, programme_area.pk] = (
+                            None
+                        )
 
-        programme_allocation_query = "SELECT * FROM fmo.TR_RDPProgrammeBudgetHeading"
-        with db_cursor() as cursor:
-            cursor.execute(programme_allocation_query)
-            for row in cursor.fetchall():
-                ProgrammeAllocation.objects.create(
-                    funding_period=FUNDING_PERIOD,
-                    financial_mechanism=GRANT_SHORT_NAME_TO_FM[row["GrantShortName"]],
-                    state=states[row["Country"]],
-                    programme_area=programme_areas.get(row["PACode"]),
-                    priority_sector=priority_sectors.get(row["PSCode"]),
-                    programme=programmes.get(row["ProgrammeShortName"]),
-                    allocation=row["BudgetHeadingGrant"],
-                    thematic=row["Thematic"] or "",
-                    sdg_no=row["SDGno"],
+                    # For the moment, all programmes have one or zero (NULL/Non-country specific) states
+                    for state in self._m2m_entries(row, "Country", "State", states):
+                        programme_states[programme_code, state.pk] = None
+                stage.insert(Programme, new_programmes)
+
+            for state in sddw_states:
+                programme_states[programmes["SDDW"], state.pk] = None
+
+            stage.insert_m2m(Programme, "programme_areas", programme_programme_areas)
+            stage.insert_m2m(Programme, "states", programme_states)
+
+        with self.stage(FUNDING_PERIOD, ProgrammeAllocation) as stage:
+            for rows in grace.staged_batches(staging_dir, "ProgrammeAllocation"):
+                stage.insert(
+                    ProgrammeAllocation,
+                    [
+                        ProgrammeAllocation(
+                            funding_period=FUNDING_PERIOD,
+                            financial_mechanism=GRANT_SHORT_NAME_TO_FM[
+                                row["GrantShortName"]
+                            ],
+                            state=states[row["Country"]],
+                            programme_area=programme_areas.get(row["PACode"]),
+                            priority_sector=priority_sectors.get(row["PSCode"]),
+                            programme_id=programmes.get(row["ProgrammeShortName"]),
+                            allocation=row["BudgetHeadingGrant"],
+                            thematic=row["Thematic"] or "",
+                            sdg_no=row["SDGno"],
+                        )
+                        for row in rows
+                    ],
                 )
 
-        pa_count = ProgrammeAllocation.objects.filter(
-            funding_period=FUNDING_PERIOD
-        ).count()
-        self.stdout.write(
-            self.style.SUCCESS(f"Imported {pa_count} ProgrammeAllocation objects.")
-        )
-        ALL_MY_NUTS = set(NUTS.objects.values_list("code", flat=True))
-
-        project_query = "SELECT * FROM fmo.TR_RDPProject"
-        with db_cursor() as cursor:
-            cursor.execute(project_query)
+        with self.stage(FUNDING_PERIOD, Project) as stage:
             projects = {}
-            for row in cursor.fetchall():
-                project = Project.objects.create(
-                    funding_period=FUNDING_PERIOD,
-                    code=row["ProjectCode"],
-                    name=row["Project"],
-                    status=row["ProjectContractStatus"],
-                    state=states.get(row["Country"]),
-                    programme=programmes.get(row["ProgrammeShortName"]),
-                    nuts_id=(
-                        row["ProjectLocation"]
-                        if row["ProjectLocation"] in ALL_MY_NUTS
-                        else None
-                    ),
-                    sdg_no=row["SDGno"],
-                    allocation=row["ProjectGrant"],
-                    is_eea=bool(row["IdFinancialMechanismEEA"]),
-                    is_norway=bool(row["IdFinancialMechanismNorway"]),
-                    has_ended=row["Hasended"],
-                    is_dpp=row["isdpp"],
-                    is_positive_fx=bool(row["ResultPositiveEffects"]),
-                    is_improved_knowledge=bool(row["ResultsImprovedKnowledge"]),
-                    is_continued_coop=bool(row["CooperationContinue"]),
-                    initial_description=sanitize_html(
-                        row["ProjectInitialDescriptionHtml"]
-                    ),
-                    results_description=sanitize_html(
-                        row["ProjectResultsDescriptionHtml"]
-                    ),
-                    thematic=row["Thematic"] or "",
-                )
-                projects[project.code] = project
-
-                # See https://helpdesk.eaudeweb.ro/issues/17315 for explanations
-                programme_area_column = "ProgrammeAreaCodesList"
-                priority_sector_column = "PrioritySectorCodesList"
-
-                if "," in (row[programme_area_column] or ""):
-                    programme_area_column = "HostPA"
-                if "," in (row[priority_sector_column] or ""):
-                    priority_sector_column = "HostPS"
-
-                self._add_m2m_entries(
-                    project,
-                    row,
-                    programme_area_column,
-                    "programme_areas",
-                    "ProgrammeArea",
-                    programme_areas,
-                )
-                self._add_m2m_entries(
-                    project,
-                    row,
-                    priority_sector_column,
-                    "priority_sectors",
-                    "PrioritySector",
-                    priority_sectors,
-                )
-
-        p_count = Project.objects.filter(funding_period=FUNDING_PERIOD).count()
-        self.stdout.write(self.style.SUCCESS(f"Imported {p_count} Project objects."))
-
-        project_query = Project.objects.filter(
-            funding_period=FUNDING_PERIOD,
-        ).prefetch_related(
-            "programme_areas",
-            "priority_sectors",
-        )
-        for project in project_query:
-            if project.is_eea and project.is_norway:
-                ProjectAllocation.objects.create(
-                    funding_period=FUNDING_PERIOD,
-                    financial_mechanism=FM_EEA,
-                    state_id=project.state_id,
-                    programme_area=project.programme_areas.get(),
-                    priority_sector=project.priority_sectors.get(),
-                    project=project,
-                    allocation=Decimal("0.5525") * project.allocation,
-                )
-                ProjectAllocation.objects.create(
-                    funding_period=FUNDING_PERIOD,
-                    financial_mechanism=FM_NORWAY,
-                    state=project.state,
-                    programme_area=project.programme_areas.get(),
-                    priority_sector=project.priority_sectors.get(),
-                    project=project,
-                    allocation=Decimal("0.4475") * project.allocation,
-                )
-            else:
-                for idx, pa, ps in zip(
-                    range(3),
-                    project.programme_areas.all(),
-                    project.priority_sectors.all(),
-                ):
-                    ProjectAllocation.objects.create(
-                        funding_period=FUNDING_PERIOD,
-                        financial_mechanism=FM_EEA if project.is_eea else FM_NORWAY,
-                        state_id=project.state_id,
-                        programme_area=pa,
-                        priority_sector=ps,
-                        project=project,
-                        allocation=project.allocation if idx == 0 else 0,
+            # (project, state, fm, programme area, priority sector, allocation)
+            project_allocations = []
+            for rows in sanitizer.sanitized_batches(
+                grace.staged_batches(staging_dir, "Project"),
+                ["ProjectInitialDescriptionHtml", "ProjectResultsDescriptionHtml"],
+            ):
+                new_projects = []
+                project_programme_areas = {}
+                project_priority_sectors = {}
+                for row in rows:
+                    project_code = row["ProjectCode"]
+                    new_projects.append(
+                        Project(
+                            funding_period=FUNDING_PERIOD,
+                            code=project_code,
+                            name=row["Project"],
+                            status=row["ProjectContractStatus"],
+                            state=states.get(row["Country"]),
+                            programme_id=programmes.get(row["ProgrammeShortName"]),
+                            nuts_id=(
+                                row["ProjectLocation"]
+                                if row["ProjectLocation"] in ALL_MY_NUTS
+                                else None
+                            ),
+                            sdg_no=row["SDGno"],
+                            allocation=row["ProjectGrant"],
+                            is_eea=bool(row["IdFinancialMechanismEEA"]),
+                            is_norway=bool(row["IdFinancialMechanismNorway"]),
+                            has_ended=row["Hasended"],
+                            is_dpp=row["isdpp"],
+                            is_positive_fx=bool(row["ResultPositiveEffects"]),
+                            is_improved_knowledge=bool(row["ResultsImprovedKnowledge"]),
+                            is_continued_coop=bool(row["CooperationContinue"]),
+                            initial_description=row["ProjectInitialDescriptionHtml"],
+                            results_description=row["ProjectResultsDescriptionHtml"],
+                            thematic=row["Thematic"] or "",
+                        )
+                    )
+                    projects[project_code] = project_code
+
+                    # See https://helpdesk.eaudeweb.ro/issues/17315 for explanations
+                    programme_area_column = "ProgrammeAreaCodesList"
+                    priority_sector_column = "PrioritySectorCodesList"
+
+                    if "," in (row[programme_area_column] or ""):
+                        programme_area_column = "HostPA"
+                    if "," in (row[priority_sector_column] or ""):
+                        priority_sector_column = "HostPS"
+
+                    project_areas = list(
+                        dict.fromkeys(
+                            self._m2m_entries(
+                                row,
+                                programme_area_column,
+                                "ProgrammeArea",
+                                programme_areas,
+                            )
+                        )
                     )
+                    project_sectors = list(
+                        dict.fromkeys(
+                            self._m2m_entries(
+                                row,
+                                priority_sector_column,
+                                "PrioritySector",
+                                priority_sectors,
+                            )
+                        )
+                    )
+                    for programme_area in project_areas:
+                        project_programme_areas[project_code, programme_area.pk] = None
+                    for priority_sector in project_sectors:
+                        project_priority_sectors[project_code, priority_sector.pk] = (
+                            None
+                        )
 
-        pa_count = ProjectAllocation.objects.filter(
-            funding_period=FUNDING_PERIOD
-        ).count()
-        self.stdout.write(
-            self.style.SUCCESS(f"Imported {pa_count} ProjectAllocation objects.")
-        )
+                    project = new_projects[-1]
+                    for fm, pa, ps, allocation in self._project_allocations(
+                        project, project_areas, project_sectors
+                    ):
+                        project_allocations.append(
+                            (
+                                project_code,
+                                project.state_id,
+                                fm,
+                                pa.pk,
+                                ps.pk,
+                                allocation,
+                            )
+                        )
 
-        indicator_query = "SELECT * FROM fmo.TR_RDPIndicators"
-        with db_cursor() as cursor:
-            cursor.execute(indicator_query)
-            for row in cursor.fetchall():
-                Indicator.objects.create(
-                    funding_period=FUNDING_PERIOD,
-                    programme=programmes.get(row["ProgrammeShortName"]),
-                    programme_area=programme_areas.get(row["PACode"]),
-                    state=states.get(row["Country"]),
-                    indicator=row["CoreCommonIndicator"],
-                    outcome=row["Outcome"],
-                    header=row["Header"],
-                    unit_of_measurement=row["UnitOfMeasurement"],
-                    achievement_eea=row["Achievement_EEA"] or 0,
-                    achievement_norway=row["Achievement_Norway"] or 0,
-                    achievement_total=row["AchievementDecimal"] or 0,
-                    order=row["CoreIndicatorCode"],
-                    is_core=bool(row["IsCore"]),
-                    is_common=bool(row["IsCommon"]),
-                    thematic=row["Thematic"] or "",
-                    sdg_no=row["SDGno"],
+                stage.insert(Project, new_projects)
+                stage.insert_m2m(Project, "programme_areas", project_programme_areas)
+                stage.insert_m2m(Project, "priority_sectors", project_priority_sectors)
+
+        with self.stage(FUNDING_PERIOD, ProjectAllocation) as stage:
+            while project_allocations:
+                batch = project_allocations[:BATCH_SIZE]
+                del project_allocations[:BATCH_SIZE]
+                stage.insert(
+                    ProjectAllocation,
+                    [
+                        ProjectAllocation(
+                            funding_period=FUNDING_PERIOD,
+                            financial_mechanism=fm,
+                            state_id=state_id,
+                            programme_area_id=pa_id,
+                            priority_sector_id=ps_id,
+                            project_id=project_code,
+                            allocation=allocation,
+                        )
+                        for project_code, state_id, fm, pa_id, ps_id, allocation in batch
+                    ],
                 )
 
-        i_count = Indicator.objects.filter(funding_period=FUNDING_PERIOD).count()
-        self.stdout.write(self.style.SUCCESS(f"Imported {i_count} Indicator objects."))
+        with self.stage(FUNDING_PERIOD, Indicator) as stage:
+            for rows in grace.staged_batches(staging_dir, "Indicator"):
+                stage.insert(
+                    Indicator,
+                    [
+                        Indicator(
+                            funding_period=FUNDING_PERIOD,
+                            programme_id=programmes.get(row["ProgrammeShortName"]),
+                            programme_area=programme_areas.get(row["PACode"]),
+                            state=states.get(row["Country"]),
+                            indicator=row["CoreCommonIndicator"],
+                            outcome=row["Outcome"],
+                            header=row["Header"],
+                            unit_of_measurement=row["UnitOfMeasurement"],
+                            achievement_eea=row["Achievement_EEA"] or 0,
+                            achievement_norway=row["Achievement_Norway"] or 0,
+                            achievement_total=row["AchievementDecimal"] or 0,
+                            order=row["CoreIndicatorCode"],
+                            is_core=bool(row["IsCore"]),
+                            is_common=bool(row["IsCommon"]),
+                            thematic=row["Thematic"] or "",
+                            sdg_no=row["SDGno"],
+                        )
+                        for row in rows
+                    ],
+                )
 
-        organisation_query = """
-            SELECT DISTINCT
-                IdOrganisation,
-                Organisation,
-                CountryOrganisation,
-                City,
-                OrganisationClassificationSector,
-                OrganisationClassification,
-                NUTSCode
-            FROM fmo.TR_RDPOrganisationRole
-        """
-        with db_cursor() as cursor:
-            cursor.execute(organisation_query)
+        with self.stage(FUNDING_PERIOD, Organisation) as stage:
             organisations = {}
-            for row in cursor.fetchall():
-                try:
-                    organisation = Organisation.objects.create(
+            for rows in grace.staged_batches(staging_dir, "Organisation"):
+                # Like the per-row import did, the (distinct) rows sharing an
+                # IdOrganisation are all imported, and the roles get the last.
+                new_organisations = []
+                for row in rows:
+                    if row["Organisation"] is None:
+                        # would violate the NOT NULL constraint of the name
+                        self.stdout.write(
+                            self.style.ERROR(
+                                f"Error importing organisation {row['Organisation']}."
+                            )
+                        )
+                        continue
+                    organisation = Organisation(
                         funding_period=FUNDING_PERIOD,
                         name=row["Organisation"],
                         city=row["City"],
@@ -816,82 +1374,116 @@ class Command(BaseCommand):
                             row["NUTSCode"] if row["NUTSCode"] in ALL_MY_NUTS else None
                         ),
                     )
-                    organisations[row["IdOrganisation"]] = organisation.id
-                except IntegrityError:
-                    self.stdout.write(
-                        self.style.ERROR(
-                            f"Error importing organisation {row['Organisation']}."
+                    new_organisations.append((row["IdOrganisation"], organisation))
+                stage.insert(Organisation, [obj for _, obj in new_organisations])
+                for key, organisation in new_organisations:
+                    organisations[key] = organisation.pk
+
+        with self.stage(FUNDING_PERIOD, OrganisationRole) as stage:
+            for rows in grace.staged_batches(staging_dir, "OrganisationRole"):
+                stage.insert(
+                    OrganisationRole,
+                    [
+                        OrganisationRole(
+                            funding_period=FUNDING_PERIOD,
+                            organisation_id=organisations[row["IdOrganisation"]],
+                            role_code=row["OrganisationRoleCode"],
+                            role_name=row["OrganisationRole"],
+                            programme_id=programmes.get(row["ProgrammeCode"]),
+                            project_id=projects.get(row["ProjectCode"]),
+                            state=states.get(row["CountryRole"]),
                         )
-                    )
-
-        o_count = Organisation.objects.filter(funding_period=FUNDING_PERIOD).count()
-        self.stdout.write(
-            self.style.SUCCESS(f"Imported {o_count} Organisation objects.")
-        )
-
-        organisation_role_query = "SELECT * FROM fmo.TR_RDPOrganisationRole"
-        with db_cursor() as cursor:
-            cursor.execute(organisation_role_query)
-            for row in cursor.fetchall():
-                OrganisationRole.objects.create(
-                    funding_period=FUNDING_PERIOD,
-                    organisation_id=organisations[row["IdOrganisation"]],
-                    role_code=row["OrganisationRoleCode"],
-                    role_name=row["OrganisationRole"],
-                    programme=programmes.get(row["ProgrammeCode"]),
-                    project=projects.get(row["ProjectCode"]),
-                    state=states.get(row["CountryRole"]),
+                        for row in rows
+                    ],
                 )
-        or_count = OrganisationRole.objects.filter(
-            funding_period=FUNDING_PERIOD
-        ).count()
-        self.stdout.write(
-            self.style.SUCCESS(f"Imported {or_count} OrganisationRole objects.")
-        )
 
-        bilateral_initiative_query = "SELECT * FROM fmo.TR_RDPBilateralinitiative"
-        with db_cursor() as cursor:
-            cursor.execute(bilateral_initiative_query)
-            for row in cursor.fetchall():
-                bilateral_initiative = BilateralInitiative.objects.create(
-                    funding_period=FUNDING_PERIOD,
-                    code=row["BICode"],
-                    title=row["BITitle"],
-                    url=row["BIURL"] or "",
-                    grant=row["BIGrant"],
-                    programme=programmes.get(row["ProgrammeShortName"]),
-                    project=projects.get(row["ProjectCode"]),
-                    state=states.get(row["Country"]),
-                    level=row["Level"] or "",
-                    status=row["BIStatus"],
-                    initial_description=sanitize_html(row["BIInitialDescriptionHtml"]),
-                    results_description=sanitize_html(row["BIResultsDescriptionHtml"]),
-                    promoter_state=states.get(row["PromoterCountry"]),
-                    promoter_organization=row["PromoterOrganisation"],
-                )
-                self._add_m2m_entries(
-                    bilateral_initiative,
-                    row,
-                    "ProgrammeAreaCodesList",
+        with self.stage(FUNDING_PERIOD, BilateralInitiative) as stage:
+            for rows in sanitizer.sanitized_batches(
+                grace.staged_batches(staging_dir, "BilateralInitiative"),
+                ["BIInitialDescriptionHtml", "BIResultsDescriptionHtml"],
+            ):
+                bilateral_initiatives = []
+                bilateral_initiative_programme_areas = {}
+                for row in rows:
+                    bilateral_initiatives.append(
+                        BilateralInitiative(
+                            funding_period=FUNDING_PERIOD,
+                            code=row["BICode"],
+                            title=row["BITitle"],
+                            url=row["BIURL"] or "",
+                            grant=row["BIGrant"],
+                            programme_id=programmes.get(row["ProgrammeShortName"]),
+                            project_id=projects.get(row["ProjectCode"]),
+                            state=states.get(row["Country"]),
+                            level=row["Level"] or "",
+                            status=row["BIStatus"],
+                            initial_description=row["BIInitialDescriptionHtml"],
+                            results_description=row["BIResultsDescriptionHtml"],
+                            promoter_state=states.get(row["PromoterCountry"]),
+                            promoter_organization=row["PromoterOrganisation"],
+                        )
+                    )
+                    for programme_area in self._m2m_entries(
+                        row, "ProgrammeAreaCodesList", "ProgrammeArea", programme_areas
+                    ):
+                        bilateral_initiative_programme_areas[
+                            row["BICode"], programme_area.pk
+                        ] = None
+
+                stage.insert(BilateralInitiative, bilateral_initiatives)
+                stage.insert_m2m(
+                    BilateralInitiative,
                     "programme_areas",
-                    "ProgrammeArea",
-                    programme_areas,
+                    bilateral_initiative_programme_areas,
                 )
 
-        bi_count = BilateralInitiative.objects.filter(
-            funding_period=FUNDING_PERIOD
-        ).count()
-        self.stdout.write(
-            self.style.SUCCESS(f"Imported {bi_count} BilateralInitiative objects.")
-        )
+    def _project_allocations(self, project, programme_areas, priority_sectors):
+        """
+        Returns the allocations of `project` by FM, programme area and priority
+        sector, as tuples of (fm, programme area, priority sector, allocation).
+        The areas and sectors are paired in the order the project's relations
+        were read from the DB: by pk, i.e. by area id and by sector code.
+        """
+        if project.is_eea and project.is_norway:
+            if len(programme_areas) != 1 or len(priority_sectors) != 1:
+                raise CommandError(
+                    f"Project {project.code} has both FMs, but not exactly one "
+                    f"programme area and priority sector."
+                )
+            return [
+                (
+                    FM_EEA,
+                    programme_areas[0],
+                    priority_sectors[0],
+                    Decimal("0.5525") * project.allocation,
+                ),
+                (
+                    FM_NORWAY,
+                    programme_areas[0],
+                    priority_sectors[0],
+                    Decimal("0.4475") * project.allocation,
+                ),
+            ]
+        fm = FM_EEA if project.is_eea else FM_NORWAY
+        return [
+            (fm, pa, ps, project.allocation if idx == 0 else 0)
+            for idx, pa, ps in zip(
+                range(3),
+                sorted(programme_areas, key=lambda obj: obj.pk),
+                sorted(priority_sectors, key=lambda obj: obj.pk),
+            )
+        ]
 
-    def _add_m2m_entries(self, obj, row, key, m2m_attr, m2m_attr_type, m2m_list):
+    def _m2m_entries(self, row, key, m2m_attr_type, m2m_list):
+        """Yields the objects of `m2m_list` listed (by code) in `row[key]`."""
         for code in (row[key] or "").split(","):
             code = code.strip()
+            if not code:
+                continue
             m2m_obj = m2m_list.get(code)
-            if code and not m2m_obj:
+            if not m2m_obj:
                 self.stdout.write(
                     self.style.WARNING(f"{m2m_attr_type} {code} not found.")
                 )
                 continue
-            getattr(obj, m2m_attr).add(m2m_obj)
+            yield m2m_obj
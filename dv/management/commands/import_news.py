@@ -1,14 +1,34 @@
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 import requests
 
-from django.core.cache import cache
-from django.core.management.base import BaseCommand
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
 from pytz import timezone
 
+from dv.lib.cache import bump_data_version
+from dv.lib.utils import FUNDING_PERIODS_DICT
 from dv.models import News, Programme, Project
 
 ENDPOINT = "https://eeagrants.org/rest/articles?page={}"
 TZ = timezone("Europe/Brussels")
+# Pages requested concurrently
+FETCH_WORKERS = 4
+# Rows per INSERT / UPDATE statement
+BATCH_SIZE = 500
+
+NEWS_FIELDS = (
+    "title",
+    "created",
+    "updated",
+    "summary",
+    "image",
+    "is_partnership",
+    "project_id",
+)
 
 
 def parse_time(value: str) -> datetime:
@@ -26,51 +46,183 @@ def parse_time(value: str) -> datetime:
 class Command(BaseCommand):
     help = f"Import news from {ENDPOINT}"
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--endpoint",
+            default=ENDPOINT,
+            help="URL of the news pages, with {} in place of the page number.",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=FETCH_WORKERS,
+            help="Number of pages requested concurrently.",
+        )
+        parser.add_argument(
+            "--changeset",
+            help="A JSON file to write the changes to, like import --changeset.",
+        )
+
     def handle(self, *args, **options):
-        page = 0
-        data = []
-        while page == 0 or data:
-            resp = requests.get(ENDPOINT.format(page))
+        items = self._fetch(options["endpoint"], options["workers"])
+        changes = self._import(items)
+        if options.get("changeset"):
+            with open(options["changeset"], "w") as f:
+                json.dump({"period": None, "changes": {"News": changes}}, f, indent=2)
+            self.stdout.write(f"Wrote the changes to {options['changeset']}")
+        # news are embedded in the projects and partners payloads
+        call_command("build_snapshots", stdout=self.stdout)
+        bump_data_version(FUNDING_PERIODS_DICT.keys())
+        self.stdout.write("Bumped the data version of all periods")
+
+    def _fetch(self, endpoint, workers):
+        """
+        Returns the items of all the pages, up to the first empty one. The
+        pages are requested `workers` at a time, each thread with its own
+        session.
+        """
+        local = threading.local()
+
+        def _get(page):
+            session = getattr(local, "session", None)
+            if session is None:
+                session = local.session = requests.Session()
+            resp = session.get(endpoint.format(page))
             resp.raise_for_status()
-            data = resp.json()["posts"]
-            if page == 0:
-                News.objects.all().delete()
-            self.stdout.write(f"Importing {len(data)} news from page {page}")
-            for item in data:
-                self._save(item)
-            page += 1
-        cache.clear()
-        self.stdout.write("Cache cleared")
-
-    def _save(self, item):
-        try:
-            link = item["link"].replace("http://", "https://")
-            # self.stdout.write('Importing post %s' % link)
-            news, created = News.objects.get_or_create(link=link)
-            news.title = item["title"]
-            news.created = parse_time(item["created"])
-            news.updated = parse_time(item["updated"])
-            news.summary = item["summary"]
-            news.image = item["image"].replace("http://", "https://")
-            news.is_partnership = item["is_partnership"] == "yes"
-            project_id = item.get("project_id").strip()
-            if project_id:
-                if Project.objects.filter(code=project_id).exists():
-                    news.project_id = project_id
+            return resp.json()["posts"]
+
+        items = []
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            page = 0
+            while True:
+                pages = executor.map(_get, range(page, page + workers))
+                try:
+                    for data in pages:
+                        if not data:
+                            return items
+                        self.stdout.write(
+                            f"Importing {len(data)} news from page {page}"
+                        )
+                        items.extend(data)
+                        page += 1
+                except requests.RequestException as e:
+                    raise CommandError(f"Cannot fetch page {page}: {e}")
+
+    def _parse(self, item, projects):
+        """Returns the News of `item`, with its programme codes."""
+        news = News(
+            link=item["link"].replace("http://", "https://"),
+            title=item["title"],
+            created=parse_time(item["created"]),
+            updated=parse_time(item["updated"]),
+            summary=item["summary"],
+            image=item["image"].replace("http://", "https://"),
+            is_partnership=item["is_partnership"] == "yes",
+        )
+        project_id = item.get("project_id").strip()
+        if project_id:
+            if project_id in projects:
+                news.project_id = project_id
+            else:
+                self.stderr.write(f"Project code: {project_id} doesn't exist!")
+        programme_ids = item.get("programme_id")
+        return news, programme_ids.split(", ") if programme_ids else []
+
+    def _import(self, items):
+        """
+        Upserts the news of `items`, by link, and their programmes, then
+        deletes the news which are gone. Returns the pks created, updated
+        (including the news whose programmes changed) and deleted.
+        """
+        projects = set(Project.objects.values_list("code", flat=True))
+        programmes = set(Programme.objects.values_list("code", flat=True))
+
+        parsed = {}
+        news_programmes = {}
+        for item in items:
+            try:
+                news, programme_ids = self._parse(item, projects)
+            except Exception as err:
+                self.stderr.write("ERROR: %s" % repr(err))
+                continue
+            # the same link can be listed more than once, the last one wins
+            parsed[news.link] = news
+            missing = [code for code in programme_ids if code not in programmes]
+            if missing:
+                self.stderr.write(f"Programmes with codes {missing} not found.")
+            news_programmes.setdefault(news.link, set()).update(
+                code for code in programme_ids if code in programmes
+            )
+
+        through = News.programmes.through
+        with transaction.atomic():
+            existing, stale = {}, []
+            for news in News.objects.all():
+                # duplicated links are merged into the first news
+                if news.link in parsed and news.link not in existing:
+                    existing[news.link] = news
                 else:
-                    self.stderr.write(f"Project code: {project_id} doesn't exist!")
-            news.save()
-
-            programme_ids = item.get("programme_id")
-            if programme_ids:
-                programme_ids = programme_ids.split(", ")
-                for programme in Programme.objects.filter(code__in=programme_ids):
-                    news.programmes.add(programme)
-                    programme_ids.remove(programme.code)
-                if len(programme_ids) >= 1:
-                    self.stderr.write(
-                        f"Programmes with codes {programme_ids} not found."
-                    )
-
-        except Exception as err:
-            self.stderr.write("ERROR: %s" % repr(err))
+                    stale.append(news.pk)
+            News.objects.filter(pk__in=stale).delete()
+
+            created, updated = [], []
+            for link, news in parsed.items():
+                if link not in existing:
+                    created.append(news)
+                    continue
+                old = existing[link]
+                news.pk = old.pk
+                if any(
+                    getattr(news, field) != getattr(old, field) for field in NEWS_FIELDS
+                ):
+                    updated.append(news)
+            News.objects.bulk_create(created, batch_size=BATCH_SIZE)
+            News.objects.bulk_update(updated, NEWS_FIELDS, batch_size=BATCH_SIZE)
+
+            pks = {link: news.pk for link, news in parsed.items()}
+            pairs = {
+                (pks[link], code)
+                for link, codes in news_programmes.items()
+                for code in codes
+            }
+            existing_pairs = {
+                (news_id, programme_id): pk
+                for pk, news_id, programme_id in through.objects.values_list(
+                    "pk", "news_id", "programme_id"
+                )
+            }
+            removed_pairs = existing_pairs.keys() - pairs
+            added_pairs = pairs - existing_pairs.keys()
+            through.objects.filter(
+                pk__in=[existing_pairs[pair] for pair in removed_pairs]
+            ).delete()
+            through.objects.bulk_create(
+                [
+                    through(news_id=news_id, programme_id=programme_id)
+                    for news_id, programme_id in added_pairs
+                ],
+                batch_size=BATCH_SIZE,
+            )
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"News: {len(created)} created, {len(updated)} updated, "
+                f"{len(stale)} deleted, {len(parsed) - len(created) - len(updated)} "
+                f"unchanged."
+            )
+        )
+
+        created_pks = {news.pk for news in created}
+        stale_pks = set(stale)
+        return {
+            "created": sorted(created_pks),
+            "updated": sorted(
+                (
+                    {news.pk for news in updated}
+                    | {pk for pk, _ in removed_pairs | added_pairs}
+                )
+                - created_pks
+                - stale_pks
+            ),
+            "deleted": sorted(stale_pks),
+        }
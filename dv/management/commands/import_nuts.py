@@ -5,12 +5,17 @@ import logging
 
 import requests
 from django.core.management.base import BaseCommand
+from django.db import transaction
 
+from dv.lib.cache import bump_data_version
+from dv.lib.utils import FUNDING_PERIODS_DICT
 from dv.models import NUTS
 from dv.models import NUTSVersion
 
 logger = logging.getLogger(__name__)
 API_BASE = "https://gisco-services.ec.europa.eu/distribution/v2/nuts"
+# Rows per INSERT / UPDATE statement
+BATCH_SIZE = 500
 
 # Some Organisations have fake NUTS code, so include them here as well.
 FAKE_NUTS = {
@@ -41,11 +46,44 @@ def get_file_list(year):
     return resp.json()
 
 
+def parse_nuts(lines):
+    """
+    Returns the NUTS codes and labels of the GISCO CSV `lines`, with the
+    Extra-Regio codes of every country, and the fake codes.
+    """
+    nuts = {}
+    nuts_0 = []
+    for line in csv.DictReader(lines):
+        if len(line["NUTS_ID"]) == 2:
+            nuts_0.append(line["NUTS_ID"])
+
+        name, latin_name = line["NUTS_NAME"], line["NAME_LATN"]
+        if name == latin_name:
+            label = name
+        else:
+            label = f"{name} / {latin_name}"
+        nuts[line["NUTS_ID"]] = label
+    logger.info("Read %s NUTS codes", len(nuts))
+
+    # Extra-Regio codes are used to indicate there is no region.
+    # Add them as well to the DB for integrity checks.
+    for country_code in nuts_0:
+        for level in (1, 2, 3):
+            nuts[country_code + "Z" * level] = f"Extra-Regio NUTS {level}"
+
+    nuts.update(FAKE_NUTS)
+    return nuts
+
+
 class Command(BaseCommand):
     help = __doc__
 
     def add_arguments(self, parser):
         parser.add_argument("year", help="NUTS version to import")
+        parser.add_argument(
+            "--file",
+            help="A local NUTS_AT_<year>.csv file to import, instead of downloading it from GISCO.",
+        )
 
     def handle(self, year, verbosity, **options):
         handler = logging.StreamHandler()
@@ -59,61 +97,68 @@ class Command(BaseCommand):
         if int(verbosity) > 1:
             logger.setLevel(logging.DEBUG)
 
-        file_path = get_file_list(year)["csv"][f"NUTS_AT_{year}.csv"]
-
-        logger.info("Getting NUTS codes: %s", file_path)
-        resp = requests.get(f"{API_BASE}/{file_path}")
-        resp.raise_for_status()
-        lines = resp.content.decode("utf8").splitlines()
-
+        if options.get("file"):
+            logger.info("Reading NUTS codes: %s", options["file"])
+            with open(options["file"], encoding="utf8") as f:
+                lines = f.read().splitlines()
+        else:
+            file_path = get_file_list(year)["csv"][f"NUTS_AT_{year}.csv"]
+
+            logger.info("Getting NUTS codes: %s", file_path)
+            resp = requests.get(f"{API_BASE}/{file_path}")
+            resp.raise_for_status()
+            lines = resp.content.decode("utf8").splitlines()
+
+        nuts = parse_nuts(lines)
+        with transaction.atomic():
+            self.load(year, nuts)
+            # the responses and NUTS indexes of all the periods are stale
+            bump_data_version(FUNDING_PERIODS_DICT.keys())
+
+    def load(self, year, nuts):
+        """
+        Applies the differences between the `nuts` (code -> label) of the
+        NUTS version `year` and the db: the new codes are created, the
+        changed labels updated, and the missing version links added.
+        """
         nuts_version = NUTSVersion.objects.get_or_create(
             year=year, defaults={"year": year}
         )[0]
 
-        nuts_0 = []
-        created_count = 0
-        reader = csv.DictReader(lines)
-        for line in reader:
-            if len(line["NUTS_ID"]) == 2:
-                nuts_0.append(line["NUTS_ID"])
-
-            name, latin_name = line["NUTS_NAME"], line["NAME_LATN"]
-            if name == latin_name:
-                label = name
-            else:
-                label = f"{name} / {latin_name}"
-
-            obj, created = NUTS.objects.update_or_create(
-                {"label": label}, code=line["NUTS_ID"]
+        existing = dict(NUTS.objects.values_list("code", "label"))
+        created = [
+            NUTS(code=code, label=label)
+            for code, label in nuts.items()
+            if code not in existing
+        ]
+        updated = [
+            NUTS(code=code, label=label)
+            for code, label in nuts.items()
+            if code in existing and existing[code] != label
+        ]
+        NUTS.objects.bulk_create(created, batch_size=BATCH_SIZE)
+        NUTS.objects.bulk_update(updated, ["label"], batch_size=BATCH_SIZE)
+        for obj in updated:
+            logger.debug("NUTS %s: %s -> %s", obj, existing[obj.code], obj.label)
+
+        through = NUTS.nuts_versions.through
+        linked = set(
+            through.objects.filter(nutsversion=nuts_version).values_list(
+                "nuts_id", flat=True
             )
-            obj.nuts_versions.add(nuts_version)
-            created_count += created
-            logger.info("NUTS %s, created=%s", obj, created)
-
-        logger.info("Created %s out of %s", created_count, len(lines) - 1)
-
-        # Extra-Regio codes are used to indicate there is no region.
-        # Add them as well to the DB for integrity checks.
-        created_count = 0
-        for country_code in nuts_0:
-            for level in (1, 2, 3):
-                code = country_code + "Z" * level
-                label = f"Extra-Regio NUTS {level}"
-
-                obj, created = NUTS.objects.update_or_create(
-                    {"label": label}, code=code
-                )
-                obj.nuts_versions.add(nuts_version)
-                created_count += created
-                logger.info("NUTS extra %s, created=%s", obj, created)
-        logger.info("Created Extra-Regio %s out of %s", created_count, len(nuts_0 * 3))
-
-        created_count = 0
-        for code, label in FAKE_NUTS.items():
-            obj, created = NUTS.objects.update_or_create({"label": label}, code=code)
-            obj.nuts_versions.add(nuts_version)
-            created_count += created
-            logger.info("NUTS extra %s, created=%s", obj, created)
+        )
+        links = [
+            through(nuts_id=code, nutsversion=nuts_version)
+            for code in nuts
+            if code not in linked
+        ]
+        through.objects.bulk_create(links, batch_size=BATCH_SIZE)
+
         logger.info(
-            "Created Fake NUTS codes %s out of %s", created_count, len(FAKE_NUTS)
+            "NUTS %s: %s created, %s updated, %s unchanged, %s linked to the version",
+            year,
+            len(created),
+            len(updated),
+            len(nuts) - len(created) - len(updated),
+            len(links),
         )
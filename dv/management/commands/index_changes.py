@@ -0,0 +1,76 @@
+import json
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from haystack import connections
+
+from dv.lib.indexing import (
+    changed_documents,
+    merge_changes,
+    schema_fingerprint,
+    update_documents,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Update the search index with the changes written by import --incremental "
+        "--changeset, or rebuild it if its schema changed or no changeset is usable"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "changesets",
+            nargs="*",
+            metavar="CHANGESET",
+            help="JSON files written by import --changeset, applied in order.",
+        )
+        parser.add_argument(
+            "--rebuild",
+            action="store_true",
+            default=False,
+            help="Rebuild the index even if its schema is unchanged.",
+        )
+        parser.add_argument(
+            "--using",
+            default="default",
+            help="The haystack connection to update.",
+        )
+
+    def handle(self, *args, **options):
+        using = options["using"]
+        backend = connections[using].get_backend()
+        fingerprint = schema_fingerprint(using)
+
+        changesets, reason = [], None
+        if options["rebuild"]:
+            reason = "Rebuilding the index."
+        elif backend.get_schema_fingerprint() != fingerprint:
+            reason = "The index schema changed, rebuilding the index."
+        elif not options["changesets"]:
+            reason = "No changeset given, rebuilding the index."
+        for path in options["changesets"]:
+            if reason:
+                break
+            try:
+                with open(path) as f:
+                    changesets.append(json.load(f)["changes"])
+            except (OSError, ValueError, KeyError) as e:
+                # e.g. the import failed before writing it
+                reason = (
+                    f"Cannot read the changeset {path} ({e}), rebuilding the index."
+                )
+
+        if reason:
+            self.stdout.write(reason)
+            call_command(
+                "rebuild_index", interactive=False, using=[using], stdout=self.stdout
+            )
+            backend.set_schema_fingerprint(fingerprint)
+            return
+
+        counts = update_documents(changed_documents(merge_changes(changesets)), using)
+        for label, (updated, removed) in counts.items():
+            self.stdout.write(
+                self.style.SUCCESS(f"{label}: {updated} updated, {removed} removed.")
+            )
@@ -0,0 +1,128 @@
+import inspect
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.http import HttpRequest, QueryDict
+from django.urls import reverse
+
+from dv.lib.snapshots import beneficiary_states
+from dv.lib.utils import FUNDING_PERIODS_DICT, NUTS_VERSION_BY_PERIOD
+from dv.urls.api import urlpatterns
+
+
+def _cached_routes():
+    """Yields (name, view, is per-beneficiary, needs NUTS) of the cached API routes."""
+    for pattern in urlpatterns:
+        view = pattern.callback
+        if not hasattr(view, "cache_timeout"):
+            continue
+        inner = inspect.unwrap(view, stop=lambda f: hasattr(f, "needs_nuts"))
+        yield (
+            pattern.name,
+            view,
+            "beneficiary" in pattern.pattern.regex.groupindex,
+            getattr(inner, "needs_nuts", False),
+        )
+
+
+def _request(path, period):
+    # same path as the frontend requests, which are keyed by it
+    request = HttpRequest()
+    request.method = "GET"
+    request.path = request.path_info = path
+    request.META["QUERY_STRING"] = f"period={period}"
+    request.GET = QueryDict(request.META["QUERY_STRING"])
+    return request
+
+
+def _warm(view, path, period, kwargs):
+    try:
+        start = time.perf_counter()
+        response = view(_request(path, period), **kwargs)
+        return response.status_code, time.perf_counter() - start, len(response.content)
+    finally:
+        # each worker thread has its own connection
+        connection.close()
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill the cache with the responses of every API route, for every "
+        "period and beneficiary state"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--period",
+            choices=list(FUNDING_PERIODS_DICT.keys()),
+            action="append",
+            dest="periods",
+            help="Only warm this period, can be repeated. Defaults to all periods.",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=min(4, os.cpu_count() or 1),
+            help="Number of responses computed concurrently.",
+        )
+
+    def handle(self, *args, **options):
+        periods = options["periods"] or list(FUNDING_PERIODS_DICT.keys())
+        # the states without allocations in a period have nothing to show
+        states = {period: beneficiary_states(period) for period in periods}
+
+        jobs = []
+        for name, view, per_beneficiary, needs_nuts in _cached_routes():
+            for period in periods:
+                if needs_nuts and period not in NUTS_VERSION_BY_PERIOD:
+                    continue
+                for kwargs in (
+                    [{"beneficiary": state} for state in states[period]]
+                    if per_beneficiary
+                    else [{}]
+                ):
+                    path = reverse(f"api:{name}", kwargs=kwargs)
+                    jobs.append((name, view, path, period, kwargs))
+
+        # reported in the order of the routes
+        stats = {
+            name: {"count": 0, "time": 0, "size": 0, "errors": 0} for name, *_ in jobs
+        }
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options["workers"]) as executor:
+            futures = {
+                executor.submit(_warm, view, path, period, kwargs): (name, path, period)
+                for name, view, path, period, kwargs in jobs
+            }
+            for future in as_completed(futures):
+                name, path, period = futures[future]
+                stat = stats[name]
+                try:
+                    status, elapsed, size = future.result()
+                except Exception as e:
+                    status, elapsed, size = repr(e), 0, 0
+                if status != 200:
+                    stat["errors"] += 1
+                    self.stderr.write(f"{path}?period={period}: {status}")
+                    continue
+                stat["count"] += 1
+                stat["time"] += elapsed
+                stat["size"] += size
+
+        for name, stat in stats.items():
+            self.stdout.write(
+                f"{name:<32} {stat['count']:4} responses "
+                f"{stat['time']:8.2f}s {stat['size'] / 1024:10.1f} KiB"
+                + (f" ({stat['errors']} errors)" if stat["errors"] else "")
+            )
+        total = sum(stat["count"] for stat in stats.values())
+        size = sum(stat["size"] for stat in stats.values())
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Warmed {total} responses ({size} bytes) in "
+                f"{time.perf_counter() - start:.2f}s."
+            )
+        )
@@ -1,4 +1,11 @@
+from contextvars import ContextVar
+
 from django.conf import settings
+from django.middleware import cache
+
+from dv.lib.cache import data_token
+
+_request = ContextVar("dv_cache_request", default=None)
 
 
 class CORSMiddleware:
@@ -18,3 +25,41 @@ class CORSMiddleware:
 
         response["Access-Control-Allow-Origin"] = "*"
         return response
+
+
+class _DataVersionKeyPrefix:
+    """
+    Makes the cache middleware use a key prefix containing the current
+    data token (see `dv.lib.cache.data_token`), so the cached pages are
+    invalidated by the imports.
+
+    The token is only looked up when the base class uses the prefix, i.e.
+    for the requests it fetches from or stores in the cache.
+    """
+
+    @property
+    def key_prefix(self):
+        request = _request.get()
+        if request is None:
+            return settings.CACHE_MIDDLEWARE_KEY_PREFIX
+        return f"{settings.CACHE_MIDDLEWARE_KEY_PREFIX}data.{data_token(request)}"
+
+    @key_prefix.setter
+    def key_prefix(self, value):
+        # set by the base class, the setting is used instead
+        pass
+
+
+class UpdateCacheMiddleware(_DataVersionKeyPrefix, cache.UpdateCacheMiddleware):
+    def process_response(self, request, response):
+        try:
+            return super().process_response(request, response)
+        finally:
+            _request.set(None)
+
+
+class FetchFromCacheMiddleware(_DataVersionKeyPrefix, cache.FetchFromCacheMiddleware):
+    def process_request(self, request):
+        # Also used by UpdateCacheMiddleware when processing the response
+        _request.set(request)
+        return super().process_request(request)
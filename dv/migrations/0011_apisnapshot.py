@@ -0,0 +1,36 @@
+# Generated by Django 5.2.8 on 2026-10-18 20:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("dv", "0010_staticcontent_seo_description_and_more"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ApiSnapshot",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("endpoint", models.CharField(max_length=64)),
+                ("period", models.CharField(max_length=9)),
+                ("version", models.PositiveSmallIntegerField()),
+                ("content_type", models.CharField(max_length=64)),
+                ("content", models.BinaryField()),
+                ("created", models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                "unique_together": {("endpoint", "period", "version")},
+            },
+        ),
+    ]
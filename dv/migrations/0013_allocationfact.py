@@ -0,0 +1,144 @@
+# Generated by Django 5.2.8 on 2026-10-18 21:23
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("dv", "0012_dataversion"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="AllocationFact",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "funding_period",
+                    models.IntegerField(
+                        choices=[(1, "2004-2009"), (2, "2009-2014"), (3, "2014-2021")]
+                    ),
+                ),
+                (
+                    "financial_mechanism",
+                    models.CharField(
+                        choices=[("EEA", "EEA Grants"), ("NOR", "Norway Grants")],
+                        max_length=3,
+                    ),
+                ),
+                ("thematic", models.CharField(blank=True, max_length=16)),
+                ("sdg_no", models.IntegerField(null=True)),
+                (
+                    "gross_allocation",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=15),
+                ),
+                (
+                    "net_allocation",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=15),
+                ),
+                (
+                    "programme_allocation",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=15),
+                ),
+                (
+                    "project_allocation",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=15),
+                ),
+                ("project_count", models.IntegerField(default=0)),
+                (
+                    "nuts",
+                    models.ForeignKey(
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        to="dv.nuts",
+                    ),
+                ),
+                (
+                    "priority_sector",
+                    models.ForeignKey(
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="dv.prioritysector",
+                    ),
+                ),
+                (
+                    "programme",
+                    models.ForeignKey(
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="dv.programme",
+                    ),
+                ),
+                (
+                    "programme_area",
+                    models.ForeignKey(
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="dv.programmearea",
+                    ),
+                ),
+                (
+                    "state",
+                    models.ForeignKey(
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="dv.state",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=[
+                            "funding_period",
+                            "financial_mechanism",
+                            "state",
+                            "programme_area",
+                            "gross_allocation",
+                            "net_allocation",
+                            "programme_allocation",
+                            "project_allocation",
+                            "project_count",
+                        ],
+                        name="dv_fact_period_fm_state_pa",
+                    ),
+                    models.Index(
+                        fields=[
+                            "funding_period",
+                            "state",
+                            "nuts",
+                            "gross_allocation",
+                            "net_allocation",
+                            "programme_allocation",
+                            "project_allocation",
+                            "project_count",
+                        ],
+                        name="dv_fact_period_state_nuts",
+                    ),
+                    models.Index(
+                        fields=[
+                            "funding_period",
+                            "sdg_no",
+                            "state",
+                            "gross_allocation",
+                            "net_allocation",
+                            "programme_allocation",
+                            "project_allocation",
+                            "project_count",
+                        ],
+                        name="dv_fact_period_sdg_state",
+                    ),
+                ],
+            },
+        ),
+    ]
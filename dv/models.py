@@ -244,6 +244,74 @@ class ProjectAllocation(models.Model):
     allocation = models.DecimalField(max_digits=15, decimal_places=2)
 
 
+ALLOCATION_FACT_MEASURES = (
+    "gross_allocation",
+    "net_allocation",
+    "programme_allocation",
+    "project_allocation",
+    "project_count",
+)
+
+
+class AllocationFact(models.Model):
+    """
+    The allocations of Allocation, ProgrammeAllocation and ProjectAllocation,
+    denormalized in a single table built by the import, summed by period,
+    FM, state, programme area, priority sector, programme, NUTS, thematic
+    and SDG. Each source fills its own measures, and leaves the dimensions it
+    doesn't have (e.g. the programme, for Allocation) empty.
+
+    project_count is the number of projects of each row, so rolling up the
+    rows of the same project (e.g. across FMs) counts it more than once.
+    """
+
+    funding_period = models.IntegerField(choices=FUNDING_PERIODS)
+    financial_mechanism = models.CharField(max_length=3, choices=FINANCIAL_MECHANISMS)
+    state = models.ForeignKey(State, on_delete=models.CASCADE, null=True)
+    programme_area = models.ForeignKey(
+        ProgrammeArea, on_delete=models.CASCADE, null=True
+    )
+    priority_sector = models.ForeignKey(
+        PrioritySector, on_delete=models.CASCADE, null=True
+    )
+    programme = models.ForeignKey(Programme, on_delete=models.CASCADE, null=True)
+    nuts = models.ForeignKey(NUTS, on_delete=models.SET_NULL, null=True)
+    thematic = models.CharField(max_length=16, blank=True)
+    sdg_no = models.IntegerField(null=True)
+
+    gross_allocation = models.DecimalField(max_digits=15, decimal_places=2, default=0)
+    net_allocation = models.DecimalField(max_digits=15, decimal_places=2, default=0)
+    programme_allocation = models.DecimalField(
+        max_digits=15, decimal_places=2, default=0
+    )
+    project_allocation = models.DecimalField(max_digits=15, decimal_places=2, default=0)
+    project_count = models.IntegerField(default=0)
+
+    class Meta:
+        # The measures are part of the indexes, which cover the usual slices
+        # (SQLite has no INCLUDE columns)
+        indexes = [
+            models.Index(
+                fields=[
+                    "funding_period",
+                    "financial_mechanism",
+                    "state",
+                    "programme_area",
+                    *ALLOCATION_FACT_MEASURES,
+                ],
+                name="dv_fact_period_fm_state_pa",
+            ),
+            models.Index(
+                fields=["funding_period", "state", "nuts", *ALLOCATION_FACT_MEASURES],
+                name="dv_fact_period_state_nuts",
+            ),
+            models.Index(
+                fields=["funding_period", "sdg_no", "state", *ALLOCATION_FACT_MEASURES],
+                name="dv_fact_period_sdg_state",
+            ),
+        ]
+
+
 class ProjectTheme(models.Model):
     project = models.ForeignKey(
         Project, related_name="themes", on_delete=models.CASCADE
@@ -402,6 +470,41 @@ class News(models.Model):
         verbose_name_plural = "news"
 
 
+class ApiSnapshot(models.Model):
+    """
+    A pre-encoded API response, built at the end of the import and
+    served as-is instead of recomputing the payload on every request.
+    """
+
+    endpoint = models.CharField(max_length=64)  # e.g. "grants" or "grants/RO"
+    period = models.CharField(max_length=9)
+    version = models.PositiveSmallIntegerField()
+    content_type = models.CharField(max_length=64)
+    content = models.BinaryField()
+    created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ("endpoint", "period", "version")
+
+    def __str__(self):
+        return f"{self.endpoint} {self.period} (v{self.version})"
+
+
+class DataVersion(models.Model):
+    """
+    Version of the imported data of a funding period, bumped at the end of
+    every import. It's part of the API and page cache keys, so the cached
+    responses are invalidated as soon as the new data is in place.
+    """
+
+    period = models.CharField(max_length=9, primary_key=True)
+    version = models.PositiveIntegerField(default=0)
+    updated = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.period} v{self.version}"
+
+
 class StaticContent(models.Model):
     name = models.CharField(max_length=64, unique=True)
     body = CKEditor5Field()
@@ -11,6 +11,11 @@ from dv.models import Programme
 from dv.models import Organisation
 from dv.models import BilateralInitiative
 
+# Part of the index schema fingerprint (see dv.lib.indexing): bump it when the
+# documents change without a change of their fields, e.g. in a prepare method,
+# so the next index_changes rebuilds the index
+SCHEMA_VERSION = 1
+
 
 class BilateralInitiativeIndex(SearchIndex, Indexable):
     # common facets
@@ -560,20 +565,26 @@ class OrganisationIndex(SearchIndex, Indexable):
         super().__init__()
 
     def index_queryset(self, using=None):
-        return self.get_model().objects.prefetch_related(
-            "roles",
-            # XXX While it would be great to prefetch everything here, these are
-            # XXX reaching SQLite's limit and will raise the following error:
-            # XXX Expression tree is too large (maximum depth 1000)
-            # XXX https://code.djangoproject.com/ticket/36707
-            # "roles__state",
-            # "roles__project",
-            # "roles__project__state",
-            # "roles__project__programme",
-            # "roles__project__programme_areas",
-            # "roles__programme",
-            # "roles__programme__states",
-            # "roles__programme__programme_areas",
+        # the organisations without roles are skipped (see prepare)
+        return (
+            self.get_model()
+            .objects.filter(roles__isnull=False)
+            .distinct()
+            .prefetch_related(
+                "roles",
+                # XXX While it would be great to prefetch everything here, these are
+                # XXX reaching SQLite's limit and will raise the following error:
+                # XXX Expression tree is too large (maximum depth 1000)
+                # XXX https://code.djangoproject.com/ticket/36707
+                # "roles__state",
+                # "roles__project",
+                # "roles__project__state",
+                # "roles__project__programme",
+                # "roles__project__programme_areas",
+                # "roles__programme",
+                # "roles__programme__states",
+                # "roles__programme__programme_areas",
+            )
         )
 
     def get_model(self):
@@ -78,9 +78,9 @@ MIDDLEWARE = [
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
-    "django.middleware.cache.UpdateCacheMiddleware",
+    "dv.middleware.UpdateCacheMiddleware",
     "django.middleware.common.CommonMiddleware",
-    "django.middleware.cache.FetchFromCacheMiddleware",
+    "dv.middleware.FetchFromCacheMiddleware",
 ]
 
 ROOT_URLCONF = "dv.urls"
@@ -296,11 +296,28 @@ CACHES = {
     "default": {
         "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
         "LOCATION": "/var/tmp/django_cache",
+        "OPTIONS": {
+            # warm_cache stores a few hundred API responses per import, the
+            # default (300) would cull some of them right away
+            "MAX_ENTRIES": 5000,
+        },
     }
 }
 
+# Import caches: the parsed 2009-2014 spreadsheets, keyed by their content
+# (see dv.lib.sheets), and the sanitized HTML texts in a sqlite db, keyed by
+# the hash of the original (see dv.lib.sanitize). Set to None to always parse
+# and sanitize everything.
+IMPORT_CACHE_DIR = "/var/tmp/dv_import_cache"
+
+# The cached API responses are invalidated by the imports (see
+# dv.lib.cache), this only limits how long stale entries are kept around.
 API_CACHE_SECONDS = 60 * 60 * 24  # 1 day
 
+# JSON encoder used by the API, see dv.lib.http.JSON_BACKENDS.
+# Defaults to orjson when it's installed.
+API_JSON_BACKEND = None
+
 DEFAULT_AUTO_FIELD = "django.db.models.AutoField"
 
 
@@ -0,0 +1,131 @@
+import gzip
+import json
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+
+from dv.lib import cache as api_cache
+from dv.lib.cache import bump_data_version
+from dv.models import State
+from dv.tests.factories.bilateral_initiative_factory import BilateralInitiativeFactory
+
+
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+)
+class TestApiCache(TestCase):
+    fixtures = ["initial/state"]
+    url = reverse("api:bilateral-initiatives")
+
+    def setUp(self):
+        cache.clear()
+        BilateralInitiativeFactory(state=State.objects.first(), grant=10)
+
+    def test_encodings(self):
+        plain = self.client.get(self.url)
+        self.assertNotIn("Content-Encoding", plain)
+        self.assertEqual(plain["Vary"], "Accept-Encoding")
+
+        # only the data version is looked up
+        with self.assertNumQueries(1):
+            resp = self.client.get(self.url, HTTP_ACCEPT_ENCODING="gzip, deflate")
+        self.assertEqual(resp["Content-Encoding"], "gzip")
+        self.assertEqual(gzip.decompress(resp.content), plain.content)
+        # each representation has its own ETag
+        self.assertNotEqual(resp["ETag"], plain["ETag"])
+
+        resp = self.client.get(self.url, HTTP_ACCEPT_ENCODING="br;q=0, gzip")
+        self.assertEqual(resp["Content-Encoding"], "gzip")
+
+        if api_cache.brotli is not None:
+            resp = self.client.get(self.url, HTTP_ACCEPT_ENCODING="gzip, br")
+            self.assertEqual(resp["Content-Encoding"], "br")
+            self.assertEqual(api_cache.brotli.decompress(resp.content), plain.content)
+
+        self.assertEqual(json.loads(plain.content)[0]["allocation"], "10")
+
+    def test_conditional_get(self):
+        etag = self.client.get(self.url)["ETag"]
+        self.assertTrue(etag.startswith('"'))
+
+        resp = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 304)
+        self.assertEqual(resp.content, b"")
+        self.assertEqual(resp["ETag"], etag)
+
+        resp = self.client.get(self.url, HTTP_IF_NONE_MATCH='"stale"')
+        self.assertEqual(resp.status_code, 200)
+
+    def test_conditional_get_other_urls(self):
+        etag = self.client.get(self.url)["ETag"]
+
+        # the ETags are specific to the URL
+        resp = self.client.get(
+            self.url, {"period": "2014-2021"}, HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(resp.status_code, 200)
+        self.assertNotEqual(resp["ETag"], etag)
+
+        # and only match cached successful responses
+        url = reverse("api:cube")
+        for _ in range(2):
+            resp = self.client.get(url, {"by": "colour"}, HTTP_IF_NONE_MATCH="*")
+            self.assertEqual(resp.status_code, 400)
+        resp = self.client.get(self.url, HTTP_IF_NONE_MATCH="*")
+        self.assertEqual(resp.status_code, 200)
+
+    def test_data_version(self):
+        etag = self.client.get(self.url)["ETag"]
+        BilateralInitiativeFactory(state=State.objects.first(), grant=20)
+
+        # still cached
+        resp = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 304)
+
+        bump_data_version(["2009-2014"])
+        resp = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 304)
+
+        bump_data_version(["2014-2021"])
+        resp = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 200)
+        self.assertNotEqual(resp["ETag"], etag)
+        self.assertEqual(resp.json()[0]["allocation"], "30")
+
+    def test_uncacheable_requests(self):
+        # the data version is only looked up for the cacheable requests
+        with self.assertNumQueries(0):
+            resp = self.client.post("/api/missing/")
+        self.assertEqual(resp.status_code, 404)
+
+
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+)
+class TestWarmCache(TransactionTestCase):
+    # the responses are computed in other threads, which must see the data
+    fixtures = ["initial/state"]
+    url = reverse("api:bilateral-initiatives")
+
+    def setUp(self):
+        cache.clear()
+        BilateralInitiativeFactory(state=State.objects.first(), grant=10)
+
+    def test_warm_cache(self):
+        out = StringIO()
+        err = StringIO()
+        call_command(
+            "warm_cache", period=["2014-2021"], workers=2, stdout=out, stderr=err
+        )
+        self.assertEqual(err.getvalue(), "")
+        self.assertIn("bilateral-initiatives", out.getvalue())
+        # no state has project allocations, so no per-beneficiary responses
+        self.assertNotIn("grants-beneficiary-detail", out.getvalue())
+
+        # served from the cache, only the data version is looked up
+        with self.assertNumQueries(1):
+            resp = self.client.get(self.url, {"period": "2014-2021"})
+        self.assertEqual(resp.json()[0]["allocation"], "10")
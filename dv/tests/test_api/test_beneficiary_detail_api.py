@@ -0,0 +1,127 @@
+from decimal import Decimal
+
+from django.test import TestCase
+from django.urls import reverse
+
+from dv.lib import nuts
+from dv.models import (
+    NUTS,
+    NUTSVersion,
+    PrioritySector,
+    ProgrammeArea,
+    ProjectAllocation,
+    State,
+)
+from dv.tests.factories.project_factory import ProjectFactory
+
+
+class TestBeneficiaryDetailApi(TestCase):
+    fixtures = ["initial/state"]
+
+    def setUp(self):
+        # the data versions restart with every test
+        nuts._indexes.clear()
+        version = NUTSVersion.objects.create(year=2016)
+        for code in ("RO", "RO1", "RO11", "RO111", "RO112", "RO12", "RO121", "ROZZZ"):
+            NUTS.objects.create(code=code, label=code).nuts_versions.add(version)
+
+        self.state = State.objects.get(code="RO")
+        sector = PrioritySector.objects.create(code="PS1", name="Sector")
+        self.area = ProgrammeArea.objects.create(
+            funding_period=3,
+            priority_sector=sector,
+            code="PA01",
+            name="Area",
+            short_name="Area",
+            objective="",
+        )
+
+    def _allocate(self, nuts, allocation):
+        project = ProjectFactory(state=self.state, nuts_id=nuts)
+        ProjectAllocation.objects.create(
+            funding_period=3,
+            financial_mechanism="EEA",
+            state=self.state,
+            programme_area=self.area,
+            priority_sector=self.area.priority_sector,
+            project=project,
+            allocation=allocation,
+        )
+        return project
+
+    def _get(self, name):
+        resp = self.client.get(reverse(name, args=["RO"]))
+        self.assertEqual(resp.status_code, 200)
+        return {row["id"]: row for row in resp.json()}
+
+    def test_split_among_nuts3(self):
+        self._allocate("RO111", 10)
+        self._allocate("RO11", 10)
+        self._allocate("RO1", 30)
+        self._allocate("ROZZZ", 30)
+
+        data = self._get("api:grants-beneficiary-detail")
+        self.assertEqual(set(data), {"RO111", "RO112", "RO121"})
+        self.assertEqual(Decimal(data["RO111"]["allocation"]), Decimal("35.00"))
+        self.assertEqual(Decimal(data["RO112"]["allocation"]), Decimal("25.00"))
+        self.assertEqual(Decimal(data["RO121"]["allocation"]), Decimal("20.00"))
+        self.assertEqual(data["RO111"]["project_count"], 4)
+        self.assertEqual(data["RO121"]["project_count"], 2)
+
+    def test_projects_keep_location(self):
+        self._allocate("RO111", 10)
+        self._allocate("RO1", 30)
+
+        data = self._get("api:projects-beneficiary-detail")
+        self.assertEqual(set(data), {"RO111", "RO1"})
+        self.assertEqual(Decimal(data["RO1"]["allocation"]), Decimal("30.00"))
+
+    def test_sdg_split_among_nuts3(self):
+        self._allocate("RO12", 10)
+        self._allocate("RO", 30)
+
+        data = self._get("api:sdg-beneficiary-detail")
+        self.assertEqual(set(data), {"RO111", "RO112", "RO121"})
+        self.assertEqual(Decimal(data["RO121"]["allocation"]), Decimal("20.00"))
+        self.assertEqual(data["RO121"]["areas"], [self.area.id])
+
+    def test_batched_detail(self):
+        self._allocate("RO111", 10)
+        self._allocate("RO1", 30)
+        single = self._get("api:grants-beneficiary-detail")
+
+        url = reverse("api:grants-beneficiaries-detail")
+        # data version, snapshot, allocations (the NUTS index is cached)
+        with self.assertNumQueries(3):
+            data = self.client.get(url).json()
+        self.assertEqual(list(data), ["RO"])
+        self.assertEqual({row["id"]: row for row in data["RO"]}, single)
+
+        data = self.client.get(url, {"beneficiary": "RO,BG"}).json()
+        self.assertEqual(data["BG"], [])
+        self.assertEqual(len(data["RO"]), 3)
+
+        resp = self.client.get(url, {"beneficiary": "RO,QQ"})
+        self.assertEqual(resp.status_code, 404)
+
+    def test_columnar_layout(self):
+        self._allocate("RO111", 10)
+        self._allocate("RO1", 30)
+        rows = self.client.get(
+            reverse("api:projects-beneficiary-detail", args=["RO"])
+        ).json()
+
+        data = self.client.get(
+            reverse("api:projects-beneficiary-detail", args=["RO"]),
+            {"layout": "columnar"},
+        ).json()
+        self.assertEqual(data["length"], 2)
+        columns = data["columns"]
+        self.assertEqual(columns["id"], [row["id"] for row in rows])
+        # same area on every row
+        self.assertEqual(columns["area"], {"values": ["Area"], "index": [0, 0]})
+
+        data = self.client.get(
+            reverse("api:projects-beneficiaries-detail"), {"layout": "columnar"}
+        ).json()
+        self.assertEqual(data["RO"]["columns"]["id"], columns["id"])
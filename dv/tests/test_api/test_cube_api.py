@@ -0,0 +1,154 @@
+import json
+from io import StringIO
+
+from django.core.management import call_command
+from django.db.models import Sum
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from dv.lib.cache import bump_data_version
+from dv.models import (
+    NUTS,
+    Allocation,
+    AllocationFact,
+    PrioritySector,
+    ProgrammeAllocation,
+    ProgrammeArea,
+    ProjectAllocation,
+    State,
+)
+from dv.tests.factories.programme_factory import ProgrammeFactory
+from dv.tests.factories.project_factory import ProjectFactory
+
+
+class TestCubeApi(TestCase):
+    fixtures = ["initial/state"]
+    url = reverse("api:cube")
+
+    def setUp(self):
+        sector = PrioritySector.objects.create(code="PS1", name="Sector")
+        self.areas = [
+            ProgrammeArea.objects.create(
+                funding_period=3,
+                priority_sector=sector,
+                code=f"PA0{i}",
+                name=f"Area {i}",
+                short_name=f"Area {i}",
+                objective="",
+            )
+            for i in range(2)
+        ]
+        for state in State.objects.filter(code__in=("BG", "RO")):
+            for area in self.areas:
+                for fm in ("EEA", "NOR"):
+                    Allocation.objects.create(
+                        funding_period=3,
+                        financial_mechanism=fm,
+                        state=state,
+                        programme_area=area,
+                        gross_allocation=100,
+                        net_allocation=90,
+                    )
+
+        programme = ProgrammeFactory(code="ROPR1")
+        ProgrammeAllocation.objects.create(
+            funding_period=3,
+            financial_mechanism="EEA",
+            state_id="RO",
+            programme_area=self.areas[0],
+            priority_sector=sector,
+            programme=programme,
+            allocation=80,
+            sdg_no=4,
+        )
+        for code, nuts in (("RO-P1", "RO111"), ("RO-P2", "RO112"), ("RO-P3", "RO211")):
+            project = ProjectFactory(
+                code=code,
+                programme=programme,
+                state_id="RO",
+                nuts=NUTS.objects.create(code=nuts, label=nuts),
+                sdg_no=4,
+            )
+            ProjectAllocation.objects.create(
+                funding_period=3,
+                financial_mechanism="EEA",
+                state_id="RO",
+                programme_area=self.areas[0],
+                priority_sector=sector,
+                project=project,
+                allocation=20,
+            )
+        call_command("build_facts", period="2014-2021", stdout=StringIO())
+
+    def get(self, **params):
+        resp = self.client.get(self.url, params)
+        return resp.status_code, json.loads(resp.content)
+
+    def test_totals(self):
+        status, rows = self.get()
+        self.assertEqual(status, 200)
+        self.assertEqual(
+            rows,
+            [
+                {
+                    "gross_allocation": "800",
+                    "net_allocation": "720",
+                    "programme_allocation": "80",
+                    "project_allocation": "60",
+                    "project_count": 3,
+                }
+            ],
+        )
+        # the facts add up to their sources
+        self.assertEqual(
+            AllocationFact.objects.aggregate(Sum("gross_allocation")),
+            Allocation.objects.aggregate(gross_allocation__sum=Sum("gross_allocation")),
+        )
+        # and are rebuilt, not appended
+        call_command("build_facts", period="2014-2021", stdout=StringIO())
+        self.assertEqual(self.get(), (status, rows))
+
+    def test_slice_and_roll_up(self):
+        status, rows = self.get(by="nuts2", fm="EEA Grants", beneficiary="RO")
+        self.assertEqual(status, 200)
+        self.assertEqual(
+            [(row["nuts2"], row["project_count"]) for row in rows],
+            [(None, 0), ("RO11", 2), ("RO21", 1)],
+        )
+        self.assertEqual(rows[0]["gross_allocation"], "200")
+
+        status, rows = self.get(by="fm,area", sdg_no="4", layout="columnar")
+        self.assertEqual(rows["length"], 1)
+        self.assertEqual(rows["columns"]["fm"], ["EEA Grants"])
+        self.assertEqual(rows["columns"]["area"], ["PA00"])
+        self.assertEqual(rows["columns"]["programme_allocation"], ["80"])
+
+        self.assertEqual(self.get(by="beneficiary", period="2009-2014"), (200, []))
+
+    @override_settings(
+        CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+    )
+    def test_several_periods_cache(self):
+        cache.clear()
+        params = {"period": "2009-2014,2014-2021"}
+        resp = self.client.get(self.url, params)
+        etag = resp["ETag"]
+        self.assertEqual(resp.json()[0]["gross_allocation"], "800")
+
+        Allocation.objects.update(gross_allocation=200)
+        call_command("build_facts", period="2014-2021", stdout=StringIO())
+        # cached until the next import
+        resp = self.client.get(self.url, params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 304)
+
+        bump_data_version(["2014-2021"])
+        resp = self.client.get(self.url, params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 200)
+        self.assertNotEqual(resp["ETag"], etag)
+        self.assertEqual(resp.json()[0]["gross_allocation"], "1600")
+
+    def test_unknown_dimension(self):
+        status, error = self.get(by="beneficiary,colour")
+        self.assertEqual(status, 400)
+        self.assertEqual(error, {"error": "Unknown dimensions: colour."})
@@ -0,0 +1,37 @@
+from datetime import datetime, timezone
+from decimal import Decimal
+
+from django.test import SimpleTestCase, override_settings
+
+from dv.lib.http import JSON_BACKENDS, JsonResponse, dumps
+
+
+class TestJsonBackends(SimpleTestCase):
+    data = {
+        "allocation": Decimal("30.50"),
+        "states": {"RO", "BG"},
+        "created": datetime(2024, 7, 5, 11, 15, 40, 123456, tzinfo=timezone.utc),
+        "title": "Ştiri",
+        "nuts": {None: 1, 2: [1.5, True]},
+    }
+
+    def test_backends_agree(self):
+        expected = (
+            '{"allocation":"30.50","states":["BG","RO"],'
+            '"created":"2024-07-05T11:15:40.123Z","title":"Ştiri",'
+            '"nuts":{"null":1,"2":[1.5,true]}}'
+        ).encode()
+        for backend in JSON_BACKENDS:
+            with self.subTest(backend=backend):
+                self.assertEqual(dumps(self.data, backend=backend), expected)
+
+    def test_indent(self):
+        for backend in JSON_BACKENDS:
+            with self.subTest(backend=backend):
+                self.assertEqual(dumps([1], indent=2, backend=backend), b"[\n  1\n]")
+
+    @override_settings(API_JSON_BACKEND="json")
+    def test_response(self):
+        response = JsonResponse([self.data])
+        self.assertEqual(response["Content-Type"], "application/json")
+        self.assertEqual(response.content, b"[" + dumps(self.data) + b"]")
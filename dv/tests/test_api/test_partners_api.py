@@ -0,0 +1,130 @@
+from django.test import TestCase
+from django.urls import reverse
+
+from dv.models import (
+    NUTS,
+    Organisation,
+    OrganisationRole,
+    PrioritySector,
+    ProgrammeAllocation,
+    ProgrammeArea,
+    State,
+)
+from dv.tests.factories.programme_factory import ProgrammeFactory
+from dv.tests.factories.project_factory import ProjectFactory
+
+
+class TestPartnersApi(TestCase):
+    fixtures = ["initial/state"]
+
+    def setUp(self):
+        for code in ("NO011", "IS001", "RO111", "RO112"):
+            NUTS.objects.create(code=code, label=code)
+
+        state = State.objects.get(code="RO")
+        sector = PrioritySector.objects.create(code="PS1", name="Sector")
+        area = ProgrammeArea.objects.create(
+            funding_period=3,
+            priority_sector=sector,
+            code="PA01",
+            name="Area",
+            short_name="Area",
+            objective="",
+        )
+        self.programme = ProgrammeFactory(code="ROPR1")
+        ProgrammeAllocation.objects.create(
+            funding_period=3,
+            financial_mechanism="EEA",
+            state=state,
+            programme_area=area,
+            priority_sector=sector,
+            programme=self.programme,
+            allocation=100,
+        )
+        self.project = ProjectFactory(
+            code="ROPR1-0001", programme=self.programme, state=state
+        )
+        self.project.programme_areas.set([area])
+
+        self._role("DPP", "Directorate", "Norway", "NO011", project=False)
+        self._role("PO", "Ministry", "Romania", "RO111", project=False)
+        self._role("PJDPP", "Oslo partner", "Norway", "NO011")
+        # located outside its donor state, so not a source of connections
+        self._role("PJDPP", "Expat partner", "Norway", "RO112")
+        self._role("PJDPP", "Reykjavik partner", "Iceland", "IS001")
+        self._role("PJPT", "Promoter", "Romania", "RO111")
+
+    def _role(self, role_code, name, country, nuts, project=True):
+        organisation = Organisation.objects.create(
+            funding_period=3, name=name, country=country, nuts_id=nuts
+        )
+        OrganisationRole.objects.create(
+            funding_period=3,
+            role_code=role_code,
+            role_name=role_code,
+            organisation=organisation,
+            programme=self.programme,
+            project=self.project if project else None,
+        )
+
+    def test_partners(self):
+        data = self.client.get(reverse("api:partners")).json()
+        rows = {row["donor"]: row for row in data}
+        self.assertEqual(sorted(rows), ["IS", "NO"])
+
+        row = rows["NO"]
+        self.assertEqual(row["DPP"], "Directorate")
+        self.assertEqual(row["DPP_nuts"], "NO011")
+        self.assertEqual([po["name"] for po in row["PO"].values()], ["Ministry"])
+        self.assertEqual(
+            sorted(partner["name"] for partner in row["PJDPP"].values()),
+            ["Expat partner", "Oslo partner"],
+        )
+        self.assertEqual(
+            [partner["name"] for partner in row["PJPT"].values()], ["Promoter"]
+        )
+        project = row["projects"]["ROPR1-0001"]
+        self.assertEqual(project["src_nuts"], ["NO011"])
+        self.assertEqual(project["dst_nuts"], ["RO111"])
+        self.assertEqual(row["prj_nuts"], [{"src": "NO011", "dst": "RO111"}])
+
+        # no programme partner from Iceland, only the project partners
+        row = rows["IS"]
+        self.assertNotIn("DPP", row)
+        self.assertNotIn("PO", row)
+        self.assertEqual(row["projects"]["ROPR1-0001"]["src_nuts"], ["IS001"])
+        self.assertEqual(row["prj_nuts"], [{"src": "IS001", "dst": "RO111"}])
+
+    def test_partners_normalized(self):
+        data = self.client.get(reverse("api:partners"), {"format": "normalized"}).json()
+        organisations = data["organisations"]
+        self.assertEqual(
+            sorted(org["name"] for org in organisations.values()),
+            [
+                "Directorate",
+                "Expat partner",
+                "Ministry",
+                "Oslo partner",
+                "Promoter",
+                "Reykjavik partner",
+            ],
+        )
+        programme = data["programmes"]["ROPR1"]
+        self.assertEqual(
+            [organisations[str(org_id)]["name"] for org_id in programme["PO"]],
+            ["Ministry"],
+        )
+
+        rows = {row["donor"]: row for row in data["rows"]}
+        self.assertEqual(sorted(rows), ["IS", "NO"])
+        row = rows["NO"]
+        self.assertEqual(
+            [organisations[str(org_id)]["name"] for org_id in row["DPP"]],
+            ["Directorate"],
+        )
+        self.assertEqual(list(row["PJDPP"].values()), [["ROPR1-0001"], ["ROPR1-0001"]])
+        self.assertEqual(
+            [organisations[str(org_id)]["name"] for org_id in row["PJPT"]],
+            ["Promoter"],
+        )
+        self.assertEqual(rows["IS"]["DPP"], [])
@@ -0,0 +1,108 @@
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from dv.models import Allocation, News, PrioritySector, ProgrammeArea, State
+from dv.tests.factories.programme_factory import ProgrammeFactory
+from dv.tests.factories.project_factory import ProjectFactory
+
+
+class TestApiQueryCounts(TestCase):
+    """The query count of the API views must not depend on the data size."""
+
+    fixtures = ["initial/state"]
+
+    def setUp(self):
+        self.states = list(State.objects.filter(code__in=("BG", "RO", "PL")))
+        sector = PrioritySector.objects.create(code="PS1", name="Sector")
+        self.areas = [
+            ProgrammeArea.objects.create(
+                funding_period=3,
+                priority_sector=sector,
+                code=f"PA0{i}",
+                name=f"Area {i}",
+                short_name=f"Area {i}",
+                objective="",
+            )
+            for i in range(2)
+        ]
+        for state in self.states:
+            for area in self.areas:
+                Allocation.objects.create(
+                    funding_period=3,
+                    financial_mechanism="EEA",
+                    state=state,
+                    programme_area=area,
+                    gross_allocation=100,
+                    net_allocation=90,
+                )
+        self.count = 0
+
+    def add_programmes(self, count):
+        for _ in range(count):
+            self.count += 1
+            programme = ProgrammeFactory(
+                code=f"PR{self.count}", allocation_eea=10, allocation_norway=0
+            )
+            programme.states.set(self.states)
+            programme.programme_areas.set(self.areas)
+
+            project = ProjectFactory(programme=programme, state=self.states[0])
+            project.programme_areas.set(self.areas[:1])
+
+            News.objects.create(
+                title="Project news", link="https://example.com", project=project
+            )
+            news = News.objects.create(
+                title="Programme news", link="https://example.com"
+            )
+            news.programmes.set([programme])
+
+    def assertConstantQueries(self, url):
+        self.add_programmes(1)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        expected = len(queries)
+
+        self.add_programmes(5)
+        with self.assertNumQueries(expected):
+            self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_overview(self):
+        self.assertConstantQueries(reverse("api:index"))
+
+    def test_grants(self):
+        self.assertConstantQueries(reverse("api:grants"))
+
+    def test_projects(self):
+        self.assertConstantQueries(reverse("api:projects"))
+
+    def test_projects_news(self):
+        self.add_programmes(2)
+        data = self.client.get(reverse("api:projects")).json()
+        row = next(
+            row
+            for row in data
+            if row["beneficiary"] == self.states[0].code
+            and row["area"] == self.areas[0].name
+        )
+        self.assertEqual(
+            sorted(item["title"] for item in row["news"]),
+            ["Programme news"] * 2 + ["Project news"] * 2,
+        )
+
+    def test_projects_news_normalized(self):
+        self.add_programmes(2)
+        data = self.client.get(reverse("api:projects"), {"format": "normalized"}).json()
+        self.assertEqual(len(data["news"]), 4)
+        row = next(
+            row
+            for row in data["rows"]
+            if row["beneficiary"] == self.states[0].code
+            and row["area"] == self.areas[0].name
+        )
+        self.assertEqual(
+            sorted(data["news"][str(news_id)]["title"] for news_id in row["news"]),
+            ["Programme news"] * 2 + ["Project news"] * 2,
+        )
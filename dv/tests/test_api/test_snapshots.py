@@ -0,0 +1,84 @@
+from django.core.management import call_command
+from django.test import RequestFactory, TestCase
+from django.urls import reverse
+
+from dv.lib.snapshots import SNAPSHOT_VERSION
+from dv.models import ApiSnapshot, Indicator, ProgrammeArea, PrioritySector, State
+from dv.tests.factories.programme_factory import ProgrammeFactory
+from dv.views.api import projects_beneficiary_detail
+
+
+class TestApiSnapshots(TestCase):
+    fixtures = ["initial/state"]
+    url = reverse("api:indicators")
+
+    def setUp(self):
+        sector = PrioritySector.objects.create(code="PS1", name="Sector")
+        area = ProgrammeArea.objects.create(
+            funding_period=3,
+            priority_sector=sector,
+            code="PA01",
+            name="Area",
+            short_name="Area",
+            objective="",
+        )
+        Indicator.objects.create(
+            funding_period=3,
+            programme=ProgrammeFactory(),
+            programme_area=area,
+            state=State.objects.first(),
+            indicator="Indicator",
+            outcome="Outcome",
+            header="Header",
+            unit_of_measurement="x",
+            achievement_eea=1,
+            achievement_norway=2,
+            achievement_total=3,
+        )
+
+    def test_snapshot_matches_live(self):
+        live = self.client.get(self.url).content
+        call_command("build_snapshots", period="2014-2021")
+
+        snap = ApiSnapshot.objects.get(endpoint="indicators", period="2014-2021")
+        self.assertEqual(bytes(snap.content), live)
+
+        # data version and snapshot
+        with self.assertNumQueries(2):
+            resp = self.client.get(self.url)
+        self.assertEqual(resp.content, live)
+
+    def test_snapshot_is_served(self):
+        ApiSnapshot.objects.create(
+            endpoint="indicators",
+            period="2014-2021",
+            version=SNAPSHOT_VERSION,
+            content_type="application/json",
+            content=b"[]",
+        )
+        self.assertEqual(self.client.get(self.url).json(), [])
+        # other parameters bypass the snapshot
+        self.assertEqual(len(self.client.get(self.url, {"x": 1}).json()), 1)
+
+    def test_stale_snapshot_is_ignored(self):
+        ApiSnapshot.objects.create(
+            endpoint="indicators",
+            period="2014-2021",
+            version=SNAPSHOT_VERSION - 1,
+            content_type="application/json",
+            content=b"[]",
+        )
+        self.assertEqual(len(self.client.get(self.url).json()), 1)
+
+    def test_positional_arguments(self):
+        ApiSnapshot.objects.create(
+            endpoint="projects/RO",
+            period="2014-2021",
+            version=SNAPSHOT_VERSION,
+            content_type="application/json",
+            content=b"[]",
+        )
+        request = RequestFactory().get("/")
+        self.assertEqual(projects_beneficiary_detail(request, "RO").content, b"[]")
+        response = projects_beneficiary_detail(request, beneficiary="RO")
+        self.assertEqual(response.content, b"[]")
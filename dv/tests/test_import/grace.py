@@ -0,0 +1,182 @@
+"""
+A local stand-in for the grACE (MSSQL) source database of the 2014-2021
+import, backed by SQLite. The tables live in an attached "fmo" schema, so
+the import's queries run against it unchanged.
+"""
+
+import os
+import sqlite3
+from decimal import Decimal
+
+MONEY_COLUMNS = {
+    "GrossAllocation",
+    "NetAllocation",
+    "ProgrammeGrantEEA",
+    "ProgrammeGrantNorway",
+    "ProgrammeCoFinancing",
+    "BudgetHeadingGrant",
+    "ProjectGrant",
+    "Achievement_EEA",
+    "Achievement_Norway",
+    "AchievementDecimal",
+    "BIGrant",
+}
+
+TABLES = {
+    "TR_RDPProgrammeArea": [
+        "FundingPeriod",
+        "PSCode",
+        "PrioritySector",
+        "PACode",
+        "ProgrammeArea",
+        "ProgrammeAreaShortName",
+        "idPA",
+        "Objective",
+    ],
+    "TR_RDPCountryProgrammeArea": [
+        "FundingPeriod",
+        "Country",
+        "PACode",
+        "GrantShortName",
+        "GrossAllocation",
+        "NetAllocation",
+        "Thematic",
+    ],
+    "TR_RDPProgramme": [
+        "FundingPeriod",
+        "Country",
+        "ProgrammeShortName",
+        "Programme",
+        "ProgrammeSummary",
+        "ProgrammeStatus",
+        "ProgrammeGrantEEA",
+        "ProgrammeGrantNorway",
+        "ProgrammeCoFinancing",
+        "IsTAProgramme",
+        "IsBFProgramme",
+        "ProgrammeAreaList",
+    ],
+    "TR_RDPProgrammeBudgetHeading": [
+        "GrantShortName",
+        "Country",
+        "PACode",
+        "PSCode",
+        "ProgrammeShortName",
+        "BudgetHeadingGrant",
+        "Thematic",
+        "SDGno",
+    ],
+    "TR_RDPProject": [
+        "ProjectCode",
+        "Project",
+        "ProjectContractStatus",
+        "Country",
+        "ProgrammeShortName",
+        "ProjectLocation",
+        "SDGno",
+        "ProjectGrant",
+        "IdFinancialMechanismEEA",
+        "IdFinancialMechanismNorway",
+        "Hasended",
+        "isdpp",
+        "ResultPositiveEffects",
+        "ResultsImprovedKnowledge",
+        "CooperationContinue",
+        "ProjectInitialDescriptionHtml",
+        "ProjectResultsDescriptionHtml",
+        "Thematic",
+        "ProgrammeAreaCodesList",
+        "PrioritySectorCodesList",
+        "HostPA",
+        "HostPS",
+    ],
+    "TR_RDPIndicators": [
+        "ProgrammeShortName",
+        "PACode",
+        "Country",
+        "CoreCommonIndicator",
+        "Outcome",
+        "Header",
+        "UnitOfMeasurement",
+        "Achievement_EEA",
+        "Achievement_Norway",
+        "AchievementDecimal",
+        "CoreIndicatorCode",
+        "IsCore",
+        "IsCommon",
+        "Thematic",
+        "SDGno",
+    ],
+    "TR_RDPOrganisationRole": [
+        "IdOrganisation",
+        "Organisation",
+        "CountryOrganisation",
+        "City",
+        "OrganisationClassificationSector",
+        "OrganisationClassification",
+        "NUTSCode",
+        "OrganisationRoleCode",
+        "OrganisationRole",
+        "ProgrammeCode",
+        "ProjectCode",
+        "CountryRole",
+    ],
+    "TR_RDPBilateralinitiative": [
+        "BICode",
+        "BITitle",
+        "BIURL",
+        "BIGrant",
+        "ProgrammeShortName",
+        "ProjectCode",
+        "Country",
+        "Level",
+        "BIStatus",
+        "BIInitialDescriptionHtml",
+        "BIResultsDescriptionHtml",
+        "PromoterCountry",
+        "PromoterOrganisation",
+        "ProgrammeAreaCodesList",
+    ],
+}
+
+sqlite3.register_converter("MONEY", lambda value: Decimal(value.decode()))
+
+
+class GraceStandIn:
+    """
+    The stand-in db, stored in `directory`. `connect` replaces the
+    connection to grACE, and can be called from several threads.
+    """
+
+    def __init__(self, directory):
+        self.path = os.path.join(directory, "fmo.sqlite3")
+        self.conn = self.connect()
+        for table, columns in TABLES.items():
+            definitions = ", ".join(
+                f"{column} MONEY" if column in MONEY_COLUMNS else column
+                for column in columns
+            )
+            self.conn.execute(f"CREATE TABLE fmo.{table} ({definitions})")
+
+    def connect(self):
+        conn = sqlite3.connect(
+            ":memory:", detect_types=sqlite3.PARSE_DECLTYPES, check_same_thread=False
+        )
+        conn.execute("ATTACH DATABASE ? AS fmo", [self.path])
+        return conn
+
+    def add(self, table, **row):
+        columns = ", ".join(row)
+        params = ", ".join("?" for _ in row)
+        with self.conn:
+            self.conn.execute(
+                f"INSERT INTO fmo.{table} ({columns}) VALUES ({params})",
+                [str(v) if isinstance(v, Decimal) else v for v in row.values()],
+            )
+
+    def execute(self, sql, params=()):
+        with self.conn:
+            self.conn.execute(sql, params)
+
+    def close(self):
+        self.conn.close()
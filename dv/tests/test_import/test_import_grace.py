@@ -0,0 +1,363 @@
+import json
+import os
+import tempfile
+from decimal import Decimal
+from io import StringIO
+from unittest.mock import patch
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from dv.models import (
+    NUTS,
+    Allocation,
+    BilateralInitiative,
+    Indicator,
+    Organisation,
+    OrganisationRole,
+    Programme,
+    ProgrammeAllocation,
+    Project,
+    ProjectAllocation,
+)
+from dv.tests.test_import.grace import GraceStandIn
+
+
+def populate(grace):
+    for idx, (pa, ps) in enumerate((("PA01", "PS01"), ("PA02", "PS02")), 1):
+        grace.add(
+            "TR_RDPProgrammeArea",
+            FundingPeriod="2014-2021",
+            PSCode=ps,
+            PrioritySector=f"Sector {ps}",
+            PACode=pa,
+            ProgrammeArea=f"Area {pa}",
+            ProgrammeAreaShortName=pa,
+            idPA=idx,
+        )
+        grace.add(
+            "TR_RDPCountryProgrammeArea",
+            FundingPeriod="2014-2021",
+            Country="Romania",
+            PACode=pa,
+            GrantShortName="EEA",
+            GrossAllocation=Decimal("1000.00"),
+            NetAllocation=Decimal("900.00"),
+        )
+
+    for code, country, areas in (
+        ("ROPR1", "Romania", "PA01, PA02"),
+        ("SDDW", "", "PA02"),
+        ("RO-DECENTWORK", "Romania", "PA02"),
+        ("BG-DECENTWORK", "Bulgaria", "PA02"),
+    ):
+        grace.add(
+            "TR_RDPProgramme",
+            FundingPeriod="2014-2021",
+            Country=country,
+            ProgrammeShortName=code,
+            Programme=f"Programme {code}",
+            ProgrammeSummary="<p>Summary<script>x</script></p>",
+            ProgrammeGrantEEA=Decimal("500.00"),
+            ProgrammeGrantNorway=Decimal("0"),
+            ProgrammeCoFinancing=Decimal("50.00"),
+            IsTAProgramme=0,
+            IsBFProgramme=0,
+            ProgrammeAreaList=areas,
+        )
+    grace.add(
+        "TR_RDPProgrammeBudgetHeading",
+        GrantShortName="EEA",
+        Country="Romania",
+        PACode="PA01",
+        PSCode="PS01",
+        ProgrammeShortName="ROPR1",
+        BudgetHeadingGrant=Decimal("500.00"),
+    )
+
+    for code, eea, norway, areas, sectors in (
+        ("ROPR1-0001", 1, 1, "PA01", "PS01"),
+        ("ROPR1-0002", 1, 0, "PA01,PA02", "PS01,PS02"),
+    ):
+        grace.add(
+            "TR_RDPProject",
+            ProjectCode=code,
+            Project=f"Project {code}",
+            ProjectContractStatus="In progress",
+            Country="Romania",
+            ProgrammeShortName="ROPR1",
+            ProjectLocation="RO111",
+            ProjectGrant=Decimal("200.00"),
+            IdFinancialMechanismEEA=eea,
+            IdFinancialMechanismNorway=norway,
+            Hasended=0,
+            isdpp=0,
+            ProgrammeAreaCodesList=areas,
+            PrioritySectorCodesList=sectors,
+            HostPA="PA02",
+            HostPS="PS02",
+        )
+
+    grace.add(
+        "TR_RDPIndicators",
+        ProgrammeShortName="ROPR1",
+        PACode="PA01",
+        Country="Romania",
+        CoreCommonIndicator="Indicator",
+        Outcome="Outcome",
+        Header="Header",
+        UnitOfMeasurement="Number",
+        Achievement_EEA=Decimal("3"),
+        Achievement_Norway=None,
+        AchievementDecimal=Decimal("3"),
+        CoreIndicatorCode=1,
+        IsCore=1,
+        IsCommon=0,
+    )
+
+    for role, project in (("PO", None), ("PJPT", "ROPR1-0001"), ("PJPT", "ROPR1-0002")):
+        grace.add(
+            "TR_RDPOrganisationRole",
+            IdOrganisation=42,
+            Organisation="Ministry",
+            CountryOrganisation="Romania",
+            NUTSCode="RO111",
+            OrganisationRoleCode=role,
+            OrganisationRole=role,
+            ProgrammeCode="ROPR1",
+            ProjectCode=project,
+            CountryRole="Romania",
+        )
+
+    grace.add(
+        "TR_RDPBilateralinitiative",
+        BICode="BI01",
+        BITitle="Initiative",
+        BIGrant=Decimal("10.00"),
+        ProgrammeShortName="ROPR1",
+        ProjectCode="ROPR1-0001",
+        Country="Romania",
+        BIStatus="Completed",
+        PromoterCountry="Romania",
+        ProgrammeAreaCodesList="PA01, PA01, PAXX",
+    )
+
+
+class TestImportGrace(TestCase):
+    fixtures = ["initial/state"]
+
+    def setUp(self):
+        NUTS.objects.create(code="RO111", label="Nord-Vest")
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.tmp_dir = tmp_dir.name
+        self.enterContext(
+            override_settings(IMPORT_CACHE_DIR=os.path.join(self.tmp_dir, "cache"))
+        )
+        self.grace = GraceStandIn(self.tmp_dir)
+        self.addCleanup(self.grace.close)
+        populate(self.grace)
+        patch("dv.lib.grace.connect", self.grace.connect).start()
+        # the snapshots are covered by their own tests
+        patch("dv.management.commands.import.call_command").start()
+
+    def tearDown(self):
+        patch.stopall()
+
+    def test_import_2014_2021(self):
+        output = self.check_import()
+        self.assertIn("Extracted 2 Project rows", output)
+
+    @patch("dv.management.commands.import.BATCH_SIZE", 1)
+    @patch("dv.lib.grace.FETCH_SIZE", 1)
+    def test_import_2014_2021_in_batches(self):
+        self.check_import(workers=1)
+
+    def test_project_allocation_pairs(self):
+        # several host areas and sectors too, so the project keeps them all
+        self.grace.add(
+            "TR_RDPProject",
+            ProjectCode="ROPR1-0003",
+            Project="Project ROPR1-0003",
+            ProjectContractStatus="In progress",
+            Country="Romania",
+            ProgrammeShortName="ROPR1",
+            ProjectLocation="RO111",
+            ProjectGrant=Decimal("300.00"),
+            IdFinancialMechanismEEA=1,
+            IdFinancialMechanismNorway=0,
+            Hasended=0,
+            isdpp=0,
+            ProgrammeAreaCodesList="PA02,PA01",
+            PrioritySectorCodesList="PS02,PS01",
+            HostPA="PA02,PA01",
+            HostPS="PS02,PS01",
+        )
+        call_command("import", period="2014-2021", noinput=True, stdout=StringIO())
+        # paired by area id and sector code, not in the order they're listed
+        self.assertEqual(
+            list(
+                ProjectAllocation.objects.filter(project="ROPR1-0003")
+                .order_by("pk")
+                .values_list("programme_area__code", "priority_sector_id", "allocation")
+            ),
+            [("PA01", "PS01", Decimal("300.00")), ("PA02", "PS02", Decimal("0.00"))],
+        )
+
+    def test_duplicate_organisations(self):
+        # the distinct organisation query returns both, in separate batches
+        self.grace.add(
+            "TR_RDPOrganisationRole",
+            IdOrganisation=42,
+            Organisation="Ministry",
+            CountryOrganisation="Romania",
+            City="Bucharest",
+            NUTSCode="RO111",
+            OrganisationRoleCode="PO",
+            OrganisationRole="PO",
+            ProgrammeCode="SDDW",
+            CountryRole="Romania",
+        )
+        for fetch_size in (1000, 1):
+            with self.subTest(fetch_size=fetch_size), patch(
+                "dv.lib.grace.FETCH_SIZE", fetch_size
+            ):
+                call_command(
+                    "import", period="2014-2021", noinput=True, stdout=StringIO()
+                )
+                # as in the per-row import, the roles get the last one
+                first, last = Organisation.objects.order_by("pk")
+                self.assertFalse(first.roles.exists())
+                self.assertEqual(last.roles.count(), 4)
+
+    def check_import(self, **options):
+        out = StringIO()
+        call_command("import", period="2014-2021", noinput=True, stdout=out, **options)
+        output = out.getvalue()
+        self.assertIn("Imported 2 Programme objects.", output)
+        self.assertIn("Project stage: ", output)
+        self.assertIn("ProgrammeArea PAXX not found.", output)
+
+        self.assertEqual(Allocation.objects.filter(funding_period=3).count(), 2)
+        self.assertEqual(ProgrammeAllocation.objects.count(), 1)
+        self.assertEqual(Indicator.objects.get().achievement_norway, 0)
+
+        programme = Programme.objects.get(code="ROPR1")
+        self.assertEqual(programme.summary, "Summaryx")
+        self.assertEqual(
+            sorted(programme.programme_areas.values_list("code", flat=True)),
+            ["PA01", "PA02"],
+        )
+        self.assertEqual(
+            sorted(
+                Programme.objects.get(code="SDDW").states.values_list("code", flat=True)
+            ),
+            ["BG", "RO"],
+        )
+
+        project = Project.objects.get(code="ROPR1-0002")
+        # multiple areas and sectors, so only the host ones are kept
+        self.assertEqual(
+            list(project.programme_areas.values_list("code", flat=True)), ["PA02"]
+        )
+        self.assertEqual(
+            list(project.priority_sectors.values_list("code", flat=True)), ["PS02"]
+        )
+        self.assertEqual(
+            sorted(
+                ProjectAllocation.objects.filter(project="ROPR1-0001").values_list(
+                    "financial_mechanism", "allocation"
+                )
+            ),
+            [("EEA", Decimal("110.50")), ("NOR", Decimal("89.50"))],
+        )
+        self.assertEqual(
+            list(
+                ProjectAllocation.objects.filter(project="ROPR1-0002").values_list(
+                    "financial_mechanism",
+                    "programme_area__code",
+                    "priority_sector_id",
+                    "allocation",
+                )
+            ),
+            [("EEA", "PA02", "PS02", Decimal("200.00"))],
+        )
+
+        organisation = Organisation.objects.get()
+        self.assertEqual(organisation.nuts_id, "RO111")
+        self.assertEqual(
+            OrganisationRole.objects.filter(organisation=organisation).count(), 3
+        )
+
+        initiative = BilateralInitiative.objects.get()
+        self.assertEqual(
+            list(initiative.programme_areas.values_list("code", flat=True)), ["PA01"]
+        )
+        return output
+
+    def test_snapshot(self):
+        path = os.path.join(self.tmp_dir, "grace.zip")
+        out = StringIO()
+        call_command("import", dump_source=path, stdout=out)
+        self.assertIn("Saved 9 tables", out.getvalue())
+        self.assertFalse(Project.objects.exists())
+
+        with patch("dv.lib.grace.connect", side_effect=AssertionError):
+            output = self.check_import(from_snapshot=path)
+        self.assertIn(f"Restored 9 tables from {path}", output)
+
+    def test_incremental_import(self):
+        call_command("import", period="2014-2021", noinput=True, stdout=StringIO())
+        organisation = Organisation.objects.get()
+        self.grace.execute(
+            "UPDATE fmo.TR_RDPProject SET Project = 'Renamed' "
+            "WHERE ProjectCode = 'ROPR1-0002'"
+        )
+        self.grace.execute(
+            "UPDATE fmo.TR_RDPProgramme SET ProgrammeAreaList = 'PA01' "
+            "WHERE ProgrammeShortName = 'ROPR1'"
+        )
+        self.grace.execute("DELETE FROM fmo.TR_RDPBilateralinitiative")
+
+        path = os.path.join(self.tmp_dir, "changes.json")
+        call_command(
+            "import",
+            period="2014-2021",
+            incremental=True,
+            changeset=path,
+            stdout=StringIO(),
+        )
+        with open(path) as f:
+            changeset = json.load(f)
+        self.assertEqual(changeset["period"], "2014-2021")
+        changes = changeset["changes"]
+        self.assertEqual(
+            changes["Project"],
+            {"created": [], "updated": ["ROPR1-0002"], "deleted": []},
+        )
+        self.assertEqual(changes["Programme"]["updated"], ["ROPR1"])
+        self.assertEqual(changes["BilateralInitiative"]["deleted"], ["BI01"])
+        self.assertEqual(
+            changes["BilateralInitiative"]["deleted_from"]["project"], ["ROPR1-0001"]
+        )
+        self.assertEqual(
+            sorted(changes), ["BilateralInitiative", "Programme", "Project"]
+        )
+
+        self.assertEqual(Project.objects.get(code="ROPR1-0002").name, "Renamed")
+        self.assertEqual(
+            list(
+                Programme.objects.get(code="ROPR1").programme_areas.values_list(
+                    "code", flat=True
+                )
+            ),
+            ["PA01"],
+        )
+        self.assertFalse(BilateralInitiative.objects.exists())
+        # unchanged rows are left alone
+        self.assertEqual(Organisation.objects.get().pk, organisation.pk)
+        self.assertEqual(OrganisationRole.objects.count(), 3)
+
+        out = StringIO()
+        call_command("import", period="2014-2021", incremental=True, stdout=out)
+        self.assertIn("No changes for 2014-2021.", out.getvalue())
@@ -1,11 +1,44 @@
-from unittest.mock import patch
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import StringIO
+from urllib.parse import parse_qs, urlparse
+
 from django.core.management import call_command
 from django.test import TestCase
 from dv.models import News
 
+from dv.tests.factories.programme_factory import ProgrammeFactory
 from dv.tests.factories.project_factory import ProjectFactory
 
 
+class StubNewsServer(ThreadingHTTPServer):
+    """A local stand-in for the news endpoint, serving `pages` of posts."""
+
+    def __init__(self):
+        self.pages = []
+        super().__init__(("127.0.0.1", 0), StubNewsHandler)
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+    @property
+    def endpoint(self):
+        return f"http://127.0.0.1:{self.server_port}/rest/articles?page={{}}"
+
+
+class StubNewsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        page = int(parse_qs(urlparse(self.path).query)["page"][0])
+        pages = self.server.pages
+        body = json.dumps({"posts": pages[page] if page < len(pages) else []})
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.end_headers()
+        self.wfile.write(body.encode())
+
+    def log_message(self, format, *args):
+        pass
+
+
 class TestImportNews(TestCase):
     fixtures = ["initial/state"]
 
@@ -24,24 +57,70 @@ class TestImportNews(TestCase):
                 "is_partnership": "no",
             },
         ]
-        self.mock_open = patch("dv.management.commands.import_news.requests").start()
-        self.mock_open.get.return_value.json.side_effect = [
-            {"posts": self.mock_posts},
-            {"posts": []},
-        ]
+        self.server = StubNewsServer()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.server.pages = [self.mock_posts]
 
-    def tearDown(self):
-        patch.stopall()
+    def import_news(self, **options):
+        out = StringIO()
+        call_command(
+            "import_news",
+            endpoint=self.server.endpoint,
+            stdout=out,
+            stderr=StringIO(),
+            **options,
+        )
+        return out.getvalue()
 
     def test_import_news(self):
-        call_command("import_news")
+        self.import_news()
         obj = News.objects.first()
         self.assertEqual(obj.title, "The fight against disinformation")
         self.assertEqual(obj.project, self.project)
 
     def test_import_news_no_project(self):
         self.project.delete()
-        call_command("import_news")
+        self.import_news()
         obj = News.objects.first()
         self.assertEqual(obj.title, "The fight against disinformation")
         self.assertEqual(obj.project, None)
+
+    def test_import_news_pages(self):
+        other = ProgrammeFactory()
+        self.server.pages = [
+            [
+                dict(self.mock_posts[0], link=f"https://example.com/news/{page}-{idx}")
+                for idx in range(2)
+            ]
+            for page in range(5)
+        ]
+        output = self.import_news(workers=2)
+        self.assertIn("News: 10 created, 0 updated, 0 deleted, 0 unchanged.", output)
+        self.assertEqual(News.objects.count(), 10)
+        news = News.objects.get(link="https://example.com/news/4-1")
+        self.assertEqual(
+            list(news.programmes.values_list("code", flat=True)),
+            [self.project.programme.code],
+        )
+
+        # the news are updated in place, and the gone ones deleted
+        self.server.pages = [
+            [
+                dict(
+                    self.mock_posts[0],
+                    link="https://example.com/news/4-1",
+                    title="Renamed",
+                    programme_id=f"{other.code}, MISSING",
+                ),
+                dict(self.mock_posts[0], link="https://example.com/news/0-0"),
+            ],
+        ]
+        output = self.import_news()
+        self.assertIn("News: 0 created, 1 updated, 8 deleted, 1 unchanged.", output)
+        renamed = News.objects.get(link="https://example.com/news/4-1")
+        self.assertEqual(renamed.pk, news.pk)
+        self.assertEqual(renamed.title, "Renamed")
+        self.assertEqual(
+            list(renamed.programmes.values_list("code", flat=True)), [other.code]
+        )
@@ -0,0 +1,73 @@
+import os
+import tempfile
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from dv.lib.cache import data_token
+from dv.lib import nuts
+from dv.lib.nuts import NutsIndex
+from dv.management.commands.import_nuts import FAKE_NUTS
+from dv.models import NUTS, NUTSVersion
+
+CSV = """CNTR_CODE,NUTS_ID,NUTS_NAME,NAME_LATN
+RO,RO,România,Romania
+RO,RO1,Macroregiunea unu,Macroregiunea unu
+RO,RO11,Nord-Vest,Nord-Vest
+RO,RO111,Bihor,Bihor
+"""
+
+
+class TestImportNuts(TestCase):
+    def setUp(self):
+        # the data versions restart with every test
+        nuts._indexes.clear()
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.path = os.path.join(tmp_dir.name, "NUTS_AT_2021.csv")
+
+    def import_nuts(self, year, content):
+        with open(self.path, "w", encoding="utf8") as f:
+            f.write(content)
+        call_command("import_nuts", year, file=self.path, verbosity=0)
+
+    def test_import_nuts(self):
+        NUTS.objects.create(code="RO111", label="Old label")
+        self.import_nuts("2021", CSV)
+
+        self.assertEqual(NUTS.objects.count(), 4 + 3 + len(FAKE_NUTS))
+        self.assertEqual(NUTS.objects.get(code="RO").label, "România / Romania")
+        self.assertEqual(NUTS.objects.get(code="RO111").label, "Bihor")
+        self.assertEqual(NUTS.objects.get(code="ROZZ").label, "Extra-Regio NUTS 2")
+        self.assertEqual(
+            NUTS.objects.filter(nuts_versions__year=2021).count(),
+            NUTS.objects.count(),
+        )
+
+        # a new version links the existing codes, and adds the new ones
+        self.import_nuts("2024", CSV.replace("RO111,Bihor,Bihor", "RO112,Bihor,Bihor"))
+        self.assertEqual(NUTS.objects.count(), 4 + 3 + len(FAKE_NUTS) + 1)
+        self.assertEqual(
+            set(
+                NUTSVersion.objects.get(year=2024).nuts_set.values_list(
+                    "code", flat=True
+                )
+            ),
+            set(NUTS.objects.exclude(code="RO111").values_list("code", flat=True)),
+        )
+        self.assertEqual(
+            list(NUTS.objects.get(code="RO111").nuts_versions.all()),
+            [NUTSVersion.objects.get(year=2021)],
+        )
+
+    def test_nuts_index(self):
+        self.import_nuts("2016", CSV)
+        token = data_token()
+        self.assertEqual(NutsIndex.for_period("2014-2021").nuts3("RO1"), ("RO111",))
+
+        # the import bumps the data token, which rebuilds the cached index
+        self.import_nuts("2016", CSV + "RO,RO112,Bihor,Bihor\n")
+        self.assertNotEqual(data_token(), token)
+        self.assertEqual(
+            NutsIndex.for_period("2014-2021").nuts3("RO1"), ("RO111", "RO112")
+        )
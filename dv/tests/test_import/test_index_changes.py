@@ -0,0 +1,206 @@
+import json
+import os
+import tempfile
+from io import StringIO
+from unittest.mock import patch
+
+from django.core.management import call_command
+from django.test import TestCase
+from elasticsearch.client import IndicesClient
+
+from dv.lib import indexing
+from dv.lib.es7 import CustomES7SearchBackend
+from dv.models import (
+    BilateralInitiative,
+    Indicator,
+    News,
+    Organisation,
+    OrganisationRole,
+    PrioritySector,
+    Programme,
+    ProgrammeArea,
+    Project,
+)
+from dv.tests.factories.programme_factory import ProgrammeFactory
+from dv.tests.factories.project_factory import ProjectFactory
+
+
+class TestIndexChanges(TestCase):
+    fixtures = ["initial/state"]
+
+    def setUp(self):
+        sector = PrioritySector.objects.create(code="PS1", name="Sector")
+        self.area = ProgrammeArea.objects.create(
+            funding_period=3,
+            priority_sector=sector,
+            code="PA01",
+            name="Area",
+            short_name="Area",
+            objective="",
+        )
+        self.programmes = [ProgrammeFactory(code=f"ROPR{i}") for i in range(2)]
+        self.programmes[0].programme_areas.set([self.area])
+        self.project = ProjectFactory(
+            code="ROPR0-0001", programme=self.programmes[0], state_id="RO"
+        )
+        self.project.programme_areas.set([self.area])
+        ProjectFactory(code="ROPR1-0001", programme=self.programmes[1], state_id="RO")
+        self.organisation = Organisation.objects.create(funding_period=3, name="Org")
+        OrganisationRole.objects.create(
+            funding_period=3,
+            role_code="PJPT",
+            role_name="Project Promoter",
+            organisation=self.organisation,
+            project=self.project,
+        )
+        self.news = News.objects.create(
+            title="News", link="https://example.com", project=self.project
+        )
+
+    def documents(self, changes):
+        return {
+            model.__name__: (sorted(update), sorted(remove))
+            for model, (update, remove) in indexing.changed_documents(changes).items()
+            if update or remove
+        }
+
+    def test_changed_documents(self):
+        indicator = Indicator.objects.create(
+            funding_period=3,
+            programme=self.programmes[0],
+            programme_area=self.area,
+            achievement_eea=0,
+            achievement_norway=0,
+            achievement_total=0,
+        )
+        # a new indicator changes the outcomes of its programme and projects
+        self.assertEqual(
+            self.documents({"Indicator": {"created": [indicator.pk]}}),
+            {
+                "News": ([self.news.pk], []),
+                "Programme": (["ROPR0"], []),
+                "Project": (["ROPR0-0001"], []),
+            },
+        )
+        # and so does a deleted one, through the programme it was deleted from
+        self.assertEqual(
+            self.documents(
+                {
+                    "Indicator": {
+                        "deleted": [0],
+                        "deleted_from": {"programme": ["ROPR1"]},
+                    }
+                }
+            ),
+            {"Programme": (["ROPR1"], []), "Project": (["ROPR1-0001"], [])},
+        )
+        self.assertEqual(
+            self.documents(
+                {
+                    "Project": {"updated": ["ROPR0-0001"], "deleted": ["ROPR1-0001"]},
+                    "OrganisationRole": {
+                        "deleted": [0],
+                        "deleted_from": {"organisation": [self.organisation.pk]},
+                    },
+                }
+            ),
+            {
+                "News": ([self.news.pk], []),
+                "Organisation": ([self.organisation.pk], []),
+                "Project": (["ROPR0-0001"], ["ROPR1-0001"]),
+            },
+        )
+        self.assertEqual(
+            self.documents({"ProgrammeArea": {"updated": [self.area.pk]}}),
+            {
+                "News": ([self.news.pk], []),
+                "Organisation": ([self.organisation.pk], []),
+                "Programme": (["ROPR0"], []),
+                "Project": (["ROPR0-0001"], []),
+            },
+        )
+
+    def test_merge_changes(self):
+        self.assertEqual(
+            indexing.merge_changes(
+                [
+                    {"Project": {"created": ["A"], "deleted": ["B"]}},
+                    {
+                        "Project": {"created": ["B"], "deleted": ["A"]},
+                        "BilateralInitiative": {
+                            "deleted": ["BI01"],
+                            "deleted_from": {"project": ["A"]},
+                        },
+                    },
+                ]
+            ),
+            {
+                "Project": {
+                    "created": {"B"},
+                    "updated": set(),
+                    "deleted": {"A"},
+                    "deleted_from": {},
+                },
+                "BilateralInitiative": {
+                    "created": set(),
+                    "updated": set(),
+                    "deleted": {"BI01"},
+                    "deleted_from": {"project": {"A"}},
+                },
+            },
+        )
+
+    @patch.object(CustomES7SearchBackend, "set_schema_fingerprint")
+    @patch.object(CustomES7SearchBackend, "get_schema_fingerprint")
+    @patch.object(CustomES7SearchBackend, "remove_many")
+    @patch.object(CustomES7SearchBackend, "update")
+    def test_index_changes(self, update, remove_many, get_fingerprint, set_fingerprint):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        path = os.path.join(tmp_dir.name, "changes.json")
+        with open(path, "w") as f:
+            json.dump(
+                {
+                    "period": "2014-2021",
+                    "changes": {
+                        "Programme": {"updated": ["ROPR1"]},
+                        "BilateralInitiative": {"deleted": ["BI01"]},
+                    },
+                },
+                f,
+            )
+        # the programme is excluded from the index now
+        Programme.objects.filter(code="ROPR1").update(is_tap=True)
+
+        get_fingerprint.return_value = indexing.schema_fingerprint()
+        with patch.object(IndicesClient, "refresh") as refresh:
+            call_command("index_changes", path, stdout=StringIO())
+        refresh.assert_called_once()
+        self.assertEqual(
+            [
+                (call.args[0].get_model(), call.args[1])
+                for call in update.call_args_list
+            ],
+            [(Project, [Project.objects.get(code="ROPR1-0001")])],
+        )
+        self.assertEqual(
+            sorted(ids for call in remove_many.call_args_list for ids in call.args[0]),
+            ["dv.bilateralinitiative.BI01", "dv.programme.ROPR1"],
+        )
+        set_fingerprint.assert_not_called()
+
+        # a schema change rebuilds the index
+        get_fingerprint.return_value = "stale"
+        with patch("dv.management.commands.index_changes.call_command") as command:
+            call_command("index_changes", path, stdout=StringIO())
+        self.assertEqual(command.call_args.args, ("rebuild_index",))
+        set_fingerprint.assert_called_once_with(indexing.schema_fingerprint())
+
+        # and so does a changeset the import didn't write
+        get_fingerprint.return_value = indexing.schema_fingerprint()
+        open(path, "w").close()
+        for paths in ([path], [path + ".missing"], []):
+            with patch("dv.management.commands.index_changes.call_command") as command:
+                call_command("index_changes", *paths, stdout=StringIO())
+            self.assertEqual(command.call_args.args, ("rebuild_index",))
+        self.assertFalse(BilateralInitiative.objects.exists())
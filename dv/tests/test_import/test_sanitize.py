@@ -0,0 +1,54 @@
+import tempfile
+
+from django.test import SimpleTestCase
+
+from dv.lib.sanitize import Sanitizer
+
+
+class TestSanitizer(SimpleTestCase):
+    def setUp(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.cache_dir = tmp_dir.name
+
+    def sanitize(self, batches, workers=0):
+        columns = ["Summary", "Results"]
+        with Sanitizer(self.cache_dir, workers) as sanitizer:
+            self.statements = []
+            sanitizer.cache.set_trace_callback(self.statements.append)
+            rows = [
+                row
+                for rows in sanitizer.sanitized_batches(batches, columns)
+                for row in rows
+            ]
+        return rows, sanitizer
+
+    def test_sanitized_batches(self):
+        batches = [
+            [{"Summary": "<p>One<script>x</script></p>", "Results": None}],
+            [
+                {"Summary": "<p>Two</p>&lt;!-- note --&gt;", "Results": "<p>3</p>"},
+                {"Summary": "<p>One<script>x</script></p>", "Results": ""},
+            ],
+        ]
+        rows, sanitizer = self.sanitize(batches, workers=2)
+        self.assertEqual(
+            rows,
+            [
+                {"Summary": "Onex", "Results": ""},
+                {"Summary": "Two", "Results": "3"},
+                {"Summary": "Onex", "Results": ""},
+            ],
+        )
+        # the repeated texts are cleaned, and cached, once
+        self.assertEqual(sanitizer.cleaned, 4)
+        self.assertEqual(sanitizer.cached, 0)
+        inserts = [sql for sql in self.statements if sql.startswith("INSERT")]
+        self.assertEqual(len(inserts), 4)
+
+        rows, sanitizer = self.sanitize(
+            [[{"Summary": "<p>3</p>", "Results": "<div>4</div>"}]]
+        )
+        self.assertEqual(rows, [{"Summary": "3", "Results": "4"}])
+        self.assertEqual(sanitizer.cleaned, 1)
+        self.assertEqual(sanitizer.cached, 1)
@@ -0,0 +1,47 @@
+import os
+import sqlite3
+import tempfile
+from contextlib import closing
+
+from django.test import SimpleTestCase
+
+from dv.lib import shadow
+
+
+class TestShadow(SimpleTestCase):
+    def setUp(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.live = os.path.join(tmp_dir.name, "live.sqlite3")
+        self.shadow = f"{self.live}.shadow"
+        self.compact = f"{self.live}.compact"
+        with closing(sqlite3.connect(self.live)) as conn, conn:
+            conn.execute("CREATE TABLE project (code TEXT PRIMARY KEY, name TEXT)")
+            conn.executemany(
+                "INSERT INTO project VALUES (?, ?)",
+                [(f"P{idx}", "x" * 1000) for idx in range(100)],
+            )
+
+    def test_backup_optimize_compact(self):
+        shadow.backup(self.live, self.shadow)
+        with closing(sqlite3.connect(self.shadow)) as conn, conn:
+            conn.execute("DELETE FROM project WHERE code != 'P1'")
+        shadow.optimize(self.shadow)
+        shadow.compact(self.shadow, self.compact)
+
+        counts = shadow.table_counts(self.shadow)
+        self.assertEqual(counts["project"], 1)
+        self.assertIn("sqlite_stat1", counts)
+        self.assertEqual(shadow.verify(self.compact, counts), [])
+        self.assertLess(os.path.getsize(self.compact), os.path.getsize(self.shadow))
+        # the live db is left alone
+        self.assertEqual(shadow.table_counts(self.live), {"project": 100})
+
+    def test_verify(self):
+        self.assertEqual(
+            shadow.verify(self.live, {"project": 99, "news": 1}),
+            [
+                "news has None rows instead of 1",
+                "project has 100 rows instead of 99",
+            ],
+        )
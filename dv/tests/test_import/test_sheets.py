@@ -0,0 +1,77 @@
+import os
+import tempfile
+from unittest.mock import patch
+
+import openpyxl
+from django.test import SimpleTestCase
+from openpyxl.worksheet import _read_only, _reader
+
+from dv.lib.sheets import Sheet, hidden_rows_and_columns
+
+
+class TestSheet(SimpleTestCase):
+    def setUp(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.cache_dir = os.path.join(tmp_dir.name, "cache")
+        self.path = os.path.join(tmp_dir.name, "Programme.xlsx")
+
+        book = openpyxl.Workbook()
+        sheet = book.active
+        sheet.title = "Export"
+        sheet.append(["ProgrammeCode", "Programme", "GrantAmount", "Comment"])
+        sheet.append(["RO01", "Programme", 1000.5, "Hidden comment"])
+        sheet.append(["RO99", "Hidden programme", 1])
+        sheet.append(["RO02", None])
+        sheet.append([])
+        # hidden rows and columns are left out, as with pyexcel
+        sheet.row_dimensions[3].hidden = True
+        sheet.column_dimensions["D"].hidden = True
+        book.save(self.path)
+
+    def test_records(self):
+        messages = []
+        sheet = Sheet(self.path, "Programme", log=messages.append)
+        self.assertEqual(messages, ["Assuming first worksheet of Export."])
+        expected = [
+            {"ProgrammeCode": "RO01", "Programme": "Programme", "GrantAmount": 1000.5},
+            {"ProgrammeCode": "RO02", "Programme": "", "GrantAmount": ""},
+        ]
+        self.assertEqual(list(sheet.records), expected)
+
+    def test_hidden_rows_and_columns(self):
+        # relies on private openpyxl APIs, which may change in other versions
+        self.assertTrue(hasattr(_read_only.ReadOnlyWorksheet, "_get_source"))
+        self.assertTrue(_reader.ROW_TAG and _reader.COL_TAG)
+
+        book = openpyxl.load_workbook(self.path, read_only=True)
+        try:
+            hidden = hidden_rows_and_columns(book.active)
+        finally:
+            book.close()
+        # the same as those of the (fully loaded) worksheet
+        worksheet = openpyxl.load_workbook(self.path).active
+        expected = (
+            {row for row, dim in worksheet.row_dimensions.items() if dim.hidden},
+            {
+                openpyxl.utils.column_index_from_string(column)
+                for column, dim in worksheet.column_dimensions.items()
+                if dim.hidden
+            },
+        )
+        self.assertEqual(hidden, expected)
+        self.assertEqual(hidden, ({3}, {4}))
+
+    def test_cache(self):
+        sheet = Sheet(self.path, "Programme", cache_dir=self.cache_dir)
+        self.assertFalse(sheet.cached)
+        records = list(sheet.records)
+        records[0]["Programme"] = None
+
+        sheet = Sheet(self.path, "Programme", cache_dir=self.cache_dir)
+        self.assertTrue(sheet.cached)
+        with patch("dv.lib.sheets.openpyxl.load_workbook") as load_workbook:
+            cached_records = list(sheet.records)
+        load_workbook.assert_not_called()
+        self.assertEqual(cached_records[0]["Programme"], "Programme")
+        self.assertEqual(len(cached_records), 2)
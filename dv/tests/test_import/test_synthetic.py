@@ -0,0 +1,66 @@
+import json
+import os
+import tempfile
+from io import StringIO
+from unittest.mock import patch
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from dv.lib import synthetic
+from dv.models import NUTS, Organisation, Programme, Project
+
+
+@patch("dv.lib.synthetic.PROJECTS_PER_PROGRAMME", 4)
+@patch("dv.lib.synthetic.INDICATORS_PER_PROGRAMME", 2)
+@patch("dv.lib.synthetic.BILATERAL_INITIATIVES_PER_PROGRAMME", 2)
+class TestSynthetic(TestCase):
+    fixtures = ["initial/state"]
+
+    def setUp(self):
+        NUTS.objects.create(code="RO111", label="Bihor")
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.tmp_dir = tmp_dir.name
+        self.enterContext(
+            override_settings(IMPORT_CACHE_DIR=os.path.join(self.tmp_dir, "cache"))
+        )
+        # the snapshots are covered by their own tests
+        patch("dv.management.commands.import.call_command").start()
+        self.addCleanup(patch.stopall)
+
+    def test_generate(self):
+        first, second = (os.path.join(self.tmp_dir, name) for name in "ab")
+        for directory in (first, second):
+            os.makedirs(directory)
+            generated = synthetic.generate(directory, scale=0.2, seed=1, nuts=["RO111"])
+        self.assertEqual(generated["Programme"][0], 14 + 1 + 14)
+        self.assertEqual(generated["Project"][0], 14 * 4)
+        for name in generated:
+            with open(os.path.join(first, f"{name}.jsonl")) as a:
+                with open(os.path.join(second, f"{name}.jsonl")) as b:
+                    self.assertEqual(a.read(), b.read(), name)
+
+    def test_benchmark_import(self):
+        output = os.path.join(self.tmp_dir, "results.json")
+        call_command(
+            "benchmark_import",
+            scales=[0.2, 0.5],
+            snapshot_dir=self.tmp_dir,
+            skip_index=True,
+            noinput=True,
+            output=output,
+            stdout=StringIO(),
+        )
+        with open(output) as f:
+            results = json.load(f)
+        self.assertEqual([result["scale"] for result in results], [0.2, 0.5])
+        stages = {stats["stage"]: stats for stats in results[-1]["import"]["stages"]}
+        self.assertEqual(stages["Project"]["rows"], Project.objects.count() * 3)
+        self.assertGreater(stages["Project"]["peak_memory"], 0)
+        self.assertGreater(results[-1]["import"]["peak_memory"], 0)
+
+        # the last scale is left in the db
+        self.assertEqual(Programme.objects.count(), 4 * 14 + 1)
+        self.assertEqual(Project.objects.filter(nuts="RO111").count(), 4 * 4)
+        self.assertTrue(Organisation.objects.exists())
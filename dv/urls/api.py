@@ -1,7 +1,7 @@
 from django.conf import settings
 from django.urls import re_path
-from django.views.decorators.cache import cache_page
 
+from dv.lib.cache import cache_api
 from dv.views import api as views
 from dv.views import frontend as front_views
 
@@ -10,50 +10,70 @@ urlpatterns = [
     re_path(r"^test-sentry", views.test_sentry),
     re_path(
         r"^bilateral-initiatives.json",
-        cache_page(settings.API_CACHE_SECONDS)(views.bilateral_initiatives),
+        cache_api(settings.API_CACHE_SECONDS)(views.bilateral_initiatives),
         name="bilateral-initiatives",
     ),
     re_path(
         r"^overview.json",
-        cache_page(settings.API_CACHE_SECONDS)(views.overview),
+        cache_api(settings.API_CACHE_SECONDS)(views.overview),
         name="index",
     ),
     re_path(
         r"^indicators.json",
-        cache_page(settings.API_CACHE_SECONDS)(views.indicators),
+        cache_api(settings.API_CACHE_SECONDS)(views.indicators),
         name="indicators",
     ),
     re_path(
         r"^grants.json",
-        cache_page(settings.API_CACHE_SECONDS)(views.grants),
+        cache_api(settings.API_CACHE_SECONDS)(views.grants),
         name="grants",
     ),
     re_path(
-        r"^sdg.json", cache_page(settings.API_CACHE_SECONDS)(views.sdg), name="goals"
+        r"^sdg.json", cache_api(settings.API_CACHE_SECONDS)(views.sdg), name="goals"
     ),
     re_path(
         r"^projects.json",
-        cache_page(settings.API_CACHE_SECONDS)(views.projects),
+        cache_api(settings.API_CACHE_SECONDS)(views.projects),
         name="projects",
     ),
     re_path(
         r"^partners.json",
-        cache_page(settings.API_CACHE_SECONDS)(views.partners),
+        cache_api(settings.API_CACHE_SECONDS)(views.partners),
         name="partners",
     ),
+    re_path(
+        r"^cube.json",
+        cache_api(settings.API_CACHE_SECONDS)(views.cube),
+        name="cube",
+    ),
+    re_path(
+        r"^grants/beneficiaries.json",
+        cache_api(settings.API_CACHE_SECONDS)(views.beneficiaries_detail),
+        name="grants-beneficiaries-detail",
+    ),
+    re_path(
+        r"^projects/beneficiaries.json",
+        cache_api(settings.API_CACHE_SECONDS)(views.projects_beneficiaries_detail),
+        name="projects-beneficiaries-detail",
+    ),
+    re_path(
+        r"^sdg/beneficiaries.json",
+        cache_api(settings.API_CACHE_SECONDS)(views.sdg_beneficiaries_detail),
+        name="sdg-beneficiaries-detail",
+    ),
     re_path(
         r"^grants/(?P<beneficiary>[A-Z]{2}).json",
-        cache_page(settings.API_CACHE_SECONDS)(views.beneficiary_detail),
+        cache_api(settings.API_CACHE_SECONDS)(views.beneficiary_detail),
         name="grants-beneficiary-detail",
     ),
     re_path(
         r"^projects/(?P<beneficiary>[A-Z]{2}).json",
-        cache_page(settings.API_CACHE_SECONDS)(views.projects_beneficiary_detail),
+        cache_api(settings.API_CACHE_SECONDS)(views.projects_beneficiary_detail),
         name="projects-beneficiary-detail",
     ),
     re_path(
         r"^sdg/(?P<beneficiary>[A-Z]{2}).json",
-        cache_page(settings.API_CACHE_SECONDS)(views.sdg_beneficiary_detail),
+        cache_api(settings.API_CACHE_SECONDS)(views.sdg_beneficiary_detail),
         name="sdg-beneficiary-detail",
     ),
     re_path(
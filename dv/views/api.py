@@ -1,17 +1,18 @@
 import html
-import re
 from collections import defaultdict
 from decimal import Decimal
 from itertools import chain, product
 
 from django.views.decorators.http import require_GET
-from django.db.models import CharField, Q
+from django.db.models import Q
 from django.db.models.expressions import F
 from django.db.models.aggregates import Sum, Count
-from django.db.models.functions import Length
 from rest_framework.generics import ListAPIView
 
-from dv.lib.http import JsonResponse, SetEncoder
+from dv.lib import facts
+from dv.lib.http import JsonResponse, SetEncoder, is_columnar, to_columns
+from dv.lib.nuts import NutsIndex, aggregate_by_nuts
+from dv.lib.snapshots import snapshot
 from dv.lib.utils import (
     DONOR_STATES,
     EEA_DONOR_STATES,
@@ -22,25 +23,22 @@ from dv.lib.utils import (
     FM_REVERSED_DICT,
     FM_EEA,
     FM_NORWAY,
-    NUTS_VERSION_BY_PERIOD,
 )
 from dv.models import (
     Allocation,
     BilateralInitiative,
     Indicator,
     News,
-    NUTS,
     OrganisationRole,
     Programme,
     ProgrammeAllocation,
+    ProgrammeArea,
     Project,
     ProjectAllocation,
     State,
 )
 from dv.serializers import ProjectSerializer
 
-CharField.register_lookup(Length, "length")
-
 # Used to determine the `is_ta` flag.
 TA_CODES = frozenset(
     {
@@ -57,6 +55,42 @@ TA_CODES = frozenset(
 )
 
 
+def _m2m_ids(m2m, **filters):
+    """
+    Returns a dict of object id -> list of related ids for a many-to-many
+    field (e.g. `Programme.states`), using a single query on its through
+    table. `filters` apply to the through model.
+    """
+    field = m2m.field
+    source = field.m2m_field_name()
+    target = field.m2m_reverse_field_name()
+
+    related = defaultdict(list)
+    for source_id, target_id in field.remote_field.through.objects.filter(
+        **filters
+    ).values_list(f"{source}_id", f"{target}_id"):
+        related[source_id].append(target_id)
+    return related
+
+
+def _is_normalized(request):
+    """
+    Whether the response should use the normalized format, where entities
+    shared by many rows (programmes, organisations, news) are emitted once
+    in lookup tables keyed by id, and the rows only reference them.
+    """
+    return request.GET.get("format") == "normalized"
+
+
+def _tabular_response(request, rows):
+    """
+    Returns a list of rows, in the columnar layout if requested.
+    """
+    if is_columnar(request):
+        rows = to_columns(rows)
+    return JsonResponse(rows)
+
+
 def test_sentry(request):
     raise Exception("Testing sentry...")
 
@@ -80,6 +114,7 @@ def bilateral_initiatives(request):
 
 
 @require_GET
+@snapshot("overview")
 def overview(request):
     period = request.GET.get("period", DEFAULT_PERIOD)  # used in FE
     period_id = FUNDING_PERIODS_DICT[period]  # used in queries
@@ -128,38 +163,29 @@ def overview(request):
             )
         }
 
-    programme_query = (
-        Programme.objects.filter(
-            funding_period=period_id,
-            is_tap=False,
-            is_bfp=False,
-        )
-        .prefetch_related(
-            "states",
-        )
-        .order_by("code")
+    programme_query = Programme.objects.filter(
+        funding_period=period_id,
+        is_tap=False,
+        is_bfp=False,
+    ).order_by("code")
+    programme_states = _m2m_ids(Programme.states, programme__in=programme_query)
+    dpp_programme_codes = set(
+        programme_query.filter(
+            organisation_roles__role_code="DPP",
+        ).values_list("code", flat=True)
     )
 
     programmes = defaultdict(list)
+    dpp_programmes = defaultdict(list)
     for programme in programme_query:
         keys = product(
             programme.financial_mechanisms,
-            programme.states.values_list("code", flat=True),
+            programme_states[programme.code],
         )
         for key in keys:
             programmes[key].append(programme.code)
-
-    dpp_programme_query = programme_query.filter(
-        organisation_roles__role_code="DPP",
-    ).distinct()
-    dpp_programmes = defaultdict(list)
-    for programme in dpp_programme_query:
-        keys = product(
-            programme.financial_mechanisms,
-            programme.states.values_list("code", flat=True),
-        )
-        for key in keys:
-            dpp_programmes[key].append(programme.code)
+            if programme.code in dpp_programme_codes:
+                dpp_programmes[key].append(programme.code)
 
     project_query = (
         Project.objects.filter(
@@ -245,11 +271,13 @@ def overview(request):
 
 
 @require_GET
+@snapshot("indicators")
 def indicators(request):
     period = request.GET.get("period", DEFAULT_PERIOD)  # used in FE
     period_id = FUNDING_PERIODS_DICT[period]  # used in queries
 
-    return JsonResponse(
+    return _tabular_response(
+        request,
         list(
             Indicator.objects.filter(
                 funding_period=period_id,
@@ -274,11 +302,12 @@ def indicators(request):
                 achievement_total=Sum("achievement_total"),
             )
             .order_by(F("order").asc(nulls_last=True), F("beneficiary"))
-        )
+        ),
     )
 
 
 @require_GET
+@snapshot("grants")
 def grants(request):
     period = request.GET.get("period", DEFAULT_PERIOD)  # used in FE
     period_id = FUNDING_PERIODS_DICT[period]  # used in queries
@@ -336,24 +365,19 @@ def grants(request):
         }
 
     programmes = defaultdict(dict)
-    programme_query = (
-        Programme.objects.filter(
-            funding_period=period_id,
-            is_tap=False,
-            is_bfp=False,
-        )
-        .prefetch_related(
-            "states",
-            "programme_areas",
-        )
-        .order_by("code")
-    )
+    programme_query = Programme.objects.filter(
+        funding_period=period_id,
+        is_tap=False,
+        is_bfp=False,
+    ).order_by("code")
+    programme_states = _m2m_ids(Programme.states, programme__in=programme_query)
+    programme_areas = _m2m_ids(Programme.programme_areas, programme__in=programme_query)
 
     for programme in programme_query:
         keys = product(
             programme.financial_mechanisms,
-            programme.states.values_list("code", flat=True),
-            programme.programme_areas.values_list("id", flat=True),
+            programme_states[programme.code],
+            programme_areas[programme.code],
         )
         for key in keys:
             programmes[key][programme.code] = {
@@ -384,10 +408,11 @@ def grants(request):
             }
         )
 
-    return JsonResponse(out)
+    return _tabular_response(request, out)
 
 
 @require_GET
+@snapshot("sdg")
 def sdg(request):
     period = request.GET.get("period", DEFAULT_PERIOD)  # used in FE
     period_id = FUNDING_PERIODS_DICT[period]  # used in queries
@@ -448,9 +473,11 @@ def sdg(request):
 
 
 @require_GET
+@snapshot("projects")
 def projects(request):
     period = request.GET.get("period", DEFAULT_PERIOD)  # used in FE
     period_id = FUNDING_PERIODS_DICT[period]  # used in queries
+    normalized = _is_normalized(request)
 
     allocations = (
         Allocation.objects.filter(
@@ -475,6 +502,7 @@ def projects(request):
     )
 
     programmes = defaultdict(lambda: defaultdict(set))
+    programme_table = {}
     projects = defaultdict(set)
     project_allocations = defaultdict(int)
     for pja in project_allocation_query:
@@ -485,9 +513,12 @@ def projects(request):
 
         programme = project.programme
         if not programmes[key][programme.code]:
-            programmes[key][programme.code] = {
+            info = programme_table[programme.code] = {
                 "name": programme.name,
                 "url": programme.url,
+            }
+            programmes[key][programme.code] = {
+                **({} if normalized else info),
                 "nuts": defaultdict(lambda: defaultdict(set)),
             }
         programme_nuts = programmes[key][programme.code]["nuts"][project.nuts_id]
@@ -502,45 +533,68 @@ def projects(request):
             Q(project__funding_period=period_id)
             | Q(programmes__funding_period=period_id),
         )
-        .prefetch_related(
+        .select_related(
             "project",
-            "project__programme_areas",
-            "programmes",
-            "programmes__states",
-            "programmes__programme_areas",
+        )
+        .defer(
+            "project__initial_description",
+            "project__results_description",
         )
         .order_by("-created")
     )
+    news_ids = news_query.values("pk")
+    news_programmes = _m2m_ids(News.programmes, news__in=news_ids)
+    news_programme_query = Programme.objects.filter(news__in=news_ids).distinct()
+    news_programme_objs = {
+        programme.code: programme
+        for programme in news_programme_query.only(
+            "code", "allocation_eea", "allocation_norway"
+        )
+    }
+    programme_states = _m2m_ids(
+        Programme.states, programme__in=news_programme_query.values("code")
+    )
+    programme_areas = _m2m_ids(
+        Programme.programme_areas, programme__in=news_programme_query.values("code")
+    )
+    project_areas = _m2m_ids(
+        Project.programme_areas, project__in=news_query.values("project_id")
+    )
+
     news = defaultdict(list)
+    news_table = {}
     for item in news_query:
+        news_table[item.pk] = {
+            "title": html.unescape(item.title or ""),
+            "link": item.link,
+            "created": item.created,
+            "summary": item.summary,
+            "image": item.image,
+            "nuts": item.project and item.project.nuts_id,
+        }
         if item.project:
             keys = product(
                 item.project.financial_mechanisms,
                 (item.project.state_id,),
-                item.project.programme_areas.values_list("id", flat=True),
+                project_areas[item.project_id],
             )
         else:
             keys = chain(
                 *[
                     product(
                         programme.financial_mechanisms,
-                        programme.states.values_list("code", flat=True),
-                        programme.programme_areas.values_list("id", flat=True),
+                        programme_states[programme.code],
+                        programme_areas[programme.code],
+                    )
+                    for programme in map(
+                        news_programme_objs.get, news_programmes[item.pk]
                     )
-                    for programme in item.programmes.all()
                 ]
             )
+        # the same news item is shared by all its keys
+        ref = item.pk if normalized else news_table[item.pk]
         for key in keys:
-            news[key].append(
-                {
-                    "title": html.unescape(item.title or ""),
-                    "link": item.link,
-                    "created": item.created,
-                    "summary": item.summary,
-                    "image": item.image,
-                    "nuts": item.project and item.project.nuts_id,
-                }
-            )
+            news[key].append(ref)
 
     out = []
     for allocation in allocations:
@@ -565,13 +619,32 @@ def projects(request):
                 "thematic": allocation.thematic,
             }
         )
+    if normalized:
+        out = {
+            "rows": out,
+            "programmes": programme_table,
+            "news": news_table,
+        }
     return JsonResponse(out, encoder=SetEncoder)
 
 
+def _nuts_donor(nuts):
+    """
+    Returns the donor a project partner located in `nuts` is counted
+    under (see `DONOR_STATES`), or None for unknown locations.
+    """
+    if not nuts:
+        return None
+    prefix = nuts[:2]
+    return prefix if prefix in DONOR_STATES_REVERSED else "Intl"
+
+
 @require_GET
+@snapshot("partners")
 def partners(request):
     period = request.GET.get("period", DEFAULT_PERIOD)  # used in FE
     period_id = FUNDING_PERIODS_DICT[period]  # used in queries
+    normalized = _is_normalized(request)
 
     # List of programmes having DPP or dpp
     # Everything else will be grouped by these
@@ -580,11 +653,17 @@ def partners(request):
             funding_period=period_id,
             programme__organisation_roles__role_code__in=("DPP", "PJDPP"),
         )
-        .select_related(
-            "programme_area",
-            "priority_sector",
-            "programme",
+        .values(
+            "id",
+            "programme_id",
+            "programme_area__code",
+            "programme_area__name",
+            "priority_sector__name",
+            "financial_mechanism",
+            "state_id",
+            "allocation",
         )
+        .order_by("id")
         .distinct()
     )
 
@@ -592,34 +671,42 @@ def partners(request):
     # Compute allocations per Programme and Programme area
     allocations = defaultdict(int)
     for p in partnership_programmes_query:
-        if p.programme.code not in partnership_programmes:
-            partnership_programmes[p.programme.code] = {
-                "name": p.programme.name,
-                "url": p.programme.url,
+        code = p["programme_id"]
+        try:
+            programme = partnership_programmes[code]
+        except KeyError:
+            programme = partnership_programmes[code] = {
                 "areas": {},
                 "beneficiaries": set(),
                 "donors": set(),
-                "DPP": {},
                 "PO": {},
                 "news": [],
                 "allocation": 0,
             }
-        partnership_programmes[p.programme.code]["allocation"] += p.allocation
-        partnership_programmes[p.programme.code]["beneficiaries"].add(p.state_id)
-        if p.programme_area:
-            partnership_programmes[p.programme.code]["areas"][p.programme_area.code] = {
-                "area": p.programme_area.name,
-                "sector": p.priority_sector.name,
-                "fm": FM_DICT[p.financial_mechanism],
+        programme["allocation"] += p["allocation"]
+        programme["beneficiaries"].add(p["state_id"])
+        area_code = p["programme_area__code"]
+        if area_code:
+            programme["areas"][area_code] = {
+                "area": p["programme_area__name"],
+                "sector": p["priority_sector__name"],
+                "fm": FM_DICT[p["financial_mechanism"]],
             }
-        key = (
-            p.programme.code,
-            p.programme_area.code if p.programme_area else None,
-            p.state_id,
-        )
-        allocations[key] += p.allocation
-
-    partnership_programmes_ids = partnership_programmes.keys()
+        allocations[(code, area_code, p["state_id"])] += p["allocation"]
+
+    partnership_programmes_ids = list(partnership_programmes)
+    for code, programme in (
+        Programme.objects.only("code", "name", "funding_period", "is_tap")
+        .in_bulk(partnership_programmes_ids)
+        .items()
+    ):
+        # same for all the rows of a programme
+        partnership_programmes[code]["programmes"] = {
+            code: {
+                "name": programme.name,
+                "url": programme.url,
+            }
+        }
 
     # Get donor countries for each programme
     programme_donors_query = (
@@ -638,9 +725,10 @@ def partners(request):
     )
 
     for p in programme_donors_query:
-        partnership_programmes[p["programme_id"]]["donors"].add(
-            DONOR_STATES.get(p["organisation__country"], "Intl")
-        )
+        if p["programme_id"] in partnership_programmes:
+            partnership_programmes[p["programme_id"]]["donors"].add(
+                DONOR_STATES.get(p["organisation__country"], "Intl")
+            )
 
     # Get programme partners (DPP and PO)
     programme_partners_query = (
@@ -689,24 +777,21 @@ def partners(request):
             }
 
     # Get project partners (dpp and project promoters)
-    project_partners_query = (
-        OrganisationRole.objects.filter(
-            funding_period=period_id,
-            programme_id__in=partnership_programmes_ids,
-            role_code__in=("PJDPP", "PJPT"),
-            project__isnull=False,
-        )
-        .select_related(
-            "project",
-            "organisation",
-        )
-        .prefetch_related(
-            "project__programme_areas",
-        )
-        .order_by("role_code")
-        .distinct()
+    project_partners_query = OrganisationRole.objects.filter(
+        funding_period=period_id,
+        programme_id__in=partnership_programmes_ids,
+        role_code__in=("PJDPP", "PJPT"),
+        project__isnull=False,
+    )
+    area_codes = dict(
+        ProgrammeArea.objects.filter(funding_period=period_id).values_list("id", "code")
+    )
+    project_areas = _m2m_ids(
+        Project.programme_areas,
+        project__in=project_partners_query.filter(role_code="PJDPP").values(
+            "project_id"
+        ),
     )
-    # Order by - for filtering out project promoters when no PJDPP is present
 
     projects, project_promoters, donor_project_partners = (
         defaultdict(dict),
@@ -714,64 +799,99 @@ def partners(request):
         defaultdict(dict),
     )
     donor_projects = set()
-    project_nuts = {}
+    # project -> donor -> NUTS of its donor project partners from that donor,
+    # and project -> NUTS of its project promoters. Dicts are used as
+    # ordered sets.
+    project_src_nuts = defaultdict(lambda: defaultdict(dict))
+    project_dst_nuts = defaultdict(dict)
+    nuts_donors = {}
 
-    for org_role in project_partners_query:
+    # Order by - for filtering out project promoters when no PJDPP is present
+    for org_role in project_partners_query.values(
+        "role_code",
+        "project_id",
+        "programme_id",
+        "organisation_id",
+        "organisation__name",
+        "organisation__nuts_id",
+        "organisation__country",
+        "project__state_id",
+        "project__is_dpp",
+        "project__has_ended",
+        "project__is_continued_coop",
+        "project__is_improved_knowledge",
+    ).order_by("role_code"):
         # Projects have only one BS and one PA, so keep them separated
-        project_code = org_role.project_id
+        project_code = org_role["project_id"]
+        org_id = org_role["organisation_id"]
+        nuts = org_role["organisation__nuts_id"]
 
-        if org_role.role_code == "PJPT":
+        if org_role["role_code"] == "PJPT":
             # Project promoters are stored by project, only for projects with dpp
             if project_code in donor_projects:
-                project_promoters[project_code][org_role.organisation_id] = {
-                    "name": org_role.organisation.name,
-                    "nuts": org_role.organisation.nuts_id,
+                project_promoters[project_code][org_id] = {
+                    "name": org_role["organisation__name"],
+                    "nuts": nuts,
+                }
+                project_dst_nuts[project_code][nuts] = None
+            continue
+
+        donor_projects.add(project_code)
+        areas = project_areas.get(project_code)
+        if not areas:
+            continue
+
+        try:
+            nuts_donor = nuts_donors[nuts]
+        except KeyError:
+            nuts_donor = nuts_donors[nuts] = _nuts_donor(nuts)
+        if nuts_donor:
+            project_src_nuts[project_code][nuts_donor][nuts] = None
+
+        # Donor project partner
+        donor = DONOR_STATES.get(org_role["organisation__country"], "Intl")
+        for area_id in areas:
+            key = (
+                org_role["programme_id"],
+                area_codes[area_id],
+                org_role["project__state_id"],
+                donor,
+            )
+            partner = donor_project_partners[key].get(org_id)
+            if partner is None:
+                partner = donor_project_partners[key][org_id] = {
+                    "name": org_role["organisation__name"],
+                    "nuts": nuts,
+                    "projects": [],
+                    # project_count should be enough, trying to save 90KB
+                    "prj": 0,
+                }
+            partner["prj"] += 1
+            partner["projects"].append(project_code)
+            # projects with dpp are stored for bilateral indicators
+            if project_code not in projects[key]:
+                projects[key][project_code] = {
+                    "org_id": org_id,
+                    "is_dpp": org_role["project__is_dpp"],
+                    "has_ended": org_role["project__has_ended"],
+                    "continued_coop": org_role["project__is_continued_coop"],
+                    "improved_knowledge": org_role["project__is_improved_knowledge"],
+                    "src_nuts": [],
+                    "dst_nuts": [],
                 }
-                project_nuts[project_code]["dst"].append(org_role.organisation.nuts_id)
-        elif org_role.role_code == "PJDPP":
-            donor_projects.add(project_code)
-
-            # Donor project partner
-            donor = DONOR_STATES.get(org_role.organisation.country, "Intl")
-            for programme_area in org_role.project.programme_areas.all():
-                key = (
-                    org_role.programme_id,
-                    programme_area.code,
-                    org_role.project.state_id,
-                    donor,
-                )
-                if org_role.organisation_id not in donor_project_partners[key]:
-                    donor_project_partners[key][org_role.organisation_id] = {
-                        "name": org_role.organisation.name,
-                        "nuts": org_role.organisation.nuts_id,
-                        "projects": [],
-                        # project_count should be enough, trying to save 90KB
-                        "prj": 0,
-                    }
-                # donor_project_partners[key][pp['organisation_id']]['projects'].append(pp['project_id'])
-                donor_project_partners[key][org_role.organisation_id]["prj"] += 1
-                donor_project_partners[key][org_role.organisation_id][
-                    "projects"
-                ].append(project_code)
-                # projects with dpp are stored for bilateral indicators
-                if project_code not in projects[key]:
-                    projects[key][project_code] = {
-                        "org_id": org_role.organisation_id,
-                        "is_dpp": org_role.project.is_dpp,
-                        "has_ended": org_role.project.has_ended,
-                        "continued_coop": org_role.project.is_continued_coop,
-                        "improved_knowledge": org_role.project.is_improved_knowledge,
-                        "src_nuts": [],
-                        "dst_nuts": [],
-                    }
-                if project_code not in project_nuts:
-                    project_nuts[project_code] = {
-                        "src": [],
-                        "dst": [],
-                    }
-                project_nuts[project_code]["src"].append(org_role.organisation.nuts_id)
 
     # Bilateral news, they are always related to programmes, not projects
+    news_fields = [
+        "code",
+        "news__link",
+        "news__summary",
+        "news__image",
+        "news__title",
+        "news__created",
+        "news__is_partnership",
+    ]
+    if normalized:
+        news_fields.append("news__id")
     news_query = (
         Programme.objects.filter(
             funding_period=period_id,
@@ -779,69 +899,60 @@ def partners(request):
             code__in=partnership_programmes_ids,
             news__isnull=False,
         )
-        .values(
-            "code",
-            "news__link",
-            "news__summary",
-            "news__image",
-            "news__title",
-            "news__created",
-            "news__is_partnership",
-        )
+        .values(*news_fields)
         .distinct()
     )
+    news_table = {}
     for item in news_query:
-        partnership_programmes[item["code"]]["news"].append(
-            {
-                "title": html.unescape(item["news__title"] or ""),
-                "link": item["news__link"],
-                "created": item["news__created"],
-                "summary": item["news__summary"],
-                "image": item["news__image"],
-            }
-        )
-
-    def nuts_in_state(nuts, state_id):
-        if not nuts:
-            return
-        if state_id == "Intl":
-            return not re.match("IS|LI|NO", nuts)
-        return nuts.startswith(state_id)
+        news_item = {
+            "title": html.unescape(item["news__title"] or ""),
+            "link": item["news__link"],
+            "created": item["news__created"],
+            "summary": item["news__summary"],
+            "image": item["news__image"],
+        }
+        if normalized:
+            news_table[item["news__id"]] = news_item
+            news_item = item["news__id"]
+        partnership_programmes[item["code"]]["news"].append(news_item)
 
     out = []
+    organisations = {}
     for prg, item in partnership_programmes.items():
         # item: {'beneficiaries', 'news', 'areas', 'PO', 'donors', 'allocation'}
+        split_allocation = len(item["beneficiaries"]) > 1 or len(item["areas"]) > 1
         for pa_code, pa_data in item["areas"].items():
             # pa_data = {'fm', 'sector', 'area'}
             for donor in item["donors"]:
+                dpps = donor_programme_partners.get((prg, donor))
                 for beneficiary in item["beneficiaries"]:
                     key = (prg, pa_code, beneficiary)
                     key_donor = (prg, pa_code, beneficiary, donor)
+                    pjdpps = donor_project_partners.get(key_donor, {})
+                    if not dpps and not pjdpps:
+                        # would be dropped below anyway
+                        continue
+
                     # TODO Because of HU12 must get the amounts from Programme where possible
                     allocation = item["allocation"]
-                    if len(item["beneficiaries"]) > 1 or len(item["areas"]) > 1:
+                    if split_allocation:
                         allocation = allocations[key]
+                    key_projects = projects.get(key_donor, {})
                     prj_promoters = {}
                     nuts_connections = {}
-                    for prj_code in projects[key_donor]:
-                        for key, value in project_promoters[prj_code].items():
-                            prj_promoters[key] = value
-                        for src in project_nuts[prj_code]["src"]:
-                            if not nuts_in_state(src, donor):
-                                continue
-                            for dst in project_nuts[prj_code]["dst"]:
-                                nuts_connections[(src, dst)] = {
-                                    "src": src,
-                                    "dst": dst,
-                                }
-                                if src not in projects[key_donor][prj_code]["src_nuts"]:
-                                    projects[key_donor][prj_code]["src_nuts"].append(
-                                        src
-                                    )
-                                if dst not in projects[key_donor][prj_code]["dst_nuts"]:
-                                    projects[key_donor][prj_code]["dst_nuts"].append(
-                                        dst
-                                    )
+                    for prj_code, project in key_projects.items():
+                        prj_promoters.update(project_promoters.get(prj_code, ()))
+                        src_nuts = project_src_nuts[prj_code].get(donor)
+                        dst_nuts = project_dst_nuts.get(prj_code)
+                        if not src_nuts or not dst_nuts:
+                            continue
+                        project["src_nuts"] = list(src_nuts)
+                        project["dst_nuts"] = list(dst_nuts)
+                        for src, dst in product(src_nuts, dst_nuts):
+                            nuts_connections[(src, dst)] = {
+                                "src": src,
+                                "dst": dst,
+                            }
                     row = {
                         "fm": pa_data["fm"],
                         "sector": pa_data["sector"],
@@ -850,257 +961,296 @@ def partners(request):
                         "donor": donor,
                         "allocation": float(allocation),
                         "programme": prg,
-                        "programmes": {
-                            prg: {
-                                "name": item["name"],
-                                "url": item["url"],
-                            }
-                        },
-                        "projects": projects[key_donor],
-                        "prj_nuts": list(nuts_connections.values()),
-                        "PO": item["PO"],
-                        "PJDPP": donor_project_partners[key_donor],
-                        "PJPT": prj_promoters,
-                        "news": item["news"],
                     }
-                    if donor_programme_partners[(prg, donor)]:
+                    if normalized:
+                        # Organisations are referenced by id, and the row
+                        # isn't duplicated for each DPP
+                        for role_partners in (dpps or {}, pjdpps, prj_promoters):
+                            for org_id, org in role_partners.items():
+                                organisations[org_id] = {
+                                    "name": org["name"],
+                                    "nuts": org["nuts"],
+                                }
+                        row.update(
+                            {
+                                "projects": key_projects,
+                                "prj_nuts": list(nuts_connections.values()),
+                                "DPP": list(dpps or ()),
+                                "PJDPP": {
+                                    org_id: partner["projects"]
+                                    for org_id, partner in pjdpps.items()
+                                },
+                                "PJPT": list(prj_promoters),
+                            }
+                        )
+                        out.append(row)
+                        continue
+
+                    row.update(
+                        {
+                            "programmes": item["programmes"],
+                            "projects": key_projects,
+                            "prj_nuts": list(nuts_connections.values()),
+                            "PO": item["PO"],
+                            "PJDPP": pjdpps,
+                            "PJPT": prj_promoters,
+                            "news": item["news"],
+                        }
+                    )
+                    if dpps:
                         # This project has DPP, duplicate it for each partner from the current donor
-                        for DPP_code, DPP_data in donor_programme_partners[
-                            (prg, donor)
-                        ].items():
-                            copy = dict(row)
-                            # Assumption: name of DPP are unique
-                            copy["DPP"] = DPP_data["name"]
-                            copy["DPP_nuts"] = DPP_data["nuts"]
-                            out.append(copy)
+                        # Assumption: name of DPP are unique
+                        out.extend(
+                            {**row, "DPP": dpp["name"], "DPP_nuts": dpp["nuts"]}
+                            for dpp in dpps.values()
+                        )
                     else:
-                        # Still need to add rows without DPP if they have project partners
-                        if row["PJDPP"]:
-                            if "PO" in row:
-                                del row[
-                                    "PO"
-                                ]  # Apparently we only need PO's for DPP programmes
-                            out.append(row)
+                        # Still need to add rows without DPP if they have project partners.
+                        # Apparently we only need PO's for DPP programmes
+                        del row["PO"]
+                        out.append(row)
+
+    if normalized:
+        programmes = {}
+        for prg, item in partnership_programmes.items():
+            organisations.update(item["PO"])
+            programmes[prg] = {
+                **item["programmes"][prg],
+                # only relevant for the rows having a DPP
+                "PO": list(item["PO"]),
+                "news": item["news"],
+            }
+        out = {
+            "rows": out,
+            "programmes": programmes,
+            "organisations": organisations,
+            "news": news_table,
+        }
     return JsonResponse(out)
 
 
+@require_GET
+def cube(request):
+    """
+    Sums the allocation facts by the dimensions in `by` (comma separated),
+    e.g. `?by=beneficiary,area&fm=EEA Grants&sector=GR`. Any dimension can be
+    filtered by a comma separated list of values; the period defaults to the
+    current one, like in the other views.
+    """
+    dimensions = [name for name in request.GET.get("by", "").split(",") if name]
+    filters = {
+        name: request.GET[name].split(",")
+        for name in facts.DIMENSIONS
+        if name in request.GET
+    }
+    filters.setdefault("period", [DEFAULT_PERIOD])
+    try:
+        rows = facts.cube(dimensions, filters)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    return _tabular_response(request, rows)
+
+
+@snapshot("grants/{beneficiary}")
 def beneficiary_detail(request, beneficiary):
     return project_nuts(request, beneficiary, force_nuts3=True)
 
 
+@snapshot("projects/{beneficiary}")
 def projects_beneficiary_detail(request, beneficiary):
     return project_nuts(request, beneficiary, force_nuts3=False)
 
 
+@snapshot("sdg/{beneficiary}")
 def sdg_beneficiary_detail(request, beneficiary):
-    # TODO This is very similar to project_nuts; refactor to reduce code duplication
-    period = request.GET.get("period", DEFAULT_PERIOD)  # used in FE
-    period_id = FUNDING_PERIODS_DICT[period]  # used in queries
-    state_id = beneficiary
+    return _beneficiary_detail(request, beneficiary, _sdg_nuts_rows)
 
-    try:
-        state = State.objects.get(pk=state_id)
-    except State.DoesNotExist:
-        return JsonResponse(
-            {"error": f"Beneficiary state '{state_id}' does not exist."}, status=404
-        )
 
-    project_allocation_query = ProjectAllocation.objects.filter(
-        funding_period=period_id,
-        state=state,
-    ).select_related(
-        "project",
-    )
+@require_GET
+@snapshot("grants/beneficiaries", nuts=True)
+def beneficiaries_detail(request):
+    """
+    Batched variant of `beneficiary_detail`, for all the beneficiary states
+    or those given in the comma-separated `beneficiary` parameter.
+    """
+    return _beneficiaries_detail(request, _project_nuts_rows, force_nuts3=True)
 
-    nuts3s = tuple(
-        NUTS.objects.filter(nuts_versions__year=NUTS_VERSION_BY_PERIOD[period])
-        .filter(code__startswith=state_id, code__length=5)
-        .exclude(code__endswith="Z")  # skip extra-regio
-        .order_by("code")
-        .values_list("code", flat=True)
-    )
 
-    dataset = defaultdict(
-        lambda: {
-            "allocation": 0,
-            "programmes": {},
-            "areas": set(),
-            "sectors": set(),
-        }
-    )
+@require_GET
+@snapshot("projects/beneficiaries", nuts=True)
+def projects_beneficiaries_detail(request):
+    """Batched variant of `projects_beneficiary_detail`."""
+    return _beneficiaries_detail(request, _project_nuts_rows, force_nuts3=False)
 
-    for pa in project_allocation_query:
-        code = pa.project.nuts_id
-        if len(code) > 2 and code.endswith("Z"):  # extra-regio
-            code = code[:2]
 
-        key = (
-            pa.project.nuts_id,
-            pa.financial_mechanism,
-            pa.project.sdg_no,
-        )
-        if len(code) == 5:
-            row = dataset[key]
-            row["id"] = pa.project.nuts_id
-            row["areas"].add(pa.programme_area_id)
-            row["sectors"].add(pa.priority_sector_id)
-            row["fm"] = FM_DICT[pa.financial_mechanism]
-            row["allocation"] += pa.allocation
-            row["programmes"][pa.project.programme_id] = pa.project.programme_id
-            row["sdg_no"] = pa.project.sdg_no
-            continue
+@require_GET
+@snapshot("sdg/beneficiaries", nuts=True)
+def sdg_beneficiaries_detail(request):
+    """Batched variant of `sdg_beneficiary_detail`."""
+    return _beneficiaries_detail(request, _sdg_nuts_rows)
 
-        # else split allocation among children, and add project count to all children
-        children = (
-            nuts3s if len(code) == 2 else [n for n in nuts3s if n.startswith(code)]
-        )
 
-        if len(children) == 0:
-            # TODO: this is an error. log it, etc.
-            continue
+def project_nuts(request, state_id, force_nuts3):
+    """
+    Returns NUTS3-level allocations for the given state.
+    """
+    return _beneficiary_detail(
+        request, state_id, _project_nuts_rows, force_nuts3=force_nuts3
+    )
 
-        allocation = pa.allocation / len(children)
 
-        for nuts in children:
-            childkey = (
-                nuts,
-                pa.financial_mechanism,
-                pa.project.sdg_no,
-            )
-            row = dataset[childkey]
-            row["id"] = nuts
-            row["areas"].add(pa.programme_area_id)
-            row["sectors"].add(pa.priority_sector_id)
-            row["fm"] = FM_DICT[pa.financial_mechanism]
-            row["allocation"] += allocation
-            row["programmes"][pa.project.programme_id] = pa.project.programme_id
-            row["sdg_no"] = pa.project.sdg_no
+def _beneficiary_detail(request, state_id, get_rows, **kwargs):
+    period = request.GET.get("period", DEFAULT_PERIOD)  # used in FE
 
-    out = []
+    try:
+        dataset = _nuts_dataset(request, period, [state_id], get_rows, **kwargs)
+    except State.DoesNotExist as e:
+        return JsonResponse({"error": str(e)}, status=404)
+    return _tabular_response(request, dataset.get(state_id, []))
 
-    for key, row in dataset.items():
-        # strip away some of that crazy precision
-        row["allocation"] = row["allocation"].quantize(Decimal("1.00"))
-        row["areas"] = list(row["areas"])
-        row["sectors"] = list(row["sectors"])
-        out.append(row)
 
-    return JsonResponse(out)
+def _beneficiaries_detail(request, get_rows, **kwargs):
+    period = request.GET.get("period", DEFAULT_PERIOD)  # used in FE
+    beneficiaries = request.GET.get("beneficiary")
+    if beneficiaries:
+        beneficiaries = [b.strip() for b in beneficiaries.split(",") if b.strip()]
 
+    try:
+        dataset = _nuts_dataset(
+            request, period, beneficiaries or None, get_rows, **kwargs
+        )
+    except State.DoesNotExist as e:
+        return JsonResponse({"error": str(e)}, status=404)
+    if beneficiaries:
+        dataset = {state_id: dataset.get(state_id, []) for state_id in beneficiaries}
+    if is_columnar(request):
+        dataset = {state_id: to_columns(rows) for state_id, rows in dataset.items()}
+    return JsonResponse(dataset)
 
-def project_nuts(request, state_id, force_nuts3):
+
+def _nuts_dataset(request, period, state_ids, get_rows, **kwargs):
     """
-    Returns NUTS3-level allocations for the given state.
+    Scans the project allocations of the given beneficiary states (or all
+    of them) once, and returns a dict of state -> rows computed by `get_rows`.
     """
-
-    period = request.GET.get("period", DEFAULT_PERIOD)  # used in FE
     period_id = FUNDING_PERIODS_DICT[period]  # used in queries
 
-    try:
-        state = State.objects.get(pk=state_id)
-    except State.DoesNotExist:
-        return JsonResponse(
-            {"error": f"Beneficiary state '{state_id}' does not exist."}, status=404
+    project_allocation_query = (
+        ProjectAllocation.objects.filter(
+            funding_period=period_id,
+        )
+        .select_related(
+            "project",
+            "programme_area",
+            "priority_sector",
+        )
+        .defer(
+            "project__initial_description",
+            "project__results_description",
+            "programme_area__objective",
         )
-
-    project_allocation_query = ProjectAllocation.objects.filter(
-        funding_period=period_id,
-        state=state,
-    ).select_related(
-        "project",
-        "programme_area",
-        "priority_sector",
     )
 
-    # split all non-level3 allocation among level3s, but
-    #
-    # NOTE: "In every country at every NUTS level the “Extra-Regio” regions
-    # have been designated (coded by adding to a two-letter country code
-    # the letter Z at NUTS level 1, letters ZZ at NUTS level 2 and letters
-    # ZZZ at NUTS level 3)."
-    #
-    # (we'll pretend the Zs are root)
-
-    nuts3s = tuple(
-        NUTS.objects.filter(nuts_versions__year=NUTS_VERSION_BY_PERIOD[period])
-        .filter(code__startswith=state_id, code__length=5)
-        .exclude(code__endswith="Z")  # skip extra-regio
-        .order_by("code")
-        .values_list("code", flat=True)
-    )
+    if state_ids is not None:
+        existing = set(
+            State.objects.filter(pk__in=state_ids).values_list("pk", flat=True)
+        )
+        for state_id in state_ids:
+            if state_id not in existing:
+                raise State.DoesNotExist(
+                    f"Beneficiary state '{state_id}' does not exist."
+                )
+        project_allocation_query = project_allocation_query.filter(
+            state_id__in=state_ids
+        )
 
-    dataset = defaultdict(
-        lambda: {
+    allocations = defaultdict(list)
+    for pa in project_allocation_query:
+        allocations[pa.state_id].append(pa)
+
+    index = NutsIndex.for_period(period, request)
+    return {
+        state_id: get_rows(allocations[state_id], state_id, period, index, **kwargs)
+        for state_id in sorted(allocations)
+    }
+
+
+def _project_nuts_rows(allocations, state_id, period, index, force_nuts3):
+    def fill(row, pa):
+        row["area"] = pa.programme_area.name
+        row["sector"] = pa.priority_sector.name
+        row["fm"] = FM_DICT[pa.financial_mechanism]
+        row["projects"].add(pa.project_id)
+        row["programmes"][pa.project.programme_id] = pa.project.programme_id
+        row["thematic"] = pa.project.thematic
+
+    # split all non-level3 allocation among level3s
+    dataset = aggregate_by_nuts(
+        allocations,
+        state_id,
+        period,
+        group_by=lambda pa: (
+            pa.project.thematic,
+            pa.programme_area_id,
+            pa.priority_sector_id,
+            pa.financial_mechanism,
+        ),
+        row_factory=lambda: {
             "allocation": 0,
             "projects": set(),
             "project_count": 0,
             "programmes": {},
-        }
+        },
+        fill=fill,
+        force_nuts3=force_nuts3,
+        index=index,
     )
 
-    for pa in project_allocation_query:
-        code = pa.project.nuts_id
-        if len(code) > 2 and code.endswith("Z"):  # extra-regio
-            code = code[:2]
+    out = []
 
-        key = (
-            pa.project.thematic,
-            pa.project.nuts_id,
-            pa.programme_area_id,
-            pa.priority_sector_id,
-            pa.financial_mechanism,
-        )
-        if not force_nuts3 or len(code) == 5:
-            row = dataset[key]
-            row["id"] = pa.project.nuts_id
-            row["area"] = pa.programme_area.name
-            row["sector"] = pa.priority_sector.name
-            row["fm"] = FM_DICT[pa.financial_mechanism]
-            row["allocation"] += pa.allocation
-            row["projects"].add(pa.project_id)
-            row["programmes"][pa.project.programme_id] = pa.project.programme_id
-            row["thematic"] = pa.project.thematic
-            continue
+    for key, row in dataset.items():
+        # strip away some of that crazy precision
+        row["allocation"] = row["allocation"].quantize(Decimal("1.00"))
+        row["project_count"] = len(row["projects"])
+        del row["projects"]
+        out.append(row)
 
-        # else split allocation among children, and add project count to all children
-        children = (
-            nuts3s if len(code) == 2 else [n for n in nuts3s if n.startswith(code)]
-        )
+    return out
 
-        if len(children) == 0:
-            # TODO: this is an error. log it, etc.
-            continue
 
-        allocation = pa.allocation / len(children)
+def _sdg_nuts_rows(allocations, state_id, period, index):
+    def fill(row, pa):
+        row["areas"].add(pa.programme_area_id)
+        row["sectors"].add(pa.priority_sector_id)
+        row["fm"] = FM_DICT[pa.financial_mechanism]
+        row["programmes"][pa.project.programme_id] = pa.project.programme_id
+        row["sdg_no"] = pa.project.sdg_no
 
-        for nuts in children:
-            childkey = (
-                pa.project.thematic,
-                nuts,
-                pa.programme_area_id,
-                pa.priority_sector_id,
-                pa.financial_mechanism,
-            )
-            row = dataset[childkey]
-            row["id"] = nuts
-            row["area"] = pa.programme_area.name
-            row["sector"] = pa.priority_sector.name
-            row["fm"] = FM_DICT[pa.financial_mechanism]
-            row["allocation"] += allocation
-            row["projects"].add(pa.project_id)
-            row["programmes"][pa.project.programme_id] = pa.project.programme_id
-            row["thematic"] = pa.project.thematic
+    dataset = aggregate_by_nuts(
+        allocations,
+        state_id,
+        period,
+        group_by=lambda pa: (pa.financial_mechanism, pa.project.sdg_no),
+        row_factory=lambda: {
+            "allocation": 0,
+            "programmes": {},
+            "areas": set(),
+            "sectors": set(),
+        },
+        fill=fill,
+        index=index,
+    )
 
     out = []
 
     for key, row in dataset.items():
         # strip away some of that crazy precision
         row["allocation"] = row["allocation"].quantize(Decimal("1.00"))
-        row["project_count"] = len(row["projects"])
-        del row["projects"]
+        row["areas"] = list(row["areas"])
+        row["sectors"] = list(row["sectors"])
         out.append(row)
 
-    return JsonResponse(out)
+    return out
 
 
 class ProjectList(ListAPIView):